@@ -0,0 +1,16 @@
+"""
+Entry point of HOLMES: `python -m app`
+
+The modules in app/ import each other by their plain names (`from metrics import
+REGISTRY`), as they do when app/main.py runs as a script. This is the one place
+that puts app/ on the import path before main is imported.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import main  # noqa: E402
+
+main()
@@ -2,58 +2,177 @@
 Action Registry for HOLMES
 
 This module handles the registration and management of all HOLMES actions.
+
+Action classes are discovered without importing them, from two sources:
+- manifest.json in this package, listing each class as "module:Class" (relative
+  to this package) with the action IDs it handles
+- the `holmes.actions` entry point group of installed packages, one entry point
+  per action ID, e.g. `select_error = "holmes_errors.actions:ErrorAction"`.
+  Scanning installed packages takes longer than importing every built-in action,
+  so it only runs with HOLMES_ACTION_ENTRY_POINTS=1.
+
+Only the action IDs are registered at startup; an action module is imported and
+its class instantiated on the first click of one of its buttons.
+
+The built-in investigation buttons are answered by the decision tree
+(app/decision_tree.json), so the manifest ships empty: it is where a button whose
+answer needs Python (e.g. querying a live system) is added. The decision tree
+accepts buttons leading to any action ID discovered here.
 """
 
-from typing import Dict, Type
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Type, Union
+
 from .base import BaseAction
 
-# Import all action classes
-from .revenue_action import RevenueAction
-from .traffic_action import TrafficAction  
-from .high_timeouts_action import HighTimeoutsAction
-from .error_action import ErrorAction
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'manifest.json')
+
+ENTRY_POINT_GROUP = 'holmes.actions'
+
+
+class ActionSpec:
+    """An action class known by name, imported and instantiated on first use"""
+
+    __slots__ = ('target', 'description', 'action_ids', '_instance', '_lock')
+
+    def __init__(self, target: str, action_ids: List[str], description: str = ''):
+        self.target = target
+        self.action_ids = list(action_ids)
+        self.description = description
+        self._instance: Optional[BaseAction] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_class(cls, action_class: Type[BaseAction]) -> "ActionSpec":
+        """Spec of an already imported action class"""
+        instance = action_class()
+        spec = cls(f"{action_class.__module__}:{action_class.__qualname__}",
+                   instance.get_handled_actions(), instance.get_description())
+        spec._instance = instance
+        return spec
+
+    @property
+    def module_name(self) -> str:
+        return self.target.partition(':')[0]
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def is_available(self) -> bool:
+        """Whether the action module exists, checked without importing it"""
+        if self.loaded:
+            return True
+        try:
+            return importlib.util.find_spec(self.module_name, __package__) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def load(self) -> BaseAction:
+        """Import the action module and instantiate the class, once"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._import()
+        return self._instance
+
+    def _import(self) -> BaseAction:
+        started = time.perf_counter()
+        module_name, _, class_name = self.target.partition(':')
+        module = importlib.import_module(module_name, __package__)
+        instance = getattr(module, class_name)()
+        unhandled = set(self.action_ids) - set(instance.get_handled_actions())
+        if unhandled:
+            logger.warning("Action class does not handle all of its registered action IDs", extra={
+                'target': self.target, 'action_ids': sorted(unhandled)
+            })
+        logger.info("Loaded action", extra={
+            'target': self.target, 'load_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+        return instance
 
-# Traffic sub-actions are now consolidated into TrafficAction
-# from .ad_requests_drop_action import AdRequestsDropAction
-# from .bid_requests_drop_action import BidRequestsDropAction  
-# from .sharp_bid_drop_action import SharpBidDropAction
+    def handle(self, ack, body, respond, client):
+        """Listener registered for each action ID; loads the action on the first click"""
+        try:
+            action = self.load()
+        except Exception:
+            # Still ack, so the click does not show an error in Slack
+            ack()
+            logger.exception("Failed to load action", extra={'target': self.target})
+            return
+        action.handle(ack, body, respond, client)
 
-# Add more imports as you create new action files
-# from .error_action import ErrorAction
-# from .latency_action import LatencyAction
-# etc.
+
+def load_manifest(path: Optional[str] = None) -> List[ActionSpec]:
+    """Action specs listed in a manifest file (this package's manifest.json by default)"""
+    with open(path or MANIFEST_PATH) as manifest_file:
+        manifest = json.load(manifest_file)
+    return [
+        ActionSpec(entry['target'], entry['action_ids'], entry.get('description', ''))
+        for entry in manifest.get('actions', [])
+    ]
+
+
+def load_entry_points(group: str = ENTRY_POINT_GROUP) -> List[ActionSpec]:
+    """Action specs contributed by installed packages, grouped by class"""
+    from importlib.metadata import entry_points
+
+    discovered = entry_points()
+    if hasattr(discovered, 'select'):
+        found = discovered.select(group=group)
+    else:  # Python 3.9 returns a dict of groups
+        found = discovered.get(group, [])
+
+    specs: Dict[str, ActionSpec] = {}
+    for entry_point in found:
+        spec = specs.get(entry_point.value)
+        if spec is None:
+            spec = specs[entry_point.value] = ActionSpec(entry_point.value, [])
+        spec.action_ids.append(entry_point.name)
+    return list(specs.values())
 
 
 class ActionRegistry:
     """Registry to manage all HOLMES actions"""
-    
+
     def __init__(self):
-        self.actions: Dict[str, BaseAction] = {}
-    
-    def register(self, action_class: Type[BaseAction]):
-        """Register a new action class"""
-        action_instance = action_class()
-        handled_actions = action_instance.get_handled_actions()
-        
-        # Register all handled action IDs to this instance
-        for action_id in handled_actions:
-            self.actions[action_id] = action_instance
-        
-        primary_action = action_instance.get_action_id()
-        print(f"✅ Registered action: {primary_action} - {action_instance.get_description()}")
-        if len(handled_actions) > 1:
-            other_actions = [a for a in handled_actions if a != primary_action]
-            print(f"    Also handles: {', '.join(other_actions)}")
-    
-    def get_action(self, action_id: str) -> BaseAction:
-        """Get an action by its ID"""
-        return self.actions.get(action_id)
-    
+        self.actions: Dict[str, ActionSpec] = {}
+
+    def register(self, action: Union[ActionSpec, Type[BaseAction]]):
+        """Register an action spec, or an action class that is already imported"""
+        spec = action if isinstance(action, ActionSpec) else ActionSpec.for_class(action)
+        for action_id in spec.action_ids:
+            previous = self.actions.get(action_id)
+            if previous is not None and previous.target != spec.target:
+                logger.warning("Action ID registered twice, keeping the last one", extra={
+                    'action_id': action_id, 'previous': previous.target, 'target': spec.target
+                })
+            self.actions[action_id] = spec
+
+        logger.debug("Registered action", extra={
+            'target': spec.target,
+            'description': spec.description,
+            'action_ids': spec.action_ids,
+        })
+
+    def get_action(self, action_id: str) -> Optional[BaseAction]:
+        """Get an action by its ID, importing it if needed"""
+        spec = self.actions.get(action_id)
+        return spec.load() if spec is not None else None
+
     def list_actions(self) -> Dict[str, str]:
         """List all registered actions with their descriptions"""
         return {
-            action_id: action.get_description() 
-            for action_id, action in self.actions.items()
+            action_id: spec.description
+            for action_id, spec in self.actions.items()
         }
 
 
@@ -61,29 +180,33 @@ class ActionRegistry:
 _registry = ActionRegistry()
 
 
+def discover_actions() -> List[ActionSpec]:
+    """Action specs from the manifest, plus entry points if HOLMES_ACTION_ENTRY_POINTS=1"""
+    specs = load_manifest()
+    if os.environ.get('HOLMES_ACTION_ENTRY_POINTS') == '1':
+        specs += load_entry_points()
+    return specs
+
+
 def register_all_actions(app):
     """Register all actions with the Slack app"""
-    
-    # Register all action classes
-    _registry.register(RevenueAction)
-    _registry.register(TrafficAction)  # Now handles ad_requests_drop, bid_requests_drop, sharp_bid_drop
-    _registry.register(HighTimeoutsAction)
-    _registry.register(ErrorAction)  # Now handles select_error, 5xx_errors_dc
-    
-    # Add more registrations as you create new actions:
-    # _registry.register(ErrorAction)
-    # _registry.register(LatencyAction)
-    # etc.
-    
+    for spec in discover_actions():
+        # A missing module is skipped instead of failing startup
+        if not spec.is_available():
+            logger.error("Action module not found, skipping its actions", extra={
+                'target': spec.target, 'action_ids': spec.action_ids
+            })
+            continue
+        _registry.register(spec)
+
     # Register handlers with Slack app
-    for action_id, action in _registry.actions.items():
-        app.action(action_id)(action.handle)
-        print(f"🔗 Connected action {action_id} to Slack app")
-    
-    print(f"📋 Total registered actions: {len(_registry.actions)}")
+    for action_id, spec in _registry.actions.items():
+        app.action(action_id)(spec.handle)
+
+    logger.info("Registered actions", extra={'count': len(_registry.actions), 'action_ids': list(_registry.actions)})
     return _registry
 
 
 def get_registry() -> ActionRegistry:
     """Get the global action registry"""
-    return _registry
\ No newline at end of file
+    return _registry
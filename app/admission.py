@@ -0,0 +1,179 @@
+"""
+Admission Control for HOLMES
+
+Handlers ack Slack right away and leave their work to background queues (see
+work_queue). Admission control decides which queue, and whether to take the work
+at all, by its priority:
+
+1. critical: clicks that escalate (page another channel or set the investigation
+   to escalated, e.g. `massive_overspend`)
+2. interactive: other clicks, /holmes, shortcuts and view submissions
+3. message: classifying messages posted in monitored channels
+4. diagnostic: /holmes with arguments, e.g. `/holmes profile`
+
+Each priority has its own bounded WorkQueue, so its own concurrency cap (workers)
+and queue, and keeps the per-channel ordering of work_queue. A burst of chatty
+messages therefore never delays an escalation. Under overload, lower priorities
+are shed first:
+
+- Only critical work waits for room in a full queue (`put_timeout`); the others
+  are shed at once, leaving the request thread free.
+- While the queue of a higher priority is over its high-water mark, work of the
+  lower priorities is shed before it is queued.
+- Work that waited longer than its priority's `max_wait` is dropped instead of
+  run (an alert answered minutes late only adds noise); critical work never expires.
+
+HOLMES is saturated while any queue is over its high-water mark or work was shed
+in the last `saturation_window` seconds. stats() reports it, and main() makes
+/ready answer 503 meanwhile, so a load balancer sends Slack's requests to other
+replicas until the backlog clears.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from metrics import ADMISSION_SHED
+from work_queue import WorkQueue, get_channel_key
+
+logger = logging.getLogger(__name__)
+
+CRITICAL = 'critical'
+INTERACTIVE = 'interactive'
+MESSAGE = 'message'
+DIAGNOSTIC = 'diagnostic'
+
+# Highest first
+PRIORITIES = (CRITICAL, INTERACTIVE, MESSAGE, DIAGNOSTIC)
+
+
+class PriorityLimits:
+    """Concurrency cap and queue bounds of one priority"""
+
+    __slots__ = ('workers', 'max_size', 'put_timeout', 'max_wait')
+
+    def __init__(self, workers: int, max_size: int, put_timeout: float = 0.0, max_wait: Optional[float] = None):
+        self.workers = workers
+        self.max_size = max_size
+        self.put_timeout = put_timeout
+        self.max_wait = max_wait
+
+
+DEFAULT_LIMITS = {
+    CRITICAL: PriorityLimits(workers=2, max_size=100, put_timeout=1.0),
+    INTERACTIVE: PriorityLimits(workers=4, max_size=200, max_wait=60),
+    MESSAGE: PriorityLimits(workers=8, max_size=1000, max_wait=60),
+    DIAGNOSTIC: PriorityLimits(workers=1, max_size=10, max_wait=30),
+}
+
+
+def classify_request(body: Dict[str, Any], escalates: Callable[[Optional[str]], bool] = lambda action_id: False) -> str:
+    """Priority of a Slack request; escalates(action_id) tells critical clicks apart"""
+    actions = body.get('actions')
+    if actions:
+        return CRITICAL if escalates(actions[0].get('action_id')) else INTERACTIVE
+    if body.get('command'):
+        return DIAGNOSTIC if (body.get('text') or '').strip() else INTERACTIVE
+    if 'event' in body:
+        return MESSAGE
+    return INTERACTIVE
+
+
+class AdmissionController:
+    """One bounded WorkQueue per priority, shedding the lowest priorities first"""
+
+    def __init__(self, limits: Dict[str, PriorityLimits], classify: Callable[[Dict[str, Any]], str] = classify_request,
+                 high_water: float = 0.8, saturation_window: float = 10.0):
+        self.classify = classify
+        self.high_water = high_water
+        self.saturation_window = saturation_window
+        self.queues = {
+            priority: WorkQueue(workers=limits[priority].workers, max_size=limits[priority].max_size,
+                                put_timeout=limits[priority].put_timeout, max_wait=limits[priority].max_wait,
+                                name=priority)
+            for priority in PRIORITIES
+        }
+        self._marks = {priority: work_queue.capacity() * high_water for priority, work_queue in self.queues.items()}
+        self._lock = threading.Lock()
+        self._shed = {priority: 0 for priority in PRIORITIES}
+        self._last_shed = float('-inf')
+
+    def submit_request(self, body: Dict[str, Any], func: Callable, /, **kwargs) -> bool:
+        """Queue the job of a Slack request by its priority; False if it was shed"""
+        return self.submit(self.classify(body), get_channel_key(body), func, **kwargs)
+
+    def submit(self, priority: str, key: Optional[str], func: Callable, /, **kwargs) -> bool:
+        """Queue func(**kwargs) at priority behind earlier work for key; False if it was shed"""
+        if any(self._over_mark(higher) for higher in PRIORITIES[:PRIORITIES.index(priority)]):
+            self._count_shed(priority, 'pressure')
+            return False
+        if not self.queues[priority].submit(key, func, **kwargs):
+            self._count_shed(priority, 'full')
+            return False
+        return True
+
+    def _over_mark(self, priority: str) -> bool:
+        return self.queues[priority].depth() >= self._marks[priority]
+
+    def _count_shed(self, priority: str, reason: str):
+        ADMISSION_SHED.inc(priority, reason)
+        with self._lock:
+            self._shed[priority] += 1
+            self._last_shed = time.monotonic()
+
+    def saturated(self) -> bool:
+        """Whether a queue is over its high-water mark or work was shed recently"""
+        with self._lock:
+            last_shed = self._last_shed
+        if time.monotonic() - last_shed < self.saturation_window:
+            return True
+        return any(self._over_mark(priority) for priority in PRIORITIES)
+
+    def stats(self) -> Dict[str, Any]:
+        """Saturation, shed counts and the work queue counters of each priority"""
+        with self._lock:
+            shed = dict(self._shed)
+        return {
+            'saturated': self.saturated(),
+            'shed': shed,
+            'priorities': {priority: work_queue.stats() for priority, work_queue in self.queues.items()},
+        }
+
+    def shutdown(self, timeout: float = 30.0) -> bool:
+        """Stop accepting work and drain every queue, highest priority first; True if all drained"""
+        deadline = time.monotonic() + timeout
+        drained = True
+        for priority in PRIORITIES:
+            drained = self.queues[priority].shutdown(max(0.0, deadline - time.monotonic())) and drained
+        return drained
+
+
+def create_admission_controller(classify: Callable[[Dict[str, Any]], str] = classify_request) -> AdmissionController:
+    """Controller with ADMISSION_<PRIORITY>_WORKERS / _QUEUE / _MAX_WAIT_SECONDS overriding the defaults
+
+    The message priority defaults to WORK_QUEUE_WORKERS and WORK_QUEUE_SIZE, the
+    settings of the single work queue it replaces.
+    """
+    limits = {}
+    for priority in PRIORITIES:
+        default = DEFAULT_LIMITS[priority]
+        prefix = f"ADMISSION_{priority.upper()}"
+        workers, max_size = default.workers, default.max_size
+        if priority == MESSAGE:
+            workers = int(os.environ.get("WORK_QUEUE_WORKERS", workers))
+            max_size = int(os.environ.get("WORK_QUEUE_SIZE", max_size))
+        max_wait = os.environ.get(f"{prefix}_MAX_WAIT_SECONDS")
+        limits[priority] = PriorityLimits(
+            workers=int(os.environ.get(f"{prefix}_WORKERS", workers)),
+            max_size=int(os.environ.get(f"{prefix}_QUEUE", max_size)),
+            put_timeout=default.put_timeout,
+            # 0 disables expiry
+            max_wait=(float(max_wait) or None) if max_wait is not None else default.max_wait,
+        )
+    return AdmissionController(
+        limits, classify,
+        high_water=float(os.environ.get("ADMISSION_HIGH_WATER", 0.8)),
+        saturation_window=float(os.environ.get("ADMISSION_SATURATION_SECONDS", 10)),
+    )
@@ -0,0 +1,418 @@
+"""
+Learned Alert Classifier for HOLMES
+
+A linear model over hashed n-grams, trained from labelled alert history, that
+replaces the keyword patterns of ALERT_PATTERNS where it is confident. The
+keyword matcher counts 'timeout' towards both errors and latency and breaks ties
+by dict order; the model weighs every word and word pair by what people
+eventually did with alerts like it.
+
+- Features: word unigrams and bigrams plus character trigrams of each word
+  (tokenized like incidents, so numbers, links and long hex IDs are dropped),
+  hashed with signed CRC32 into `dim` columns and L2-normalized. Nothing about the
+  vocabulary is stored, and unseen words cost nothing.
+- Model: softmax regression, one weight column per category plus `none` when
+  the history has messages that were not alerts. A batch of texts is scored with
+  one sparse-dense matrix product (a gather of weight rows and a segmented sum),
+  so scoring many alerts costs about as much per alert as scoring one.
+- Confidences are calibrated by temperature scaling on a held-out share of the
+  history. Texts whose top confidence is under `min_confidence`, or with no
+  features at all, are left to the keyword matcher, as are all texts while no
+  model is configured.
+- A model that has never seen a message that was not an alert (no `none`
+  class, as when trained from history alone: HOLMES only records alerts it
+  answered) cannot tell alerts from chatter. It then only picks the category of
+  texts the keyword matcher flags as alerts, so the keyword matcher runs on every
+  text as well as the model: such a model costs more per text than the keywords
+  alone (in benchmarks/alert_model_benchmark.py about 5x, in batches) and is
+  worth loading only for its better categories. `/health` reports it as
+  `keyword_gated`.
+
+Labels come from investigations: the category of each answered alert's session
+once someone clicked in it (clicks such as `select_latency` set the category,
+see decision_tree), joined to the incident text, or from JSON lines of
+{"text": ..., "category": ... or null}. Offline commands, run from app/:
+
+    python alert_model.py train --history --out /data/alert_model.npz
+    python alert_model.py train --jsonl labelled.jsonl --out /data/alert_model.npz
+    python alert_model.py evaluate --model /data/alert_model.npz --jsonl held_out.jsonl
+
+HOLMES loads the model from HOLMES_CLASSIFIER_MODEL at startup.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from incidents import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Class of labelled messages that are not alerts
+NONE = 'none'
+
+# Feature strings hashed per word, kept for the most frequent words
+_WORD_CACHE_SIZE = 100000
+
+Csr = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class HashingFeaturizer:
+    """Hashed word, word pair and character trigram features of texts, as CSR arrays"""
+
+    def __init__(self, dim: int = 1 << 18):
+        if dim & (dim - 1):
+            raise ValueError(f"Feature dimension must be a power of two, got {dim}")
+        self.dim = dim
+        self._words: Dict[str, Tuple[List[int], List[float]]] = {}
+
+    def _hash(self, feature: str) -> Tuple[int, float]:
+        code = zlib.crc32(feature.encode())
+        # The top bit gives the sign, so colliding features cancel out on average
+        return code & (self.dim - 1), 1.0 if code >> 31 else -1.0
+
+    def _word(self, word: str) -> Tuple[List[int], List[float]]:
+        cached = self._words.get(word)
+        if cached is None:
+            padded = f"<{word}>"
+            hashed = [self._hash(f"w:{word}")] + [self._hash(f"c:{padded[i:i + 3]}") for i in range(len(padded) - 2)]
+            cached = ([index for index, _ in hashed], [sign for _, sign in hashed])
+            if len(self._words) >= _WORD_CACHE_SIZE:
+                self._words.clear()
+            self._words[word] = cached
+        return cached
+
+    def transform(self, texts: Sequence[str]) -> Csr:
+        """(indptr, indices, values): row i holds the features of texts[i]"""
+        indptr = [0]
+        indices: List[int] = []
+        values: List[float] = []
+        for text in texts:
+            words = tokenize(text)
+            row_indices: List[int] = []
+            row_signs: List[float] = []
+            for word in words:
+                word_indices, word_signs = self._word(word)
+                row_indices.extend(word_indices)
+                row_signs.extend(word_signs)
+            for first, second in zip(words, words[1:]):
+                index, sign = self._hash(f"b:{first} {second}")
+                row_indices.append(index)
+                row_signs.append(sign)
+            if row_indices:
+                norm = 1.0 / len(row_indices) ** 0.5
+                indices.extend(row_indices)
+                values.extend(sign * norm for sign in row_signs)
+            indptr.append(len(indices))
+        return (np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64),
+                np.array(values, dtype=np.float32))
+
+
+def sparse_dot(csr: Csr, weights: np.ndarray) -> np.ndarray:
+    """Rows of the CSR matrix times weights (dim x classes)"""
+    indptr, indices, values = csr
+    product = np.zeros((len(indptr) - 1, weights.shape[1]), dtype=np.float32)
+    nonempty = np.diff(indptr) > 0
+    if indices.size:
+        # Segments of consecutive non-empty rows; rows without features stay zero
+        product[nonempty] = np.add.reduceat(weights[indices] * values[:, None], indptr[:-1][nonempty], axis=0)
+    return product
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def expected_calibration_error(confidence: np.ndarray, correct: np.ndarray, bins: int = 10) -> float:
+    """Mean gap between confidence and accuracy over equal-width confidence bins, weighted by bin size"""
+    edges = np.minimum((confidence * bins).astype(int), bins - 1)
+    error = 0.0
+    for index in range(bins):
+        members = edges == index
+        if members.any():
+            error += members.mean() * abs(confidence[members].mean() - correct[members].mean())
+    return float(error)
+
+
+class AlertModel:
+    """Calibrated softmax regression over hashed n-grams"""
+
+    def __init__(self, categories: Sequence[str], weights: np.ndarray, bias: np.ndarray,
+                 featurizer: HashingFeaturizer, temperature: float = 1.0, min_confidence: float = 0.6):
+        self.categories = tuple(categories)
+        self.weights = weights
+        self.bias = bias
+        self.featurizer = featurizer
+        self.temperature = temperature
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Calibrated probabilities, one row per text and one column per category"""
+        logits = sparse_dot(self.featurizer.transform(texts), self.weights) + self.bias
+        return softmax(logits / self.temperature)
+
+    def classify_batch(self, texts: Sequence[str],
+                       fallback: Optional[Callable[[str], Optional[str]]] = None) -> List[Optional[str]]:
+        """Category of each text (None if not an alert); fallback decides texts the model is unsure of"""
+        if not texts:
+            return []
+        csr = self.featurizer.transform(texts)
+        probabilities = softmax((sparse_dot(csr, self.weights) + self.bias) / self.temperature)
+        best = probabilities.argmax(axis=1)
+        confident = (probabilities[np.arange(len(texts)), best] >= self.min_confidence) & (np.diff(csr[0]) > 0)
+        # Without a none class, whether a text is an alert at all is the keyword matcher's call
+        gated = self.keyword_gated and fallback is not None
+        results: List[Optional[str]] = []
+        counts = Counter()
+        for text, index, sure in zip(texts, best.tolist(), confident.tolist()):
+            keyword = fallback(text) if fallback is not None and (gated or not sure) else None
+            if gated and keyword is None:
+                counts['not_alert'] += 1
+                results.append(None)
+            elif sure:
+                category = self.categories[index]
+                counts['learned'] += 1
+                results.append(None if category == NONE else category)
+            else:
+                counts['fallback'] += 1
+                results.append(keyword)
+        with self._lock:
+            self._counts.update(counts)
+        return results
+
+    @property
+    def keyword_gated(self) -> bool:
+        """Whether the keyword fallback decides which texts are alerts, running on every text"""
+        return NONE not in self.categories
+
+    def classify(self, text: str, fallback: Optional[Callable[[str], Optional[str]]] = None) -> Optional[str]:
+        return self.classify_batch([text], fallback)[0]
+
+    def save(self, path: str):
+        np.savez_compressed(path, categories=np.array(self.categories), weights=self.weights, bias=self.bias,
+                            dim=self.featurizer.dim, temperature=self.temperature,
+                            min_confidence=self.min_confidence)
+
+    @classmethod
+    def load(cls, path: str) -> "AlertModel":
+        with np.load(path) as data:
+            return cls([str(category) for category in data['categories']], data['weights'], data['bias'],
+                       HashingFeaturizer(int(data['dim'])), float(data['temperature']),
+                       float(data['min_confidence']))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counts, 'categories': list(self.categories), 'min_confidence': self.min_confidence,
+                    'keyword_gated': self.keyword_gated}
+
+
+def _fit_temperature(logits: np.ndarray, labels: np.ndarray) -> float:
+    """Temperature minimizing the negative log likelihood of held-out labels"""
+    best, best_loss = 1.0, float('inf')
+    for temperature in np.exp(np.linspace(np.log(0.05), np.log(20.0), 120)):
+        probabilities = softmax(logits / temperature)
+        loss = -np.log(probabilities[np.arange(len(labels)), labels] + 1e-12).mean()
+        if loss < best_loss:
+            best, best_loss = float(temperature), loss
+    return best
+
+
+def _rows(csr: Csr, rows: np.ndarray) -> Csr:
+    """The given rows of a CSR matrix"""
+    indptr, indices, values = csr
+    starts, ends = indptr[rows], indptr[rows + 1]
+    lengths = ends - starts
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return np.concatenate([[0], np.cumsum(lengths)]), indices[positions], values[positions]
+
+
+def train(texts: Sequence[str], labels: Sequence[Optional[str]], dim: int = 1 << 18, epochs: int = 10,
+          batch_size: int = 64, learning_rate: float = 0.5, l2: float = 1e-6, holdout: float = 0.2,
+          min_confidence: float = 0.6, seed: int = 0) -> Tuple[AlertModel, Dict[str, Any]]:
+    """Model fitted to labelled texts (label None: not an alert), calibrated and scored on a held-out share
+
+    Training is mini-batch AdaGrad on the cross-entropy, updating only the weight
+    rows of the features present in each batch.
+    """
+    names = [NONE if label is None else label for label in labels]
+    categories = sorted(set(names) - {NONE}) + ([NONE] if NONE in names else [])
+    if len(categories) < 2:
+        raise ValueError("Training needs examples of at least two classes")
+    target = np.array([categories.index(name) for name in names])
+    featurizer = HashingFeaturizer(dim)
+    csr = featurizer.transform(texts)
+
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(texts))
+    held = max(1, int(len(texts) * holdout))
+    held_rows, train_rows = order[:held], order[held:]
+
+    classes = len(categories)
+    weights = np.zeros((dim, classes), dtype=np.float32)
+    bias = np.log(np.bincount(target[train_rows], minlength=classes) + 1.0).astype(np.float32)
+    squares = np.full((dim, classes), 1e-8, dtype=np.float32)
+    onehot = np.eye(classes, dtype=np.float32)
+    for _ in range(epochs):
+        rng.shuffle(train_rows)
+        for start in range(0, len(train_rows), batch_size):
+            rows = train_rows[start:start + batch_size]
+            batch = _rows(csr, rows)
+            delta = (softmax(sparse_dot(batch, weights) + bias) - onehot[target[rows]]) / len(rows)
+            indptr, indices, values = batch
+            touched, inverse = np.unique(indices, return_inverse=True)
+            gradient = np.zeros((len(touched), classes), dtype=np.float32)
+            np.add.at(gradient, inverse, values[:, None] * delta[np.repeat(np.arange(len(rows)), np.diff(indptr))])
+            gradient += l2 * weights[touched]
+            squares[touched] += gradient ** 2
+            weights[touched] -= learning_rate * gradient / np.sqrt(squares[touched])
+            bias -= learning_rate * 0.1 * delta.sum(axis=0)
+
+    held_logits = sparse_dot(_rows(csr, held_rows), weights) + bias
+    temperature = _fit_temperature(held_logits, target[held_rows])
+    model = AlertModel(categories, weights, bias, featurizer, temperature, min_confidence)
+    report = evaluate(model, [texts[row] for row in held_rows], [labels[row] for row in held_rows])
+    report['trained'] = len(train_rows)
+    return model, report
+
+
+def evaluate(model: AlertModel, texts: Sequence[str], labels: Sequence[Optional[str]],
+             fallback: Optional[Callable[[str], Optional[str]]] = None) -> Dict[str, Any]:
+    """Accuracy, calibration and per-category precision/recall of a model on labelled texts"""
+    probabilities = model.predict_proba(texts)
+    best = probabilities.argmax(axis=1)
+    confidence = probabilities[np.arange(len(texts)), best]
+    names = [NONE if label is None else label for label in labels]
+    predicted = [model.categories[index] for index in best]
+    correct = np.array([guess == name for guess, name in zip(predicted, names)])
+    confident = confidence >= model.min_confidence
+    per_category = {}
+    for category in sorted(set(names) | set(model.categories)):
+        hits = sum(1 for guess, name in zip(predicted, names) if guess == name == category)
+        guessed = predicted.count(category)
+        actual = names.count(category)
+        per_category[category] = {'precision': round(hits / guessed, 3) if guessed else None,
+                                   'recall': round(hits / actual, 3) if actual else None, 'count': actual}
+    report = {
+        'examples': len(texts),
+        'accuracy': round(float(correct.mean()), 4),
+        'ece': round(expected_calibration_error(confidence, correct), 4),
+        'confident_share': round(float(confident.mean()), 4),
+        'confident_accuracy': round(float(correct[confident].mean()), 4) if confident.any() else None,
+        'temperature': round(model.temperature, 3),
+        'categories': per_category,
+    }
+    if fallback is not None:
+        # What HOLMES answers: the model where it is confident, the keywords elsewhere
+        decided = [guess or NONE for guess in model.classify_batch(texts, fallback)]
+        report['accuracy_with_fallback'] = round(
+            sum(1 for guess, name in zip(decided, names) if guess == name) / len(texts), 4)
+    return report
+
+
+def load_history(incidents_path: str, sessions_path: str) -> Tuple[List[str], List[Optional[str]]]:
+    """Texts and categories of the answered alerts whose investigation someone clicked through"""
+    connection = sqlite3.connect(f"file:{incidents_path}?mode=ro", uri=True)
+    try:
+        connection.execute("ATTACH DATABASE ? AS sessions", (f"file:{sessions_path}?mode=ro",))
+        rows = connection.execute(
+            "SELECT incidents.text, investigations.category FROM incidents "
+            "JOIN sessions.investigations AS investigations "
+            "ON investigations.channel = incidents.channel AND investigations.thread_ts = incidents.thread_ts "
+            "WHERE investigations.path != '' AND investigations.category IS NOT NULL"
+        ).fetchall()
+    finally:
+        connection.close()
+    return [text for text, _ in rows], [category for _, category in rows]
+
+
+def load_jsonl(paths: Iterable[str]) -> Tuple[List[str], List[Optional[str]]]:
+    """Texts and categories from JSON lines of {"text": ..., "category": ... or null}"""
+    texts: List[str] = []
+    labels: List[Optional[str]] = []
+    for path in paths:
+        with open(path) as labelled:
+            for line in labelled:
+                if line.strip():
+                    example = json.loads(line)
+                    texts.append(example['text'])
+                    labels.append(example.get('category'))
+    return texts, labels
+
+
+def create_alert_model(categories: Iterable[str]) -> Optional[AlertModel]:
+    """Model from HOLMES_CLASSIFIER_MODEL; None (keyword patterns only) if unset"""
+    path = os.environ.get('HOLMES_CLASSIFIER_MODEL')
+    if not path:
+        return None
+    model = AlertModel.load(path)
+    unknown = set(model.categories) - set(categories) - {NONE}
+    if unknown:
+        raise ValueError(f"Classifier model {path} has categories missing from ALERT_PATTERNS: {sorted(unknown)}")
+    if os.environ.get('CLASSIFIER_MIN_CONFIDENCE'):
+        model.min_confidence = float(os.environ['CLASSIFIER_MIN_CONFIDENCE'])
+    logger.info("Loaded alert classifier model", extra={
+        'path': path, 'categories': list(model.categories), 'temperature': model.temperature
+    })
+    if model.keyword_gated:
+        logger.warning("Classifier model has no none class: keyword patterns still run on every text", extra={
+            'path': path
+        })
+    return model
+
+
+def _load_examples(args) -> Tuple[List[str], List[Optional[str]]]:
+    texts: List[str] = []
+    labels: List[Optional[str]] = []
+    if args.history:
+        texts, labels = load_history(args.incidents, args.sessions)
+    more_texts, more_labels = load_jsonl(args.jsonl)
+    return texts + more_texts, labels + more_labels
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Train or evaluate the learned alert classifier")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('train', 'evaluate'):
+        command = commands.add_parser(name)
+        command.add_argument('--history', action='store_true', help="label answered alerts by their investigations")
+        command.add_argument('--incidents', default=os.environ.get('INCIDENTS_SQLITE_PATH',
+                                                                   '/tmp/holmes-incidents.sqlite3'))
+        command.add_argument('--sessions', default=os.environ.get('SESSIONS_SQLITE_PATH',
+                                                                  '/tmp/holmes-sessions.sqlite3'))
+        command.add_argument('--jsonl', action='append', default=[], help="labelled JSON lines, repeatable")
+    train_command = commands.choices['train']
+    train_command.add_argument('--out', required=True)
+    train_command.add_argument('--dim-bits', type=int, default=18)
+    train_command.add_argument('--epochs', type=int, default=10)
+    train_command.add_argument('--min-confidence', type=float, default=0.6)
+    commands.choices['evaluate'].add_argument('--model', required=True)
+    args = parser.parse_args(argv)
+
+    texts, labels = _load_examples(args)
+    if not texts:
+        parser.error("no labelled examples: pass --history and/or --jsonl")
+    if args.command == 'train':
+        model, report = train(texts, labels, dim=1 << args.dim_bits, epochs=args.epochs,
+                              min_confidence=args.min_confidence)
+        model.save(args.out)
+        report['model'] = args.out
+    else:
+        report = evaluate(AlertModel.load(args.model), texts, labels)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Async Runtime for HOLMES
+
+Runs the HOLMES handlers on slack_bolt's AsyncApp and AsyncWebClient so that a
+single worker serves many interactions concurrently.
+
+The handlers in main.py and app/actions/ are written against the synchronous
+WebClient. Rather than maintaining a second copy of each one, every handler is
+bridged: it runs in a worker thread (asyncio.to_thread, since handlers may
+write SQLite or fetch metrics over blocking HTTP) against a RecordingClient that
+collects the Web API calls it makes, and those calls are then sent concurrently
+on the shared AsyncWebClient. A RecordingClient call returns None, so no recorded
+call can depend on the result of another; the only order kept is that of posts to
+the same thread (or channel) and of say and respond calls, so that the messages
+of a conversation appear in the order the handler wrote them. An update of the
+clicked message and the reply in its thread go out together.
+
+Handlers whose control flow depends on the result of a Web API call (such as
+the DM fallback of /holmes) can provide a native coroutine through an
+`async_handler` attribute, which is used instead of the bridge.
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from aiohttp import ClientSession, web
+from slack_bolt.adapter.aiohttp import to_aiohttp_response, to_bolt_request
+from slack_bolt.async_app import AsyncApp
+from slack_sdk.web.async_client import AsyncWebClient
+
+from bootstrap import READINESS
+from metrics import CONTENT_TYPE, HANDLER_DURATION, HANDLER_ERRORS, REGISTRY, handler_label, instrument_async_app
+
+logger = logging.getLogger(__name__)
+
+# Recorded call: (target name, method name, positional args, keyword args)
+RecordedCall = Tuple[str, str, tuple, Dict[str, Any]]
+
+
+class RecordingClient:
+    """Stand-in for WebClient that records Web API calls instead of sending them"""
+
+    def __init__(self, calls: List[RecordedCall]):
+        self._calls = calls
+
+    def __getattr__(self, method: str):
+        def record(*args, **kwargs):
+            self._calls.append(('client', method, args, kwargs))
+        return record
+
+
+class RecordingUtility:
+    """Stand-in for say/respond that records the call instead of sending it"""
+
+    def __init__(self, calls: List[RecordedCall], name: str):
+        self._calls = calls
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        self._calls.append((self._name, '__call__', args, kwargs))
+
+
+def _noop_ack(*args, **kwargs):
+    """The bridge acks before the handler runs, so the handler's own ack is ignored"""
+
+
+# Methods whose calls to the same channel and thread are sent in the order they were made
+ORDERED_METHODS = frozenset({'chat_postMessage', 'chat_postEphemeral', 'chat_scheduleMessage'})
+
+
+def _lane(call: RecordedCall, index: int) -> Hashable:
+    """Calls of one lane are sent one after another; lanes are sent concurrently"""
+    target, method, _, kwargs = call
+    if target != 'client':
+        return (target,)
+    if method in ORDERED_METHODS:
+        return ('post', kwargs.get('channel'), kwargs.get('thread_ts'))
+    return ('call', index)
+
+
+async def send_recorded_calls(calls: List[RecordedCall], targets: Dict[str, Any]) -> List[Any]:
+    """Send recorded calls concurrently, keeping the order of posts to a thread; results or exceptions, in order"""
+    results: List[Any] = [None] * len(calls)
+    lanes: Dict[Hashable, List[int]] = {}
+    for index, call in enumerate(calls):
+        lanes.setdefault(_lane(call, index), []).append(index)
+
+    async def send(indices: List[int]):
+        for index in indices:
+            target, method, args, kwargs = calls[index]
+            func = targets[target] if method == '__call__' else getattr(targets[target], method)
+            try:
+                results[index] = await func(*args, **kwargs)
+            except Exception as e:
+                results[index] = e
+
+    await asyncio.gather(*(send(indices) for indices in lanes.values()))
+    return results
+
+
+def bridge_handler(func: Callable) -> Callable:
+    """Wrap a synchronous HOLMES handler into an AsyncApp listener"""
+    native = getattr(func, 'async_handler', None)
+    if native is not None:
+        return timed_async_handler(native)
+
+    wanted = list(inspect.signature(func).parameters)
+    name = getattr(func, '__qualname__', repr(func))
+
+    async def listener(ack, body, client, say, respond, message):
+        await ack()
+
+        calls: List[RecordedCall] = []
+        available = {
+            'ack': _noop_ack,
+            'body': body,
+            'message': message,
+            'client': RecordingClient(calls),
+            'say': RecordingUtility(calls, 'say'),
+            'respond': RecordingUtility(calls, 'respond'),
+        }
+        label = handler_label(body)
+        started = time.perf_counter()
+        try:
+            # Off the event loop: handlers block on SQLite and enrichment HTTP calls
+            await asyncio.to_thread(func, **{arg: available[arg] for arg in wanted})
+        except Exception:
+            HANDLER_ERRORS.inc(label)
+            raise
+        finally:
+            # Recorded calls are sent below and timed per method as Web API latency
+            HANDLER_DURATION.observe(time.perf_counter() - started, label)
+
+        if not calls:
+            return
+        results = await send_recorded_calls(calls, {'client': client, 'say': say, 'respond': respond})
+        for (_, method, _, _), result in zip(calls, results):
+            if isinstance(result, Exception):
+                logger.error("Web API call failed", exc_info=result, extra={'handler': name, 'method': method})
+
+    listener.__name__ = getattr(func, '__name__', 'listener')
+    return listener
+
+
+def timed_async_handler(native: Callable) -> Callable:
+    """Native async handler recording its duration under the action_id, command or event type"""
+    wanted = list(inspect.signature(native).parameters)
+
+    async def listener(ack, body, client, say, respond, message):
+        available = {'ack': ack, 'body': body, 'message': message, 'client': client, 'say': say, 'respond': respond}
+        label = handler_label(body)
+        started = time.perf_counter()
+        try:
+            return await native(**{arg: available[arg] for arg in wanted})
+        except Exception:
+            HANDLER_ERRORS.inc(label)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, label)
+
+    listener.__name__ = getattr(native, '__name__', 'listener')
+    return listener
+
+
+class AsyncAppBridge:
+    """Exposes the App registration API while registering bridged listeners on an AsyncApp"""
+
+    def __init__(self, async_app: AsyncApp):
+        self.async_app = async_app
+
+    def action(self, constraints):
+        return lambda func: self.async_app.action(constraints)(bridge_handler(func))
+
+    def command(self, command):
+        return lambda func: self.async_app.command(command)(bridge_handler(func))
+
+    def event(self, event):
+        return lambda func: self.async_app.event(event)(bridge_handler(func))
+
+
+def create_async_app(*registrars: Callable) -> AsyncApp:
+    """Create the AsyncApp and run each registrar (e.g. register_all_actions) against it"""
+    # AsyncApp sends Web API calls through an AsyncWebClient built from the bot token
+    async_app = AsyncApp(
+        token=os.environ.get("SLACK_BOT_TOKEN"),
+        signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),
+        client=AsyncWebClient(
+            token=os.environ.get("SLACK_BOT_TOKEN"),
+            base_url=os.environ["SLACK_API_URL"],
+        ) if os.environ.get("SLACK_API_URL") else None,
+    )
+    instrument_async_app(async_app)
+    bridge = AsyncAppBridge(async_app)
+    for registrar in registrars:
+        registrar(bridge)
+    return async_app
+
+
+def create_aiohttp_app(async_app: AsyncApp) -> web.Application:
+    """aiohttp application exposing the same routes as create_flask_app()"""
+
+    async def slack_events(request: web.Request) -> web.Response:
+        bolt_response = await async_app.async_dispatch(await to_bolt_request(request))
+        return await to_aiohttp_response(bolt_response)
+
+    async def health_check(request: web.Request) -> web.Response:
+        return web.json_response({"status": "HOLMES system operational", "timestamp": datetime.now().isoformat()})
+
+    async def readiness_check(request: web.Request) -> web.Response:
+        status, body = READINESS.probe()
+        return web.json_response(body, status=status)
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(body=REGISTRY.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    async def open_session(_):
+        # One pooled HTTP session shared by every Web API call from this worker
+        async_app.client.session = ClientSession()
+
+    async def close_session(_):
+        if async_app.client.session is not None:
+            await async_app.client.session.close()
+
+    aiohttp_app = web.Application()
+    aiohttp_app.router.add_post("/slack/events", slack_events)
+    aiohttp_app.router.add_post("/slack/slash", slack_events)
+    aiohttp_app.router.add_get("/health", health_check)
+    aiohttp_app.router.add_get("/ready", readiness_check)
+    aiohttp_app.router.add_get("/metrics", metrics)
+    aiohttp_app.on_startup.append(open_session)
+    aiohttp_app.on_cleanup.append(close_session)
+    return aiohttp_app
+
+
+def run_async(async_app: AsyncApp, port: int):
+    """Serve the AsyncApp over Socket Mode if SLACK_APP_TOKEN is set, HTTP otherwise"""
+    if os.environ.get("SLACK_APP_TOKEN"):
+        from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+        async def start_socket_mode():
+            async_app.client.session = ClientSession()
+            try:
+                handler = AsyncSocketModeHandler(async_app, os.environ["SLACK_APP_TOKEN"])
+                await handler.connect_async()
+                READINESS.start()
+                await asyncio.Event().wait()
+            finally:
+                await async_app.client.session.close()
+
+        logger.info("Starting async runtime in Socket Mode")
+        asyncio.run(start_socket_mode())
+    else:
+        logger.info("Starting async runtime in HTTP mode", extra={'port': port})
+        # Listen before the startup steps run; connections wait in the backlog until the app is up
+        sock = socket.create_server(("0.0.0.0", port), backlog=1024)
+        READINESS.start()
+        web.run_app(create_aiohttp_app(async_app), sock=sock)
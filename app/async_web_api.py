@@ -0,0 +1,82 @@
+"""
+Async Web API Dispatching for HOLMES
+
+AsyncWebClient counterparts of the dispatching client and 429 retry handler in
+web_api, used by the async runtime. They share the process's WebApiDispatcher
+(rate limit buckets, retry policy and counters) with the sync client.
+
+Kept out of web_api because importing AsyncWebClient loads aiohttp, which the
+sync runtimes never need; WebApiDispatcher.async_client() imports this module on
+first use.
+"""
+
+import asyncio
+import time
+from typing import List
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.async_handler import AsyncRetryHandler
+from slack_sdk.http_retry.builtin_async_handlers import (
+    AsyncConnectionErrorRetryHandler,
+    AsyncRateLimitErrorRetryHandler,
+    AsyncServerErrorRetryHandler,
+)
+from slack_sdk.web.async_client import AsyncWebClient
+
+from metrics import SLACK_API_DURATION, SLACK_API_ERRORS
+from web_api import CallDropped, RetryAfterHandler, WebApiDispatcher, _call_channel, _error_label
+
+
+class AsyncRetryAfterHandler(AsyncRateLimitErrorRetryHandler):
+    """AsyncWebClient variant of RetryAfterHandler"""
+
+    def __init__(self, dispatcher: WebApiDispatcher, max_retry_count: int = 3, jitter: float = 1.0):
+        super().__init__(max_retry_count=max_retry_count)
+        self._handler = RetryAfterHandler(dispatcher, max_retry_count, jitter)
+
+    async def prepare_for_next_attempt_async(self, *, state, request, response=None, error=None):
+        if response is None:
+            raise error
+        state.next_attempt_requested = True
+        await asyncio.sleep(self._handler._delay(request, response))
+        state.increment_current_attempt()
+
+
+class AsyncDispatchingWebClient(AsyncWebClient):
+    """AsyncWebClient that paces calls through the dispatcher; pooling comes from its shared session"""
+
+    def __init__(self, dispatcher: WebApiDispatcher, **kwargs):
+        super().__init__(**kwargs)
+        self.dispatcher = dispatcher
+
+    async def api_call(self, api_method: str, **kwargs):
+        try:
+            delay = self.dispatcher.admit(api_method, _call_channel(kwargs))
+        except CallDropped:
+            SLACK_API_ERRORS.inc(api_method, 'dropped')
+            raise
+        if delay:
+            await asyncio.sleep(delay)
+        started = time.perf_counter()
+        try:
+            return await super().api_call(api_method, **kwargs)
+        except SlackApiError as e:
+            if e.response.status_code == 429:
+                self.dispatcher.count('dropped')
+            SLACK_API_ERRORS.inc(api_method, _error_label(e))
+            raise
+        except Exception as e:
+            SLACK_API_ERRORS.inc(api_method, _error_label(e))
+            raise
+        finally:
+            SLACK_API_DURATION.observe(time.perf_counter() - started, api_method)
+
+
+def build_async_retry_handlers(dispatcher: WebApiDispatcher) -> List[AsyncRetryHandler]:
+    """Async retry handlers with the same policy as the dispatcher's sync client"""
+    return [
+        AsyncRetryAfterHandler(dispatcher, max_retry_count=dispatcher.max_retries),
+        AsyncConnectionErrorRetryHandler(max_retry_count=dispatcher.max_retries,
+                                         interval_calculator=dispatcher.backoff),
+        AsyncServerErrorRetryHandler(max_retry_count=dispatcher.max_retries, interval_calculator=dispatcher.backoff),
+    ]
@@ -0,0 +1,150 @@
+"""
+Block Kit Templates for HOLMES
+
+Message builders used to rebuild the same nested dict/list trees on every call,
+even when only a user ID and a timestamp change. A BlockTemplate is compiled
+once at import time instead:
+
+- Every string in the tree is a str.format() template. Fields bound through
+  `constants` (e.g. dashboard URLs) are substituted at compile time; the
+  remaining fields (e.g. `{user_id}`, `{timestamp}`) are filled in by render()
+  with str.format_map.
+  Literal braces, such as Slack's `{date_pretty}` date tokens, are written `{{...}}`.
+- Parts of the tree without fields are built once and shared by every render;
+  render() only copies the containers on the path to a field.
+
+TextTemplate compiles a single string the same way, e.g. a message's fallback text.
+
+This pays off for trees that are mostly static, such as the decision tree's
+nodes. For small per-message blocks whose strings all carry fields, a function
+returning literals is as fast or faster (see benchmarks/blocks_benchmark.py).
+
+Rendered blocks share their static parts with the template, so treat them as
+read-only (the Slack client only serializes them).
+
+Usage:
+    ALERT = BlockTemplate([...'<@{user_id}> in <{urls[main_dashboard]}|Dashboard>'...],
+                          constants={'urls': MONITORING_URLS})
+    blocks = ALERT.render(user_id=user_id)
+"""
+
+import string
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+_FORMATTER = string.Formatter()
+
+Renderer = Callable[[Mapping[str, Any]], Any]
+
+
+def _escape(text: str) -> str:
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def _bind_constants(text: str, constants: Mapping[str, Any]) -> str:
+    """Substitute the fields of `text` found in constants, keeping the others as fields"""
+    parts = []
+    for literal, field_name, format_spec, conversion in _FORMATTER.parse(text):
+        parts.append(_escape(literal))
+        if field_name is None:
+            continue
+        root = field_name.split('.', 1)[0].split('[', 1)[0]
+        if root in constants:
+            value, _ = _FORMATTER.get_field(field_name, (), constants)
+            value = _FORMATTER.convert_field(value, conversion)
+            parts.append(_escape(format(value, format_spec or '')))
+        else:
+            parts.append('{' + field_name + (f"!{conversion}" if conversion else '')
+                         + (f":{format_spec}" if format_spec else '') + '}')
+    return ''.join(parts)
+
+
+def _has_fields(text: str) -> bool:
+    return any(field_name is not None for _, field_name, _, _ in _FORMATTER.parse(text))
+
+
+def _field_roots(text: str):
+    return {name.split('.', 1)[0].split('[', 1)[0] for _, name, _, _ in _FORMATTER.parse(text) if name}
+
+
+class BlockTemplate:
+    """Block Kit tree compiled once, rendered by substituting per-message fields"""
+
+    __slots__ = ('fields', '_static', '_render')
+
+    def __init__(self, blocks: List[Dict[str, Any]], constants: Optional[Mapping[str, Any]] = None):
+        self.fields = set()
+        self._static, self._render = self._compile(blocks, constants or {})
+        self.fields = frozenset(self.fields)
+
+    def _compile(self, node: Any, constants: Mapping[str, Any]) -> Tuple[Any, Optional[Renderer]]:
+        """Return (static value, None) for a node without fields, else (None, renderer)"""
+        if isinstance(node, str):
+            text = _bind_constants(node, constants)
+            if not _has_fields(text):
+                return text.format(), None
+            self.fields.update(_field_roots(text))
+            return None, text.format_map
+
+        if isinstance(node, dict):
+            static, dynamic = {}, []
+            for key, value in node.items():
+                static[key], renderer = self._compile(value, constants)
+                if renderer is not None:
+                    dynamic.append((key, renderer))
+            if not dynamic:
+                return static, None
+
+            def render_dict(values, static=static, dynamic=tuple(dynamic)):
+                rendered = static.copy()
+                for key, renderer in dynamic:
+                    rendered[key] = renderer(values)
+                return rendered
+            return None, render_dict
+
+        if isinstance(node, (list, tuple)):
+            static, dynamic = [], []
+            for index, value in enumerate(node):
+                value, renderer = self._compile(value, constants)
+                static.append(value)
+                if renderer is not None:
+                    dynamic.append((index, renderer))
+            if not dynamic:
+                return static, None
+
+            def render_list(values, static=static, dynamic=tuple(dynamic)):
+                rendered = static.copy()
+                for index, renderer in dynamic:
+                    rendered[index] = renderer(values)
+                return rendered
+            return None, render_list
+
+        return node, None
+
+    def render(self, **values) -> List[Dict[str, Any]]:
+        """Blocks with fields substituted; static subtrees are shared, not copied"""
+        if self._render is None:
+            # A fresh top-level list, so callers may append blocks to it
+            return list(self._static)
+        return self._render(values)
+
+
+class TextTemplate:
+    """A single string compiled like the strings of a BlockTemplate, e.g. a message's fallback text"""
+
+    __slots__ = ('fields', '_text', '_render')
+
+    def __init__(self, text: str, constants: Optional[Mapping[str, Any]] = None):
+        text = _bind_constants(text, constants or {})
+        if _has_fields(text):
+            self.fields = frozenset(_field_roots(text))
+            self._text = None
+            self._render = text.format_map
+        else:
+            self.fields = frozenset()
+            self._text = text.format()
+            self._render = None
+
+    def render(self, **values) -> str:
+        if self._render is None:
+            return self._text
+        return self._render(values)
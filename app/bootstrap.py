@@ -0,0 +1,145 @@
+"""
+Startup Sequence for HOLMES
+
+HOLMES starts in explicit steps rather than as a side effect of importing
+app/main.py:
+
+1. Import: app/main.py builds its handlers, stores and the Bolt App without any
+   network call (the App skips its construction-time auth.test) and without
+   importing a server adapter.
+2. Listen: main() imports only what the selected mode serves with: the Socket
+   Mode runtime and a standard library status server, Flask's adapter (and
+   gunicorn outside development) for HTTP, or aiohttp for the async runtime.
+3. Warm up: once the process listens, deferred steps, such as the auth.test Bolt
+   would otherwise make on the first request, run on a background thread and are
+   retried with backoff until they succeed.
+4. Ready: READINESS is ready when every deferred step has succeeded and every
+   readiness check passes (e.g. a Socket Mode connection is open). /ready answers
+   200 then and 503 before, while /health stays a liveness check.
+
+Deferred steps run once per process, so each gunicorn worker warms up after it
+is forked.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODES = ('socket', 'http', 'async')
+
+
+def select_mode() -> str:
+    """Runtime picked by the environment: "async" (HOLMES_RUNTIME), "socket" (SLACK_APP_TOKEN) or "http\""""
+    if os.environ.get("HOLMES_RUNTIME") == "async":
+        return 'async'
+    return 'socket' if os.environ.get("SLACK_APP_TOKEN") else 'http'
+
+
+class Readiness:
+    """Deferred startup steps and readiness checks of this process"""
+
+    def __init__(self, retry_delays: Sequence[float] = (1, 2, 5, 10, 30)):
+        self.retry_delays = retry_delays
+        self._steps: List[Tuple[str, Callable[[], Any]]] = []
+        self._checks: List[Tuple[str, Callable[[], bool]]] = []
+        self._lock = threading.Lock()
+        self._done: set = set()
+        self._errors: Dict[str, str] = {}
+        self._pid: Optional[int] = None
+        self._started = 0.0
+        self._warmup_seconds: Optional[float] = None
+
+    def defer(self, name: str, step: Callable[[], Any]):
+        """Run step() once the process is listening"""
+        self._steps.append((name, step))
+
+    def require(self, name: str, check: Callable[[], bool]):
+        """Report not ready while check() is false"""
+        self._checks.append((name, check))
+
+    def start(self):
+        """Run the deferred steps on a background thread, once per process"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return self
+            self._pid = os.getpid()
+            self._done = set()
+            self._errors = {}
+            self._started = time.monotonic()
+            self._warmup_seconds = None
+        threading.Thread(target=self._run, name='holmes-startup', daemon=True).start()
+        return self
+
+    def _run(self):
+        for name, step in self._steps:
+            attempt = 0
+            while True:
+                try:
+                    step()
+                    break
+                except Exception as e:
+                    delay = self.retry_delays[min(attempt, len(self.retry_delays) - 1)]
+                    attempt += 1
+                    with self._lock:
+                        self._errors[name] = f"{type(e).__name__}: {e}"
+                    logger.warning("Startup step failed, retrying", exc_info=True, extra={
+                        'step': name, 'attempt': attempt, 'retry_seconds': delay
+                    })
+                    time.sleep(delay)
+            with self._lock:
+                self._done.add(name)
+                self._errors.pop(name, None)
+        with self._lock:
+            self._warmup_seconds = time.monotonic() - self._started
+        logger.info("Startup steps finished", extra={'seconds': round(self._warmup_seconds, 3)})
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            if self._pid != os.getpid() or len(self._done) < len(self._steps):
+                return False
+        return all(check() for _, check in self._checks)
+
+    def probe(self) -> Tuple[int, Dict[str, Any]]:
+        """HTTP status and body for /ready"""
+        status = self.stats()
+        return (200 if status['ready'] else 503), status
+
+    def stats(self) -> Dict[str, Any]:
+        """Readiness, pending steps, failing checks and the last error of each failing step"""
+        with self._lock:
+            started = self._pid == os.getpid()
+            pending = [name for name, _ in self._steps if not started or name not in self._done]
+            errors = dict(self._errors) if started else {}
+            warmup_seconds = self._warmup_seconds if started else None
+        failing = [name for name, check in self._checks if not check()]
+        return {
+            'ready': started and not pending and not failing,
+            'pending': pending,
+            'failing': failing,
+            'errors': errors,
+            'warmup_seconds': None if warmup_seconds is None else round(warmup_seconds, 3),
+        }
+
+
+def warm_authorization(bolt_app, client):
+    """Make the auth.test that Bolt defers to the first request and cache it in its authorization middleware
+
+    Returns the cached auth.test response (None if the app has no such middleware),
+    so later callers get the bot's identity without another call.
+    """
+    # App keeps its middleware in _middleware_list, AsyncApp in _async_middleware_list
+    middleware_list = getattr(bolt_app, '_middleware_list', None) or getattr(bolt_app, '_async_middleware_list', [])
+    for middleware in middleware_list:
+        # SingleTeamAuthorization, or its AsyncApp variant
+        if hasattr(middleware, 'auth_test_result'):
+            if not middleware.auth_test_result:
+                middleware.auth_test_result = client.auth_test()
+            return middleware.auth_test_result
+    return None
+
+
+READINESS = Readiness()
@@ -0,0 +1,230 @@
+"""
+Channel Registry for HOLMES
+
+Indexes the channel configuration (MONITORED_CHANNELS and the named CHANNELS in
+main.py) so the message path can drop unmonitored traffic with one dict lookup,
+before any text processing or logging.
+
+Each monitored channel has a ChannelPolicy:
+- categories: alert categories HOLMES responds to (None for all)
+- rate_cap: maximum responses per minute in the channel (0 for no cap)
+- response_mode: 'thread' (reply in the alert's thread), 'channel' (post in the
+  channel) or 'silent' (detect and log only)
+
+Overrides are read from the JSON file in HOLMES_CHANNELS_FILE, and the file is
+re-read when it changes (checked at most every CHANNELS_RELOAD_SECONDS). A reload
+builds a new index and swaps it in one assignment, so lookups never take a lock.
+An invalid file fails startup; an invalid edit is logged and the previous index kept:
+
+    {
+      "defaults": {"categories": ["revenue", "traffic"], "rate_cap": 30, "response_mode": "thread"},
+      "direct_messages": true,
+      "channels": {
+        "C08T82KB0M7": {"name": "incidents", "rate_cap": 10},
+        "C0123456789": {"monitored": false, "name": "okr"}
+      }
+    }
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from slack_bolt.response import BoltResponse
+
+from web_api import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_MODES = ('thread', 'channel', 'silent')
+
+DEFAULT_POLICY = {'categories': None, 'rate_cap': 30, 'response_mode': 'thread'}
+
+
+def _check_object(value: Any, what: str):
+    if not isinstance(value, dict):
+        raise ValueError(f"Channel config {what} must be an object, not {type(value).__name__}")
+
+
+def _policy_settings(settings: Mapping[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in settings.items() if key in DEFAULT_POLICY}
+
+
+class ChannelPolicy:
+    """How HOLMES responds to alerts in one channel"""
+
+    __slots__ = ('channel_id', 'name', 'categories', 'rate_cap', 'response_mode', '_bucket', '_lock')
+
+    def __init__(self, channel_id: str, name: Optional[str] = None, categories: Optional[Iterable[str]] = None,
+                 rate_cap: float = 30, response_mode: str = 'thread'):
+        if response_mode not in RESPONSE_MODES:
+            raise ValueError(f"Unknown response_mode {response_mode!r} for channel {channel_id}")
+        if categories is not None and (isinstance(categories, str) or
+                                       not all(isinstance(category, str) for category in categories)):
+            raise ValueError(f"categories of channel {channel_id} must be a list of category names")
+        if isinstance(rate_cap, bool) or not isinstance(rate_cap, (int, float)) or rate_cap < 0:
+            raise ValueError(f"rate_cap of channel {channel_id} must be a number of responses per minute")
+        self.channel_id = channel_id
+        self.name = name
+        self.categories = frozenset(categories) if categories is not None else None
+        self.rate_cap = rate_cap
+        self.response_mode = response_mode
+        # The cap allows a burst of a full minute's worth of responses
+        self._bucket = TokenBucket(rate_cap / 60, rate_cap) if rate_cap else None
+        self._lock = threading.Lock()
+
+    def handles(self, category: str) -> bool:
+        return self.categories is None or category in self.categories
+
+    def allow(self) -> bool:
+        """Consume one response from the rate cap; False if the channel is over it"""
+        if self._bucket is None:
+            return True
+        with self._lock:
+            if self._bucket.wait_time(time.monotonic()) > 0:
+                return False
+            self._bucket.take()
+            return True
+
+
+class ChannelRegistry:
+    """Hot-reloadable index of monitored channels and channel names"""
+
+    def __init__(self, monitored: Iterable[str], named: Mapping[str, str], path: Optional[str] = None,
+                 reload_interval: float = 5.0):
+        self._base_monitored = list(monitored)
+        self._base_named = dict(named)
+        self.path = path
+        self.reload_interval = reload_interval
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._index: Dict[str, ChannelPolicy] = {}
+        self._names: Dict[str, str] = {}
+        self._dm_policy: Optional[ChannelPolicy] = None
+        # There is no previous index to fall back on: an invalid file fails startup
+        self.reload(strict=True)
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def _read_overrides(self) -> Dict[str, Any]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as config_file:
+                return json.load(config_file)
+        except FileNotFoundError:
+            logger.warning("Channel config file not found", extra={'path': self.path})
+            return {}
+
+    def _build(self, overrides: Dict[str, Any]):
+        _check_object(overrides, 'channel config')
+        _check_object(overrides.get('defaults', {}), 'defaults')
+        _check_object(overrides.get('channels', {}), 'channels')
+        defaults = {**DEFAULT_POLICY, **_policy_settings(overrides.get('defaults', {}))}
+        entries: Dict[str, Dict[str, Any]] = {channel: {} for channel in self._base_monitored}
+        names = dict(self._base_named)
+        for channel, settings in overrides.get('channels', {}).items():
+            _check_object(settings, f"channel {channel}")
+            if not isinstance(settings.get('name') or '', str):
+                raise ValueError(f"Channel {channel} name must be a string")
+            if settings.get('name'):
+                names[settings['name']] = channel
+            if settings.get('monitored', True):
+                entries[channel] = settings
+            else:
+                entries.pop(channel, None)
+
+        # Channels known only by name get their name on the policy for logging
+        name_of = {channel: name for name, channel in names.items()}
+        index = {}
+        for channel, settings in entries.items():
+            policy = {**defaults, **_policy_settings(settings)}
+            index[channel] = ChannelPolicy(channel, name=settings.get('name') or name_of.get(channel), **policy)
+        dm_policy = ChannelPolicy('direct_messages', **defaults) if overrides.get('direct_messages', True) else None
+        return index, names, dm_policy
+
+    def reload(self, strict: bool = False) -> bool:
+        """Rebuild the index from the config file; if it is invalid, raise when strict, else keep the current one"""
+        # Recorded even on failure, so a broken file is retried only once it changes again
+        self._mtime = self._file_mtime() if self.path else None
+        try:
+            index, names, dm_policy = self._build(self._read_overrides())
+        except (OSError, ValueError, TypeError):
+            if strict:
+                raise
+            logger.exception("Invalid channel config, keeping the previous one", extra={'path': self.path})
+            return False
+        # Swapped by assignment, so lookups never see a half-built index
+        self._index, self._names, self._dm_policy = index, names, dm_policy
+        logger.info("Channel registry loaded", extra={
+            'monitored': len(index), 'named': len(names), 'path': self.path
+        })
+        return True
+
+    def _check_for_changes(self, now: float):
+        with self._reload_lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            if self._file_mtime() != self._mtime:
+                self.reload()
+
+    def policy_for(self, channel: Optional[str]) -> Optional[ChannelPolicy]:
+        """Policy of a monitored channel (or DM), None if HOLMES should ignore it"""
+        if self.path:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._check_for_changes(now)
+        policy = self._index.get(channel)
+        if policy is None and channel and channel[0] == 'D':
+            return self._dm_policy
+        return policy
+
+    def channel_id(self, name: str) -> Optional[str]:
+        """Channel ID configured under a name such as 'incidents'"""
+        return self._names.get(name)
+
+    def monitored_channels(self):
+        return list(self._index)
+
+
+def build_channel_filter_middleware(registry: ChannelRegistry):
+    """Global Bolt middleware that acks and drops messages from unmonitored channels"""
+
+    def channel_filter_middleware(body, next):
+        event = body.get('event')
+        if event is not None and event.get('type') == 'message' and registry.policy_for(event.get('channel')) is None:
+            return BoltResponse(status=200, body="")
+        next()
+
+    return channel_filter_middleware
+
+
+def build_async_channel_filter_middleware(registry: ChannelRegistry):
+    """AsyncApp variant of build_channel_filter_middleware"""
+
+    async def channel_filter_middleware(body, next):
+        event = body.get('event')
+        if event is not None and event.get('type') == 'message' and registry.policy_for(event.get('channel')) is None:
+            return BoltResponse(status=200, body="")
+        await next()
+
+    return channel_filter_middleware
+
+
+def create_channel_registry(monitored: Iterable[str], named: Mapping[str, str]) -> ChannelRegistry:
+    """Registry of the built-in channels plus overrides from HOLMES_CHANNELS_FILE"""
+    return ChannelRegistry(
+        monitored,
+        named,
+        path=os.environ.get('HOLMES_CHANNELS_FILE') or None,
+        reload_interval=float(os.environ.get('CHANNELS_RELOAD_SECONDS', 5)),
+    )
@@ -0,0 +1,110 @@
+"""
+Alert Classifier for HOLMES
+
+Compiles the keyword patterns from ALERT_PATTERNS once at startup into a matcher
+that returns per-category scores without re-lowercasing patterns on every call.
+
+Two matching strategies are available:
+- 'scan': substring checks over the precomputed, deduplicated pattern tuple.
+  CPython's substring search is fast enough that this wins for small pattern sets.
+- 'regex': one trie-factored regular expression that visits the text in a single
+  pass, so its cost stays flat as the number of patterns grows.
+The strategy is picked automatically from the pattern count; both give results
+identical to the original per-pattern substring scan.
+"""
+
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+# Measured crossover where the single regex overtakes per-pattern scanning
+SINGLE_PASS_MIN_PATTERNS = 128
+
+
+def _build_trie_regex(patterns: List[str]) -> str:
+    """Build a regex alternation with common prefixes factored out into a trie"""
+    trie: Dict = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def emit(node: Dict) -> str:
+        # The optional group is greedy, so the longest pattern at a position wins
+        branches = [re.escape(char) + emit(node[char]) for char in sorted(k for k in node if k)]
+        if not branches:
+            return ''
+        terminal = '' in node
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        body = '(?:' + '|'.join(branches) + ')'
+        return body + '?' if terminal else body
+
+    return emit(trie)
+
+
+class AlertClassifier:
+    """Precompiled multi-pattern matcher returning per-category scores"""
+
+    def __init__(self, patterns: Dict[str, List[str]], strategy: Optional[str] = None):
+        self.categories: Tuple[str, ...] = tuple(patterns)
+
+        # Each distinct lowercased pattern maps to the categories (with multiplicity)
+        # it counts towards, e.g. 'timeout' scores for both errors and latency
+        pattern_categories: Dict[str, List[int]] = {}
+        for index, category in enumerate(self.categories):
+            for pattern in patterns[category]:
+                pattern_categories.setdefault(pattern.lower(), []).append(index)
+        self._pattern_categories = {p: tuple(c) for p, c in pattern_categories.items()}
+        self._patterns: Tuple[str, ...] = tuple(self._pattern_categories)
+
+        if strategy is None:
+            strategy = 'regex' if len(self._patterns) >= SINGLE_PASS_MIN_PATTERNS else 'scan'
+        if strategy not in ('scan', 'regex'):
+            raise ValueError(f"Unknown classifier strategy: {strategy}")
+        self.strategy = strategy
+
+        # The regex reports only the longest pattern starting at each position, so
+        # remember which shorter patterns are implied by every match
+        self._implied: Dict[str, FrozenSet[str]] = {}
+        self._regex = None
+        if strategy == 'regex' and self._patterns:
+            self._implied = {
+                pattern: frozenset(other for other in self._patterns if other in pattern)
+                for pattern in self._patterns
+            }
+            self._regex = re.compile(_build_trie_regex(list(self._patterns)))
+
+    def find_patterns(self, text: str) -> FrozenSet[str]:
+        """Return the set of distinct patterns contained in the text"""
+        text_lower = text.lower()
+        if self._regex is None:
+            return frozenset(p for p in self._patterns if p in text_lower)
+
+        found = set()
+        search = self._regex.search
+        match = search(text_lower)
+        while match:
+            found |= self._implied[match.group()]
+            # Restart one character later so overlapping patterns are not skipped
+            position = match.start() + 1
+            if position > len(text_lower):
+                break
+            match = search(text_lower, position)
+        return frozenset(found)
+
+    def score(self, text: str) -> Dict[str, int]:
+        """Return the number of matching patterns for every category"""
+        counts = [0] * len(self.categories)
+        for pattern in self.find_patterns(text):
+            for index in self._pattern_categories[pattern]:
+                counts[index] += 1
+        return dict(zip(self.categories, counts))
+
+    def classify(self, text: str) -> Optional[str]:
+        """Return the highest scoring category, or None if nothing matches"""
+        scores = self.score(text)
+        if not scores or max(scores.values()) == 0:
+            return None
+        # Ties resolve to the first category in ALERT_PATTERNS order
+        return max(scores, key=scores.get)
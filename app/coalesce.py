@@ -0,0 +1,151 @@
+"""
+Alert Storm Coalescing for HOLMES
+
+A flapping monitor can post dozens of matching messages in a few minutes. Instead
+of answering each one with a new thread reply, repeats are folded into the first
+HOLMES response:
+
+- Alerts are keyed by (channel, category, fingerprint), where the fingerprint is
+  the message text with volatile parts (numbers, IDs, links, mentions) masked.
+- A storm lasts while repeats keep arriving within `window` seconds of the last one.
+- The first alert of a storm is answered normally. Repeats only bump a counter, and
+  the HOLMES response is edited with chat_update to show the running count, at
+  most once every `update_interval` seconds. A count that changes between updates
+  is flushed by a timer, so the final count is always shown.
+- A storm whose first alert got no response (rate capped, or the post failed) is
+  forgotten, so the next repeat is answered as a new alert instead of updating a
+  response that does not exist.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Parts of an alert that change between repeats of the same alert
+_VOLATILE = re.compile(r"<[^>]*>|https?://\S+|\b[0-9a-f]{8,}\b|\d+(?:[.,:]\d+)*")
+
+
+def fingerprint(text: str) -> str:
+    """Stable identifier of an alert message, ignoring numbers, IDs, links and mentions"""
+    normalized = ' '.join(_VOLATILE.sub('#', text.lower()).split())
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+class AlertStorm:
+    """Repeats of one alert in one channel"""
+
+    __slots__ = ('key', 'channel', 'category', 'text', 'user_id', 'first_seen', 'last_seen', 'count',
+                 'response_ts', 'reported_count', 'last_update', 'flush_pending')
+
+    def __init__(self, key: Tuple[str, str, str], text: str, user_id: str, now: float):
+        self.key = key
+        self.channel, self.category, _ = key
+        # Text of the first alert, which the response answers
+        self.text = text
+        self.user_id = user_id
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 1
+        self.response_ts: Optional[str] = None
+        self.reported_count = 0
+        self.last_update = 0.0
+        self.flush_pending = False
+
+
+class AlertCoalescer:
+    """Folds repeated alerts into one HOLMES response per storm"""
+
+    def __init__(self, window: float = 300, update_interval: float = 10, max_storms: int = 10000):
+        self.window = window
+        self.update_interval = update_interval
+        self.max_storms = max_storms
+        self._storms: "OrderedDict[Tuple[str, str, str], AlertStorm]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'storms': 0, 'coalesced': 0, 'updates': 0, 'unanswered': 0}
+
+    def observe(self, channel: str, category: str, text: str, user_id: str) -> Tuple[AlertStorm, bool]:
+        """Record an alert; return its storm and whether it is the first alert of the storm"""
+        key = (channel, category, fingerprint(text))
+        now = time.time()
+        with self._lock:
+            storm = self._storms.get(key)
+            is_new = storm is None or self.window <= 0 or now - storm.last_seen > self.window
+            if is_new:
+                storm = self._storms[key] = AlertStorm(key, text, user_id, now)
+                self._counters['storms'] += 1
+            else:
+                storm.count += 1
+                storm.last_seen = now
+                self._counters['coalesced'] += 1
+            self._storms.move_to_end(key)
+            # Drop storms that went quiet, plus the oldest ones over the cap
+            while self._storms:
+                oldest = next(iter(self._storms.values()))
+                if len(self._storms) > self.max_storms or now - oldest.last_seen > self.window:
+                    del self._storms[oldest.key]
+                else:
+                    break
+            return storm, is_new
+
+    def posted(self, storm: AlertStorm, response_ts: str, send_update: Callable[[], Any]):
+        """Record the HOLMES response of a storm; repeats seen meanwhile are flushed later"""
+        with self._lock:
+            storm.response_ts = response_ts
+            storm.reported_count = 1
+            storm.last_update = time.time()
+        self.repeated(storm, send_update)
+
+    def forget(self, storm: AlertStorm):
+        """Drop a storm whose first alert was not answered, so its next repeat counts as a new alert"""
+        with self._lock:
+            if storm.response_ts is not None:
+                return
+            if self._storms.get(storm.key) is storm:
+                del self._storms[storm.key]
+            self._counters['unanswered'] += 1
+
+    def repeated(self, storm: AlertStorm, send_update: Callable[[], Any]):
+        """Show the storm's new count now, or schedule it if the last update was too recent"""
+        with self._lock:
+            if storm.flush_pending or storm.response_ts is None or storm.count <= storm.reported_count:
+                return
+            wait = storm.last_update + self.update_interval - time.time()
+            if wait > 0:
+                storm.flush_pending = True
+                timer = threading.Timer(wait, self._flush, (storm, send_update))
+                timer.daemon = True
+                timer.start()
+                return
+            self._mark_updated(storm)
+        self._send(storm, send_update)
+
+    def _flush(self, storm: AlertStorm, send_update: Callable[[], Any]):
+        with self._lock:
+            storm.flush_pending = False
+            if storm.count <= storm.reported_count:
+                return
+            self._mark_updated(storm)
+        self._send(storm, send_update)
+
+    @staticmethod
+    def _send(storm: AlertStorm, send_update: Callable[[], Any]):
+        try:
+            send_update()
+        except Exception:
+            logger.exception("Alert storm update failed", extra={'channel': storm.channel, 'category': storm.category})
+
+    def _mark_updated(self, storm: AlertStorm):
+        storm.reported_count = storm.count
+        storm.last_update = time.time()
+        self._counters['updates'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of storm counters"""
+        with self._lock:
+            return {**self._counters, 'active': len(self._storms)}
@@ -0,0 +1,400 @@
+"""
+Investigation Decision Tree for HOLMES
+
+The investigation flow, i.e. the buttons HOLMES posts and how each click is
+answered, is data loaded from app/decision_tree.json (or HOLMES_DECISION_TREE_FILE):
+
+- nodes: messages HOLMES posts. Each has an optional header `title`, `sections`
+  (mrkdwn strings, or raw Block Kit blocks) and `buttons` (rows of
+  {"text", "action_id", "value", "style"}).
+- actions: what a click on each action_id does:
+  - node: the node to post
+  - post_to: "thread" (reply in the thread of the clicked message, the default),
+    "message" (replace the clicked message with the node) or a channel name from
+    the channel registry, e.g. "okr"
+  - selected / update: how the clicked message is rewritten so the channel sees
+    the choice. `"selected": "*Traffic Issue*"` is short for the usual
+    "✅ <@user> selected: *Traffic Issue*"; `update` gives {"text", "message"}.
+  - summary: notification text of the posted node
+  - escalate: {"channel", "text", "message"} posted to another channel as well
+  - category / state: recorded on the investigation session of the thread (see
+    sessions); state is one of sessions.STATES. Reaching `identified` or
+    `resolved` closes the thread's incident with this action_id as its resolution
+    (see incidents)
+
+Strings are str.format() templates (see block_templates). They may use the fields
+user_id, timestamp, channel (where the click happened) and post_channel, plus the
+constants urls and contacts. Adding a branch is a new node, an action and a button.
+
+The tree is compiled at load into BlockTemplates and a transition table keyed by
+action_id, so a click is answered with one dict lookup. The whole tree is
+validated first: a button whose action_id has no action (and no action plugin),
+an action pointing at a missing node, an update or escalate missing one of its
+strings, an unknown field, constant or channel name all reject it. An invalid tree fails startup; an invalid edit while running is
+logged and the current tree is kept. The file is re-read when it changes (checked
+at most every DECISION_TREE_RELOAD_SECONDS).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+from block_templates import BlockTemplate, TextTemplate
+from incidents import CLOSED_STATES, IncidentIndex
+from sessions import STATES, SessionStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TREE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'decision_tree.json')
+
+# Per-click values available to templates, besides the constants
+RENDER_FIELDS = frozenset({'user_id', 'timestamp', 'channel', 'post_channel'})
+
+POST_THREAD = 'thread'
+POST_MESSAGE = 'message'
+
+
+class DecisionTreeError(ValueError):
+    """The tree is invalid; `problems` lists everything wrong with it"""
+
+    def __init__(self, problems: List[str]):
+        super().__init__('; '.join(problems))
+        self.problems = problems
+
+
+class Transition:
+    """What a click on one action_id does, with its templates compiled"""
+
+    __slots__ = ('action_id', 'node', 'blocks', 'post_to', 'summary', 'update_text', 'update_blocks',
+                 'escalate_to', 'escalate_text', 'escalate_blocks', 'category', 'state')
+
+    def __init__(self, action_id: str, node: str, blocks: BlockTemplate, post_to: str, summary: TextTemplate):
+        self.action_id = action_id
+        self.node = node
+        self.blocks = blocks
+        self.post_to = post_to
+        self.summary = summary
+        self.update_text: Optional[TextTemplate] = None
+        self.update_blocks: Optional[BlockTemplate] = None
+        self.escalate_to: Optional[str] = None
+        self.escalate_text: Optional[TextTemplate] = None
+        self.escalate_blocks: Optional[BlockTemplate] = None
+        self.category: Optional[str] = None
+        self.state: Optional[str] = None
+
+
+class DecisionTree:
+    """Compiled tree: one BlockTemplate per node and the transition table"""
+
+    __slots__ = ('root', 'nodes', 'transitions')
+
+    def __init__(self, root: str, nodes: Dict[str, BlockTemplate], transitions: Dict[str, Transition]):
+        self.root = root
+        self.nodes = nodes
+        self.transitions = transitions
+
+
+def _section(text: str) -> Dict[str, Any]:
+    return {'type': 'section', 'text': {'type': 'mrkdwn', 'text': text}}
+
+
+def _node_blocks(node: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    blocks = []
+    if node.get('title'):
+        blocks.append({'type': 'header', 'text': {'type': 'plain_text', 'text': node['title']}})
+    for section in node.get('sections', []):
+        blocks.append(_section(section) if isinstance(section, str) else section)
+    for row in node.get('buttons', []):
+        elements = []
+        for button in row:
+            element = {
+                'type': 'button',
+                'text': {'type': 'plain_text', 'text': button['text']},
+                'value': button.get('value', button['action_id']),
+                'action_id': button['action_id'],
+            }
+            if button.get('style'):
+                element['style'] = button['style']
+            elements.append(element)
+        blocks.append({'type': 'actions', 'elements': elements})
+    return blocks
+
+
+def compile_tree(data: Mapping[str, Any], constants: Mapping[str, Any], known_actions: Iterable[str] = (),
+                 channel_id: Optional[Callable[[str], Optional[str]]] = None) -> DecisionTree:
+    """Validate the tree data and compile it; raises DecisionTreeError listing every problem"""
+    if not isinstance(data, dict):
+        raise DecisionTreeError([f"tree must be an object, not {type(data).__name__}"])
+    problems: List[str] = []
+    nodes_data = data.get('nodes', {})
+    actions_data = data.get('actions', {})
+    for key, value in (('nodes', nodes_data), ('actions', actions_data)):
+        if not isinstance(value, dict):
+            raise DecisionTreeError([f"{key} must be an object, not {type(value).__name__}"])
+    known_actions = set(known_actions)
+
+    def compile_template(factory, value, where):
+        try:
+            template = factory(value, constants)
+        except (KeyError, IndexError, AttributeError, ValueError) as e:
+            problems.append(f"{where}: cannot compile template ({e!r})")
+            return None
+        unknown = template.fields - RENDER_FIELDS
+        if unknown:
+            problems.append(f"{where}: unknown fields {sorted(unknown)}")
+        return template
+
+    def check_fields(value, fields, where) -> bool:
+        """Whether value is an object with every one of fields as a string"""
+        if not isinstance(value, dict):
+            problems.append(f"{where}: must be an object, not {type(value).__name__}")
+            return False
+        missing = [field for field in fields if not isinstance(value.get(field), str)]
+        if missing:
+            problems.append(f"{where}: missing {missing}")
+        return not missing
+
+    def check_channel(name, where):
+        if channel_id is not None and channel_id(name) is None:
+            problems.append(f"{where}: unknown channel {name!r}")
+
+    root = data.get('root')
+    if not isinstance(root, str) or root not in nodes_data:
+        problems.append(f"root node {root!r} does not exist")
+
+    nodes: Dict[str, BlockTemplate] = {}
+    for node_id, node in nodes_data.items():
+        if not isinstance(node, dict):
+            problems.append(f"node {node_id}: must be an object, not {type(node).__name__}")
+            continue
+        try:
+            blocks = _node_blocks(node)
+        except (KeyError, TypeError, AttributeError) as e:
+            problems.append(f"node {node_id}: malformed ({e!r})")
+            continue
+        template = compile_template(BlockTemplate, blocks, f"node {node_id}")
+        if template is not None:
+            nodes[node_id] = template
+        # Every button must lead somewhere: a transition here or an action plugin
+        for row in node.get('buttons', []):
+            for button in row:
+                target = button.get('action_id')
+                if target not in actions_data and target not in known_actions:
+                    problems.append(f"node {node_id}: button {target!r} has no action")
+
+    transitions: Dict[str, Transition] = {}
+    for action_id, action in actions_data.items():
+        where = f"action {action_id}"
+        if not isinstance(action, dict):
+            problems.append(f"{where}: must be an object, not {type(action).__name__}")
+            continue
+        node_id = action.get('node')
+        if not isinstance(node_id, str) or node_id not in nodes_data:
+            problems.append(f"{where}: node {node_id!r} does not exist")
+            continue
+        post_to = action.get('post_to', POST_THREAD)
+        if not isinstance(post_to, str):
+            problems.append(f"{where}: post_to must be a string")
+        elif post_to not in (POST_THREAD, POST_MESSAGE):
+            check_channel(post_to, where)
+        summary = compile_template(TextTemplate, action.get('summary') or node_id, where)
+        if node_id not in nodes or summary is None:
+            continue
+        transition = Transition(action_id, node_id, nodes[node_id], post_to, summary)
+        transition.category = action.get('category')
+        transition.state = action.get('state')
+        if transition.state is not None and transition.state not in STATES:
+            problems.append(f"{where}: unknown state {transition.state!r}")
+
+        update = action.get('update')
+        if action.get('selected'):
+            update = {'text': f"✅ User selected: {action['selected']}",
+                      'message': f"✅ <@{{user_id}}> selected: {action['selected']}"}
+        if update and check_fields(update, ('text', 'message'), f"{where} update") and post_to != POST_MESSAGE:
+            transition.update_text = compile_template(TextTemplate, update['text'], f"{where} update")
+            transition.update_blocks = compile_template(BlockTemplate, [_section(update['message'])], f"{where} update")
+
+        escalate = action.get('escalate')
+        if escalate and check_fields(escalate, ('channel', 'text', 'message'), f"{where} escalation"):
+            check_channel(escalate['channel'], f"{where} escalation")
+            transition.escalate_to = escalate['channel']
+            transition.escalate_text = compile_template(TextTemplate, escalate['text'], f"{where} escalation")
+            transition.escalate_blocks = compile_template(
+                BlockTemplate, [_section(escalate['message'])], f"{where} escalation")
+        transitions[action_id] = transition
+
+    if problems:
+        raise DecisionTreeError(problems)
+
+    unreachable = set(nodes_data) - {root} - {action.get('node') for action in actions_data.values()}
+    if unreachable:
+        logger.warning("Decision tree nodes no action leads to", extra={'nodes': sorted(unreachable)})
+    return DecisionTree(root, nodes, transitions)
+
+
+class DecisionTreeEngine:
+    """Answers investigation clicks from the hot-reloadable decision tree"""
+
+    def __init__(self, path: str, constants: Mapping[str, Any], channel_id: Callable[[str], Optional[str]],
+                 known_actions: Iterable[str] = (), reload_interval: float = 5.0,
+                 sessions: Optional[SessionStore] = None, incidents: Optional[IncidentIndex] = None):
+        self.path = path
+        self.sessions = sessions
+        self.incidents = incidents
+        self.constants = dict(constants)
+        self.channel_id = channel_id
+        self.known_actions = frozenset(known_actions)
+        self.reload_interval = reload_interval
+        self._next_check = time.monotonic() + reload_interval
+        self._reload_lock = threading.Lock()
+        # An invalid tree at startup raises instead of starting without one
+        self._mtime = os.path.getmtime(path)
+        self._tree = self._load()
+
+    def _load(self) -> DecisionTree:
+        with open(self.path) as tree_file:
+            data = json.load(tree_file)
+        tree = compile_tree(data, self.constants, self.known_actions, self.channel_id)
+        logger.info("Decision tree loaded", extra={
+            'path': self.path, 'nodes': len(tree.nodes), 'actions': len(tree.transitions)
+        })
+        return tree
+
+    def reload(self) -> bool:
+        """Recompile the tree from its file; keep the current one if the file is invalid"""
+        # Recorded even on failure, so a broken file is retried only once it changes again
+        try:
+            self._mtime = os.path.getmtime(self.path)
+            tree = self._load()
+        except Exception as e:
+            # Whatever is wrong with the edit, clicks keep being answered from the current tree
+            logger.error("Invalid decision tree, keeping the previous one", exc_info=not isinstance(e, ValueError),
+                         extra={'path': self.path, 'problems': getattr(e, 'problems', [str(e)])})
+            return False
+        # Swapped by assignment, so a click never sees a half-built table
+        self._tree = tree
+        return True
+
+    def _check_for_changes(self, now: float):
+        with self._reload_lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            try:
+                changed = os.path.getmtime(self.path) != self._mtime
+            except OSError:
+                changed = False
+            if changed:
+                self.reload()
+
+    @property
+    def tree(self) -> DecisionTree:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._check_for_changes(now)
+        return self._tree
+
+    def transition(self, action_id: Optional[str]) -> Optional[Transition]:
+        return self.tree.transitions.get(action_id)
+
+    def escalates(self, action_id: Optional[str]) -> bool:
+        """Whether a click on action_id escalates: it pages another channel or sets the escalated state"""
+        transition = self.transition(action_id)
+        return transition is not None and (transition.escalate_to is not None or transition.state == 'escalated')
+
+    def node_blocks(self, node_id: Optional[str] = None, **values) -> List[Dict[str, Any]]:
+        """Blocks of a node (the root by default), e.g. for /holmes"""
+        tree = self.tree
+        return tree.nodes[node_id or tree.root].render(**values)
+
+    def handle(self, ack, body, respond, client):
+        """Listener for every investigation button"""
+        ack()
+        action_id = (body.get('actions') or [{}])[0].get('action_id')
+        user_id = body.get('user', {}).get('id', 'unknown')
+        transition = self.transition(action_id)
+        if transition is None:
+            logger.warning("No handler for action", extra={'action_id': action_id, 'user_id': user_id})
+            return
+
+        logger.info("Button clicked", extra={'action_id': action_id, 'node': transition.node, 'user_id': user_id})
+        try:
+            self.answer(transition, body, client, user_id)
+        except Exception:
+            logger.exception("Error answering action", extra={'action_id': action_id, 'body_keys': list(body.keys())})
+
+    def answer(self, transition: Transition, body: Dict[str, Any], client, user_id: str):
+        """Make the Web API calls of one transition"""
+        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
+        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
+        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
+        values = {'user_id': user_id, 'timestamp': int(time.time()), 'channel': channel, 'post_channel': channel}
+
+        if self.sessions is not None and channel and thread_ts:
+            # Recorded before the API calls, so a failed post still keeps the step
+            self.sessions.advance(channel, thread_ts, transition.action_id, transition.node, user_id,
+                                  category=transition.category, state=transition.state)
+        if self.incidents is not None and transition.state in CLOSED_STATES and channel and thread_ts:
+            self.incidents.close(channel, thread_ts, transition.action_id)
+
+        if transition.post_to == POST_MESSAGE:
+            client.chat_update(
+                channel=channel,
+                ts=message_ts,
+                text=transition.summary.render(**values),
+                blocks=transition.blocks.render(**values)
+            )
+        else:
+            post = {'channel': channel, 'thread_ts': thread_ts}
+            if transition.post_to != POST_THREAD:
+                target = self.channel_id(transition.post_to)
+                if target is not None:
+                    post = {'channel': target}
+                    values['post_channel'] = target
+                else:
+                    logger.warning("Channel not configured, answering in the thread", extra={
+                        'action_id': transition.action_id, 'channel_name': transition.post_to
+                    })
+
+            # Update the clicked message so everyone sees what was chosen
+            if transition.update_blocks is not None:
+                client.chat_update(
+                    channel=channel,
+                    ts=message_ts,
+                    text=transition.update_text.render(**values),
+                    blocks=transition.update_blocks.render(**values)
+                )
+            client.chat_postMessage(
+                **post,
+                blocks=transition.blocks.render(**values),
+                text=transition.summary.render(**values)
+            )
+
+        if transition.escalate_to is not None:
+            escalation_channel = self.channel_id(transition.escalate_to)
+            if escalation_channel:
+                client.chat_postMessage(
+                    channel=escalation_channel,
+                    text=transition.escalate_text.render(**values),
+                    blocks=transition.escalate_blocks.render(**values)
+                )
+        logger.debug("Answered action", extra={'action_id': transition.action_id, 'node': transition.node})
+
+
+def create_decision_tree(constants: Mapping[str, Any], channel_id: Callable[[str], Optional[str]],
+                         known_actions: Iterable[str] = (),
+                         sessions: Optional[SessionStore] = None,
+                         incidents: Optional[IncidentIndex] = None) -> DecisionTreeEngine:
+    """Engine for HOLMES_DECISION_TREE_FILE (default app/decision_tree.json)"""
+    return DecisionTreeEngine(
+        os.environ.get('HOLMES_DECISION_TREE_FILE') or DEFAULT_TREE_PATH,
+        constants,
+        channel_id,
+        known_actions=known_actions,
+        reload_interval=float(os.environ.get('DECISION_TREE_RELOAD_SECONDS', 5)),
+        sessions=sessions,
+        incidents=incidents,
+    )
@@ -0,0 +1,180 @@
+"""
+Idempotency Layer for HOLMES
+
+Drops duplicate Slack deliveries before any handler runs, so a redelivered event or
+a double-clicked button never reaches the Web API twice.
+
+Keys checked per payload:
+- Events: `event_id`, which Slack keeps the same across retries (X-Slack-Retry-Num).
+- Slash commands and button clicks: `trigger_id`, unique per interaction.
+- Button clicks: the (channel, message, action_id, user) of the click, for a short
+  window. Double clicks arrive as separate interactions with their own trigger_id
+  and action_ts, so only this key catches them; clicks by someone else on the same
+  button go through.
+
+Stores:
+- MemoryIdempotencyStore: per-process LRU with per-key TTL and a hard entry cap.
+- SQLiteIdempotencyStore: a local SQLite file shared by every worker process on the
+  host, fronted by the memory store so repeated keys never touch the disk.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from slack_bolt.response import BoltResponse
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryIdempotencyStore:
+    """TTL-bounded, size-capped LRU of recently seen keys"""
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def contains(self, key: str) -> bool:
+        """True if key is recorded and has not expired, without recording it"""
+        with self._lock:
+            expires_at = self._entries.get(key)
+            return expires_at is not None and expires_at > time.monotonic()
+
+    def seen(self, key: str, ttl: float = None) -> bool:
+        """Record key; return True if it was already recorded and has not expired"""
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                self._entries.move_to_end(key)
+                return True
+            self._entries[key] = now + (ttl or self.ttl)
+            self._entries.move_to_end(key)
+            # Evict least recently used entries, plus any expired ones at the old end
+            while self._entries:
+                oldest_key, oldest_expiry = next(iter(self._entries.items()))
+                if len(self._entries) > self.max_entries or oldest_expiry <= now:
+                    del self._entries[oldest_key]
+                else:
+                    break
+            return False
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteIdempotencyStore:
+    """Idempotency keys in a SQLite file shared between worker processes"""
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, ttl: float = 3600, max_entries: int = 100000):
+        self.path = path
+        self.ttl = ttl
+        self._memory = MemoryIdempotencyStore(ttl=ttl, max_entries=max_entries)
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency_keys (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections are never shared across threads or forked processes
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    def seen(self, key: str, ttl: float = None) -> bool:
+        """Record key; return True if any worker already recorded it and it has not expired"""
+        if self._memory.contains(key):
+            return True
+
+        now = time.time()
+        connection = self._connect()
+        # Insert the key, or revive it if expired; a no-op means another worker holds it
+        cursor = connection.execute(
+            "INSERT INTO idempotency_keys (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at "
+            "WHERE idempotency_keys.expires_at <= ?",
+            (key, now + (ttl or self.ttl), now),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            connection.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+        # Only once SQLite has recorded it: if the write fails, the redelivery must not look like a duplicate
+        self._memory.seen(key, ttl)
+        return cursor.rowcount == 0
+
+
+def get_idempotency_keys(body: Dict[str, Any], click_window: float) -> List[Tuple[str, float]]:
+    """Keys (with TTL override, 0 for the store default) identifying a Slack payload"""
+    keys = []
+    if body.get('event_id'):
+        keys.append((f"event:{body['event_id']}", 0))
+    if body.get('trigger_id'):
+        keys.append((f"trigger:{body['trigger_id']}", 0))
+    if body.get('type') == 'block_actions':
+        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
+        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
+        user_id = body.get('user', {}).get('id')
+        for action in body.get('actions', []):
+            keys.append((f"click:{channel}:{message_ts}:{action.get('action_id')}:{user_id}", click_window))
+    return keys
+
+
+def is_duplicate(store, body: Dict[str, Any], click_window: float) -> bool:
+    """Record every key of the payload; True if any was seen before"""
+    duplicate = False
+    for key, ttl in get_idempotency_keys(body, click_window):
+        # Record all keys, even after a hit, so later variants are caught too
+        if store.seen(key, ttl or None):
+            duplicate = True
+    return duplicate
+
+
+def build_dedup_middleware(store, click_window: float = 30):
+    """Global Bolt middleware that acks and drops duplicate deliveries"""
+
+    def dedup_middleware(body, request, next):
+        if is_duplicate(store, body, click_window):
+            retry = request.headers.get('x-slack-retry-num', [None])[0]
+            logger.info("Dropping duplicate delivery", extra={'payload_type': body.get('type'), 'retry_num': retry})
+            return BoltResponse(status=200, body="")
+        next()
+
+    return dedup_middleware
+
+
+def build_async_dedup_middleware(store, click_window: float = 30):
+    """AsyncApp variant of build_dedup_middleware"""
+
+    async def dedup_middleware(body, request, next):
+        if is_duplicate(store, body, click_window):
+            retry = request.headers.get('x-slack-retry-num', [None])[0]
+            logger.info("Dropping duplicate delivery", extra={'payload_type': body.get('type'), 'retry_num': retry})
+            return BoltResponse(status=200, body="")
+        await next()
+
+    return dedup_middleware
+
+
+def create_idempotency_store():
+    """Build the store selected by DEDUP_BACKEND (memory or sqlite)"""
+    ttl = float(os.environ.get('DEDUP_TTL_SECONDS', 3600))
+    max_entries = int(os.environ.get('DEDUP_MAX_ENTRIES', 100000))
+    if os.environ.get('DEDUP_BACKEND', 'memory') == 'sqlite':
+        path = os.environ.get('DEDUP_SQLITE_PATH', '/tmp/holmes-dedup.sqlite3')
+        return SQLiteIdempotencyStore(path, ttl=ttl, max_entries=max_entries)
+    return MemoryIdempotencyStore(ttl=ttl, max_entries=max_entries)
@@ -0,0 +1,376 @@
+"""
+Streaming Anomaly Detection for HOLMES
+
+Watches metric time series (ad requests, bid requests, spend, 5xx rate, p95/p99
+latency, ...) and raises alerts of the ALERT_PATTERNS categories by itself, instead
+of waiting for a human or another bot to post one.
+
+Series come from Prometheus queries listed in the JSON file in HOLMES_DETECTION_FILE.
+A query returning several series (e.g. `sum by (dc) (...)`) yields one series each:
+
+    {
+      "channel": "incidents",
+      "interval": 60,
+      "queries": [
+        {"name": "bid_requests", "category": "traffic", "direction": "drop",
+         "url": "https://prometheus.example.com", "query": "sum by (dc) (rate(bid_requests_total[5m]))"},
+        {"name": "p99_latency", "category": "latency", "direction": "spike",
+         "url": "https://prometheus.example.com", "query": "histogram_quantile(0.99, ...)"}
+      ]
+    }
+
+Every `interval` seconds all series are evaluated at once, as NumPy arrays with one
+row per series, by three detectors:
+
+- ewma: distance from an exponentially weighted mean, in EWMA standard deviations
+- robust_z: distance from the median of the last `window` values, in MADs
+- seasonal: distance from the same time of day (`season_seconds`, in `season_slots`
+  slots), tracked per slot with an EWMA of level and deviation
+
+A series fires when at least `min_votes` detectors agree in its `direction` ("drop",
+"spike" or "both"), once when it becomes anomalous; it fires again only after it
+has returned to normal. Memory is fixed by `capacity` (the maximum number of
+series): the last values are kept in one ring buffer per series, rows of a single
+array.
+
+The runner starts in each serving process (every gunicorn worker), never in a
+process that is about to fork. Given a lock file, only the process holding it
+evaluates, so each series is evaluated once per host; when that process exits the
+lock is released and another worker takes over on its next interval, with fresh
+detector state.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from enrichment import PrometheusProvider
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ('drop', 'spike', 'both')
+
+DETECTORS = ('ewma', 'robust_z', 'seasonal')
+
+# Scales MAD to a standard deviation for normally distributed values
+MAD_SCALE = 1.4826
+
+
+def row_median(values: np.ndarray) -> np.ndarray:
+    """Median of each row ignoring NaN (NaN for empty rows); np.nanmedian is ~6x slower on many short rows"""
+    ordered = np.sort(values, axis=1)  # NaN sorts last
+    counts = values.shape[1] - np.isnan(values).sum(axis=1)
+    low = np.maximum(counts - 1, 0) // 2
+    high = np.minimum(counts // 2, values.shape[1] - 1)
+    median = (np.take_along_axis(ordered, low[:, None], axis=1)[:, 0]
+              + np.take_along_axis(ordered, high[:, None], axis=1)[:, 0]) / 2
+    return np.where(counts > 0, median, np.nan)
+
+
+class Detection:
+    """A series that became anomalous"""
+
+    __slots__ = ('series', 'category', 'value', 'expected', 'score', 'detectors', 'timestamp')
+
+    def __init__(self, series: str, category: str, value: float, expected: float, score: float,
+                 detectors: List[str], timestamp: float):
+        self.series = series
+        self.category = category
+        self.value = value
+        self.expected = expected
+        self.score = score
+        self.detectors = detectors
+        self.timestamp = timestamp
+
+    @property
+    def text(self) -> str:
+        change = 'dropped' if self.value < self.expected else 'rose'
+        return (f"📡 HOLMES detected an anomaly: {self.series} {change} to {self.value:,.4g} "
+                f"(expected {self.expected:,.4g}, score {self.score:+.1f}; {', '.join(self.detectors)})")
+
+
+class DetectionEngine:
+    """Vectorized detectors over a fixed-capacity set of series"""
+
+    def __init__(self, capacity: int = 5000, window: int = 60, alpha: float = 0.1, threshold: float = 5.0,
+                 min_votes: int = 2, warmup: int = 10, season_seconds: float = 86400, season_slots: int = 288,
+                 season_alpha: float = 0.3, min_season_samples: int = 2, relative_floor: float = 0.02):
+        self.capacity = capacity
+        self.window = window
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_votes = min_votes
+        self.warmup = warmup
+        self.season_seconds = season_seconds
+        self.season_slots = season_slots
+        self.season_alpha = season_alpha
+        self.min_season_samples = min_season_samples
+        # Deviation scales never go below this fraction of the expected value
+        self.relative_floor = relative_floor
+
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.categories = np.empty(capacity, dtype=object)
+        # +1 where a rise is anomalous, -1 where a drop is, 0 for both
+        self.directions = np.zeros(capacity, dtype=np.int8)
+
+        self.ring = np.full((capacity, window), np.nan)
+        self.position = 0
+        self.samples = np.zeros(capacity, dtype=np.int64)
+        self.ewma_mean = np.zeros(capacity)
+        self.ewma_var = np.zeros(capacity)
+        self.season_level = np.full((capacity, season_slots), np.nan, dtype=np.float32)
+        self.season_dev = np.zeros((capacity, season_slots), dtype=np.float32)
+        self.season_samples = np.zeros((capacity, season_slots), dtype=np.uint8)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.dropped_series = 0
+
+    def register(self, name: str, category: str, direction: str = 'both') -> Optional[int]:
+        """Row of a series, added on first sight; None once capacity is reached"""
+        row = self.index.get(name)
+        if row is not None:
+            return row
+        if len(self.names) >= self.capacity:
+            self.dropped_series += 1
+            return None
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown direction {direction!r} for series {name}")
+        row = len(self.names)
+        self.names.append(name)
+        self.index[name] = row
+        self.categories[row] = category
+        self.directions[row] = {'drop': -1, 'spike': 1, 'both': 0}[direction]
+        return row
+
+    def _scale(self, deviation: np.ndarray, expected: np.ndarray) -> np.ndarray:
+        return np.maximum(deviation, np.maximum(self.relative_floor * np.abs(expected), 1e-9))
+
+    def _votes(self, scores: np.ndarray) -> np.ndarray:
+        """Whether each score is anomalous in its series' direction"""
+        directions = self.directions[:scores.shape[1]]
+        up = (directions >= 0) & (scores > self.threshold)
+        down = (directions <= 0) & (scores < -self.threshold)
+        return up | down
+
+    def evaluate(self, values: np.ndarray, timestamp: Optional[float] = None) -> List[Detection]:
+        """Score one tick of values (NaN where a series has no value), then learn from it"""
+        timestamp = time.time() if timestamp is None else timestamp
+        count = len(self.names)
+        x = values[:count]
+        present = ~np.isnan(x)
+        warm = present & (self.samples[:count] >= self.warmup)
+
+        # ewma: scored against the state before this value
+        mean, var = self.ewma_mean[:count], self.ewma_var[:count]
+        ewma_scores = (x - mean) / self._scale(np.sqrt(var), mean)
+
+        # robust_z: median and MAD of the ring buffer; rows without history give NaN scores
+        history = self.ring[:count]
+        median = row_median(history)
+        mad = row_median(np.abs(history - median[:, None]))
+        robust_scores = (x - median) / self._scale(MAD_SCALE * mad, median)
+
+        # seasonal: level and deviation of this time slot
+        slot = int((timestamp % self.season_seconds) / self.season_seconds * self.season_slots)
+        level = self.season_level[:count, slot].astype(float)
+        deviation = self.season_dev[:count, slot].astype(float)
+        seasonal_ready = self.season_samples[:count, slot] >= self.min_season_samples
+        with np.errstate(all='ignore'):
+            seasonal_scores = np.where(seasonal_ready, (x - level) / self._scale(MAD_SCALE * deviation, level), 0.0)
+
+        stacked = np.stack([ewma_scores, robust_scores, seasonal_scores])
+        stacked = np.nan_to_num(stacked, nan=0.0, posinf=0.0, neginf=0.0)
+        votes = self._votes(stacked)
+        anomalous = warm & (votes.sum(axis=0) >= self.min_votes)
+
+        fired = np.flatnonzero(anomalous & ~self.active[:count])
+        detections = []
+        for row in fired:
+            # The strongest voting detector gives the score and the expected value
+            voting = votes[:, row]
+            best = int(np.argmax(np.where(voting, np.abs(stacked[:, row]), -1)))
+            expected = (mean[row], median[row], level[row])[best]
+            detections.append(Detection(
+                self.names[row], self.categories[row], float(x[row]), float(expected), float(stacked[best, row]),
+                [name for name, vote in zip(DETECTORS, voting) if vote], timestamp,
+            ))
+        # Rows without a value keep their state
+        self.active[:count] = np.where(present, anomalous, self.active[:count])
+
+        self._learn(x, present, slot)
+        return detections
+
+    def _learn(self, x: np.ndarray, present: np.ndarray, slot: int):
+        count = len(x)
+        rows = np.flatnonzero(present)
+        values = x[rows]
+
+        first = self.samples[rows] == 0
+        mean = np.where(first, values, self.ewma_mean[rows])
+        delta = values - mean
+        self.ewma_mean[rows] = mean + self.alpha * delta
+        self.ewma_var[rows] = np.where(first, 0.0, (1 - self.alpha) * (self.ewma_var[rows] + self.alpha * delta * delta))
+        self.samples[rows] += 1
+
+        column = self.ring[:count, self.position]
+        column[:] = np.where(present, x, np.nan)
+        self.position = (self.position + 1) % self.window
+
+        # Plain averages over the first samples of a slot, so a young slot is not scored by its first value
+        seen = self.season_samples[rows, slot].astype(np.int64)
+        level = np.where(seen == 0, values, self.season_level[rows, slot])
+        with np.errstate(divide='ignore'):
+            level_alpha = np.maximum(self.season_alpha, 1 / (seen + 1))
+            dev_alpha = np.maximum(self.season_alpha, 1 / np.maximum(seen, 1))
+        dev = self.season_dev[rows, slot]
+        self.season_dev[rows, slot] = np.where(seen == 0, 0.0, dev + dev_alpha * (np.abs(values - level) - dev))
+        self.season_level[rows, slot] = level + level_alpha * (values - level)
+        self.season_samples[rows, slot] = np.minimum(seen + 1, 255)
+
+    def observe(self, readings: Mapping[str, float], category: str, direction: str = 'both') -> np.ndarray:
+        """Tick vector with the readings of one query placed at their series' rows"""
+        values = np.full(self.capacity, np.nan)
+        for name, value in readings.items():
+            row = self.register(name, category, direction)
+            if row is not None:
+                values[row] = value
+        return values
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'series': len(self.names),
+            'capacity': self.capacity,
+            'active': int(self.active.sum()),
+            'dropped_series': self.dropped_series,
+            'memory_mb': round(sum(array.nbytes for array in (
+                self.ring, self.season_level, self.season_dev, self.season_samples)) / 2 ** 20, 1),
+        }
+
+
+class SeriesQuery:
+    """A Prometheus query whose result series feed the engine"""
+
+    __slots__ = ('name', 'category', 'direction', 'provider')
+
+    def __init__(self, name: str, category: str, url: str, query: str, direction: str = 'both',
+                 headers: Optional[Mapping[str, str]] = None, timeout: float = 10.0):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown direction {direction!r} for query {name}")
+        self.name = name
+        self.category = category
+        self.direction = direction
+        self.provider = PrometheusProvider(name, url, query, headers=headers, timeout=timeout)
+
+    def fetch(self) -> Dict[str, float]:
+        return {f"{self.name}{labels}": value for labels, value in self.provider.fetch_vector().items()}
+
+
+class DetectionRunner:
+    """Evaluates the queries every interval on a background thread and reports detections"""
+
+    def __init__(self, engine: DetectionEngine, queries: Sequence[SeriesQuery], interval: float,
+                 on_detection: Callable[[Detection], None], channel: Optional[str] = None):
+        self.engine = engine
+        self.channel = channel
+        self.queries = list(queries)
+        self.interval = interval
+        self.on_detection = on_detection
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock_path: Optional[str] = None
+        self._lock_file = None
+        self._counters = {'ticks': 0, 'detections': 0, 'query_errors': 0}
+        self._last_tick_ms = 0.0
+
+    def tick(self, timestamp: Optional[float] = None) -> List[Detection]:
+        """Fetch every query and evaluate all series once"""
+        values = np.full(self.engine.capacity, np.nan)
+        for query in self.queries:
+            try:
+                readings = query.fetch()
+            except Exception as e:
+                self._counters['query_errors'] += 1
+                logger.warning("Detection query failed", extra={'query': query.name, 'error': repr(e)})
+                continue
+            tick_values = self.engine.observe(readings, query.category, query.direction)
+            values = np.where(np.isnan(tick_values), values, tick_values)
+        started = time.perf_counter()
+        detections = self.engine.evaluate(values, timestamp)
+        self._last_tick_ms = (time.perf_counter() - started) * 1000
+        self._counters['ticks'] += 1
+        self._counters['detections'] += len(detections)
+        for detection in detections:
+            logger.info("Anomaly detected", extra={
+                'series': detection.series, 'category': detection.category, 'score': round(detection.score, 1),
+                'detectors': detection.detectors
+            })
+            try:
+                self.on_detection(detection)
+            except Exception:
+                logger.exception("Error reporting detection", extra={'series': detection.series})
+        return detections
+
+    def leads(self) -> bool:
+        """Whether this process evaluates: there is no lock file, or it holds it"""
+        if self._lock_path is None or self._lock_file is not None:
+            return True
+        lock_file = open(self._lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held until this process exits; the OS releases it even if the process dies
+        self._lock_file = lock_file
+        logger.info("Anomaly detection leader", extra={'pid': os.getpid(), 'lock_path': self._lock_path})
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.leads():
+                    self.tick()
+            except Exception:
+                logger.exception("Detection tick failed")
+
+    def start(self, lock_path: Optional[str] = None):
+        """Evaluate on a background thread, once per process; with lock_path, only while holding that file"""
+        if self._pid == os.getpid():
+            return self
+        self._pid = os.getpid()
+        self._lock_path = lock_path
+        self._thread = threading.Thread(target=self._run, name='holmes-detection', daemon=True)
+        self._thread.start()
+        logger.info("Anomaly detection started", extra={
+            'queries': len(self.queries), 'interval': self.interval, 'lock_path': lock_path
+        })
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        leader = self._pid == os.getpid() and (self._lock_path is None or self._lock_file is not None)
+        return {**self._counters, 'leader': leader, 'last_tick_ms': round(self._last_tick_ms, 2),
+                **self.engine.stats()}
+
+
+def load_detection(path: str, categories: Iterable[str], on_detection: Callable[[Detection], None]) -> DetectionRunner:
+    """Runner for a detection file; categories are those of ALERT_PATTERNS, channel where detections go"""
+    with open(path) as detection_file:
+        config = json.load(detection_file)
+    categories = set(categories)
+    queries = []
+    for entry in config.get('queries', []):
+        if entry.get('category') not in categories:
+            raise ValueError(f"Detection query {entry.get('name')!r} has unknown category {entry.get('category')!r}")
+        queries.append(SeriesQuery(**entry))
+    engine = DetectionEngine(**config.get('engine', {}))
+    return DetectionRunner(engine, queries, float(config.get('interval', 60)), on_detection, config.get('channel'))
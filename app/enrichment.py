@@ -0,0 +1,297 @@
+"""
+Live Metric Enrichment for HOLMES
+
+Adds the current numbers for a classified alert (spend rate, bid request rate, DC
+latency, Temporal workflow failures, ...) to the HOLMES response, so responders
+do not have to open every dashboard first.
+
+Metric providers are listed in the JSON file in HOLMES_ENRICHMENT_FILE:
+
+    {
+      "providers": [
+        {"name": "Spend rate", "kind": "prometheus", "categories": ["revenue"],
+         "url": "https://prometheus.example.com", "query": "sum(rate(spend_usd_total[5m])) * 60",
+         "format": "${:,.0f}/min", "ttl": 30},
+        {"name": "Failed workflows (1h)", "kind": "json", "categories": ["revenue"],
+         "url": "https://temporal-metrics.example.com/failed?window=1h", "path": "data.count",
+         "headers": {"Authorization": "Bearer ${TEMPORAL_TOKEN}"}}
+      ]
+    }
+
+- kind "prometheus" runs an instant query against a Prometheus HTTP API (or a
+  Grafana data source proxy); kind "json" reads the number at a dotted `path` of a
+  JSON document. Other kinds can be added with register_provider_kind().
+- `categories` are the alert categories a provider applies to (all if omitted);
+  `${VAR}` in URLs and headers is read from the environment.
+
+All providers of a category are fetched concurrently on a shared thread pool when
+an alert is classified. Results are cached per provider for `ttl` seconds (errors
+for at most ERROR_TTL), and identical fetches in flight are coalesced, so an alert
+storm costs each source one request. Waiting is capped at ENRICHMENT_BUDGET_MS: a
+source that has not answered by then is shown as unavailable and the response is
+posted anyway; its late result still fills the cache for the next alert.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Type
+from urllib.parse import urlencode
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Failed fetches are retried after at most this many seconds
+ERROR_TTL = 5.0
+
+FETCH_DURATION = REGISTRY.histogram(
+    'holmes_enrichment_fetch_duration_seconds', 'Live metric fetch latency by provider', ['provider'])
+FETCH_OUTCOMES = REGISTRY.counter(
+    'holmes_enrichment_fetches_total', 'Live metric lookups by provider and outcome (cached, fetched, error, late)',
+    ['provider', 'outcome'])
+
+
+class Reading:
+    """Value of one provider at fetched_at, or the reason there is none"""
+
+    __slots__ = ('provider', 'value', 'error', 'fetched_at')
+
+    def __init__(self, provider: "MetricProvider", value: Optional[float] = None, error: Optional[str] = None):
+        self.provider = provider
+        self.value = value
+        self.error = error
+        self.fetched_at = time.time()
+
+    @property
+    def text(self) -> str:
+        if self.error is not None:
+            return f"{self.provider.name}: _unavailable ({self.error})_"
+        try:
+            return f"{self.provider.name}: {self.provider.format.format(self.value)}"
+        except (ValueError, IndexError, KeyError):
+            return f"{self.provider.name}: {self.value}"
+
+
+class MetricProvider(ABC):
+    """A source of one live number; subclasses implement fetch()"""
+
+    kind = ''
+
+    def __init__(self, name: str, categories: Optional[Iterable[str]] = None, ttl: float = 30.0,
+                 timeout: float = 2.0, format: str = '{:,.2f}', **settings: Any):
+        if settings:
+            raise ValueError(f"Unknown settings {sorted(settings)} for metric provider {name!r}")
+        self.name = name
+        self.categories = frozenset(categories) if categories is not None else None
+        self.ttl = ttl
+        self.timeout = timeout
+        self.format = format
+
+    def applies_to(self, category: str) -> bool:
+        return self.categories is None or category in self.categories
+
+    @abstractmethod
+    def fetch(self) -> float:
+        """Current value; raises if it cannot be read"""
+        pass
+
+    def _get_json(self, url: str, headers: Optional[Mapping[str, str]] = None) -> Any:
+        request = urllib.request.Request(os.path.expandvars(url), headers={
+            key: os.path.expandvars(value) for key, value in (headers or {}).items()
+        })
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+
+class PrometheusProvider(MetricProvider):
+    """Instant query against a Prometheus-compatible HTTP API"""
+
+    kind = 'prometheus'
+
+    def __init__(self, name: str, url: str, query: str, headers: Optional[Mapping[str, str]] = None, **settings):
+        super().__init__(name, **settings)
+        self.url = url.rstrip('/') + '/api/v1/query?' + urlencode({'query': query})
+        self.headers = dict(headers or {})
+
+    def fetch(self) -> float:
+        data = self._get_json(self.url, self.headers)
+        if data.get('status') != 'success':
+            raise ValueError(data.get('error') or 'query failed')
+        result = data['data']['result']
+        if not result:
+            raise ValueError('no data')
+        # Vector results carry [timestamp, "value"]; the first series is used
+        return float(result[0]['value'][1])
+
+    def fetch_vector(self) -> Dict[str, float]:
+        """Every series of the result, keyed by its labels, e.g. '{dc="ams"}'"""
+        data = self._get_json(self.url, self.headers)
+        if data.get('status') != 'success':
+            raise ValueError(data.get('error') or 'query failed')
+        vector = {}
+        for series in data['data']['result']:
+            labels = ','.join(f'{key}="{value}"' for key, value in sorted(series['metric'].items()) if key != '__name__')
+            vector['{' + labels + '}' if labels else ''] = float(series['value'][1])
+        return vector
+
+
+class JsonProvider(MetricProvider):
+    """Number at a dotted path of a JSON document"""
+
+    kind = 'json'
+
+    def __init__(self, name: str, url: str, path: str, headers: Optional[Mapping[str, str]] = None, **settings):
+        super().__init__(name, **settings)
+        self.url = url
+        self.path = [int(part) if part.isdigit() else part for part in path.split('.')] if path else []
+        self.headers = dict(headers or {})
+
+    def fetch(self) -> float:
+        value = self._get_json(self.url, self.headers)
+        for part in self.path:
+            value = value[part]
+        return float(value)
+
+
+PROVIDER_KINDS: Dict[str, Type[MetricProvider]] = {
+    PrometheusProvider.kind: PrometheusProvider,
+    JsonProvider.kind: JsonProvider,
+}
+
+
+def register_provider_kind(provider_class: Type[MetricProvider]):
+    """Make a MetricProvider subclass available to the providers file under its kind"""
+    PROVIDER_KINDS[provider_class.kind] = provider_class
+    return provider_class
+
+
+def load_providers(path: str) -> List[MetricProvider]:
+    """Providers listed in a providers file"""
+    with open(path) as providers_file:
+        entries = json.load(providers_file).get('providers', [])
+    providers = []
+    for entry in entries:
+        settings = dict(entry)
+        kind = settings.pop('kind', None)
+        if kind not in PROVIDER_KINDS:
+            raise ValueError(f"Unknown metric provider kind {kind!r} for {settings.get('name')!r}")
+        providers.append(PROVIDER_KINDS[kind](**settings))
+    return providers
+
+
+class MetricEnricher:
+    """Fetches the live metrics of an alert category concurrently within a latency budget"""
+
+    def __init__(self, providers: Iterable[MetricProvider], budget: float = 0.5, workers: int = 8):
+        self.providers = list(providers)
+        self.budget = budget
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._cache: Dict[int, tuple] = {}
+        self._inflight: Dict[int, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+
+    def providers_for(self, category: str) -> List[MetricProvider]:
+        return [provider for provider in self.providers if provider.applies_to(category)]
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # A pool inherited across fork has no threads; each process starts its own
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='holmes-enrich')
+            self._pid = os.getpid()
+            self._inflight.clear()
+        return self._executor
+
+    def _fetch(self, provider: MetricProvider) -> Reading:
+        started = time.perf_counter()
+        try:
+            reading = Reading(provider, value=provider.fetch())
+            FETCH_OUTCOMES.inc(provider.name, 'fetched')
+        except Exception as e:
+            logger.warning("Live metric fetch failed", extra={'provider': provider.name, 'error': repr(e)})
+            reading = Reading(provider, error=type(e).__name__)
+            FETCH_OUTCOMES.inc(provider.name, 'error')
+        FETCH_DURATION.observe(time.perf_counter() - started, provider.name)
+        ttl = provider.ttl if reading.error is None else min(provider.ttl, ERROR_TTL)
+        with self._lock:
+            self._cache[id(provider)] = (time.monotonic() + ttl, reading)
+            self._inflight.pop(id(provider), None)
+        return reading
+
+    def _lookup(self, provider: MetricProvider, now: float) -> Future:
+        """Cached reading, the fetch already in flight, or a new fetch"""
+        with self._lock:
+            cached = self._cache.get(id(provider))
+            if cached is not None and cached[0] > now:
+                FETCH_OUTCOMES.inc(provider.name, 'cached')
+                future: Future = Future()
+                future.set_result(cached[1])
+                return future
+            future = self._inflight.get(id(provider))
+            if future is None:
+                future = self._inflight[id(provider)] = self._pool().submit(self._fetch, provider)
+            return future
+
+    @staticmethod
+    def _collect(providers: List[MetricProvider], futures: List[Future]) -> List[Reading]:
+        readings = []
+        for provider, future in zip(providers, futures):
+            if future.done():
+                readings.append(future.result())
+            else:
+                FETCH_OUTCOMES.inc(provider.name, 'late')
+                readings.append(Reading(provider, error='no answer in time'))
+        return readings
+
+    def readings(self, category: str) -> List[Reading]:
+        """Readings for an alert category, waiting at most the budget"""
+        providers = self.providers_for(category)
+        if not providers:
+            return []
+        now = time.monotonic()
+        futures = [self._lookup(provider, now) for provider in providers]
+        wait(futures, timeout=self.budget)
+        return self._collect(providers, futures)
+
+    async def readings_async(self, category: str) -> List[Reading]:
+        """readings() for the event loop, which is never blocked by a fetch"""
+        providers = self.providers_for(category)
+        if not providers:
+            return []
+        now = time.monotonic()
+        futures = [self._lookup(provider, now) for provider in providers]
+        # asyncio.wait does not cancel on timeout: a late fetch keeps running and fills the cache
+        await asyncio.wait([asyncio.wrap_future(future) for future in futures], timeout=self.budget)
+        return self._collect(providers, futures)
+
+    def cached(self, category: str) -> List[Reading]:
+        """Readings already cached for a category, without fetching (e.g. for storm updates)"""
+        now = time.monotonic()
+        with self._lock:
+            entries = [self._cache.get(id(provider)) for provider in self.providers_for(category)]
+        return [entry[1] for entry in entries if entry is not None and entry[0] > now]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'providers': len(self.providers), 'cached': len(self._cache), 'inflight': len(self._inflight)}
+
+
+def create_enricher() -> MetricEnricher:
+    """Enricher for the providers in HOLMES_ENRICHMENT_FILE (none if unset)"""
+    path = os.environ.get('HOLMES_ENRICHMENT_FILE')
+    providers = load_providers(path) if path else []
+    if providers:
+        logger.info("Live metric providers loaded", extra={'path': path, 'providers': [p.name for p in providers]})
+    return MetricEnricher(
+        providers,
+        budget=float(os.environ.get('ENRICHMENT_BUDGET_MS', 500)) / 1000,
+        workers=int(os.environ.get('ENRICHMENT_WORKERS', 8)),
+    )
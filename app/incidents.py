@@ -0,0 +1,347 @@
+"""
+Incident History for HOLMES
+
+Remembers every alert HOLMES answered and how its investigation ended, so a new
+alert is answered with the most similar past incidents and their resolutions
+("seen last Tuesday, resolved as sro_deploy_found") next to the buttons.
+
+- Alerts are recorded when HOLMES responds, keyed like investigation sessions by
+  (channel, thread_ts). An incident closes when its investigation reaches the
+  `identified` or `resolved` state (see decision_tree); the action that got it
+  there is its resolution.
+- Incidents are kept in a SQLite file in WAL mode, so worker processes share them.
+- Closed incidents are searched with TF-IDF over an in-memory inverted index: one
+  posting list of (incident, weight) NumPy arrays per word, scored with bincount.
+  Closing an incident appends to the lists of its words, and other processes pick
+  up new closes by sequence number when SQLite's data_version changes, so the index
+  is never rebuilt as it grows. It is rebuilt from SQLite only once a quarter of it
+  is superseded incidents or it is above its size cap.
+- The index is built on its first search or close, or by load() once the process
+  listens, so importing HOLMES neither reads the history nor imports NumPy.
+- Search work is bounded: a word contributes only its `max_postings` most recent
+  incidents. Such common words carry little weight; rare words find older matches.
+"""
+
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Investigation states that close an incident
+CLOSED_STATES = ('identified', 'resolved')
+
+# Alert text kept per incident, in SQLite and for display
+MAX_TEXT = 2000
+SNIPPET = 200
+
+# Links and mentions say nothing about what kind of alert it was, nor do long hex IDs
+_NOISE = re.compile(r"<[^>]*>|https?://\S+")
+_HEX_ID = re.compile(r"[0-9a-f]{8,}")
+# Words with at least one letter (so 5xx and p99, not 1234)
+_WORD = re.compile(r"[a-z0-9_]*[a-z][a-z0-9_]*")
+
+_COLUMNS = 'channel, thread_ts, category, text, resolution, opened_at, closed_at, seq'
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in _WORD.findall(_NOISE.sub(' ', text.lower()))
+            if len(word) > 1 and not (len(word) >= 8 and _HEX_ID.fullmatch(word))]
+
+
+class Incident:
+    """A past alert and the action that resolved it"""
+
+    __slots__ = ('channel', 'thread_ts', 'category', 'text', 'resolution', 'opened_at', 'closed_at', 'seq')
+
+    def __init__(self, channel: str, thread_ts: str, category: Optional[str], text: str, resolution: Optional[str],
+                 opened_at: float, closed_at: Optional[float], seq: Optional[int]):
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.category = category
+        self.text = text
+        self.resolution = resolution
+        self.opened_at = opened_at
+        self.closed_at = closed_at
+        self.seq = seq
+
+    @property
+    def link(self) -> str:
+        """Slack archive link to the incident's thread"""
+        return f"https://slack.com/archives/{self.channel}/p{self.thread_ts.replace('.', '')}"
+
+
+class _Postings:
+    """Growable (incident, weight) arrays of one word, oldest first"""
+
+    __slots__ = ('ids', 'weights', 'size')
+
+    def __init__(self):
+        import numpy as np
+        self.ids = np.empty(8, dtype=np.int32)
+        self.weights = np.empty(8, dtype=np.float32)
+        self.size = 0
+
+    def append(self, doc: int, weight: float):
+        if self.size == len(self.ids):
+            import numpy as np
+            self.ids = np.resize(self.ids, self.size * 2)
+            self.weights = np.resize(self.weights, self.size * 2)
+        self.ids[self.size] = doc
+        self.weights[self.size] = weight
+        self.size += 1
+
+    def extend(self, docs: List[int], weights: List[float]):
+        import numpy as np
+        self.ids = np.concatenate([self.ids[:self.size], np.array(docs, dtype=np.int32)])
+        self.weights = np.concatenate([self.weights[:self.size], np.array(weights, dtype=np.float32)])
+        self.size = len(self.ids)
+
+
+class IncidentIndex:
+    """SQLite-backed incident history with an incrementally updated TF-IDF index"""
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, max_incidents: int = 200000, retention: float = 365 * 86400,
+                 max_postings: int = 20000, min_score: float = 0.3):
+        self.path = path
+        self.max_incidents = max_incidents
+        self.retention = retention
+        self.max_postings = max_postings
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._writes = 0
+        self._counters = {'recorded': 0, 'closed': 0, 'searches': 0, 'rebuilds': 0}
+        # Filled by _load on first use
+        self._loaded = False
+        self._words: Dict[str, int] = {}
+        self._by_key: Dict[Tuple[str, str], int] = {}
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS incidents ("
+                "channel TEXT NOT NULL, thread_ts TEXT NOT NULL, category TEXT, text TEXT NOT NULL, "
+                "resolution TEXT, opened_at REAL NOT NULL, closed_at REAL, seq INTEGER, "
+                "PRIMARY KEY (channel, thread_ts))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS incidents_seq ON incidents (seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection is never shared with a forked process
+        pid = os.getpid()
+        if self._pid != pid:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection = connection
+            self._pid = pid
+            self._data_version = None
+        return self._connection
+
+    def _reset(self):
+        # NumPy is imported with the first index, not with this module
+        import numpy as np
+        self._words: Dict[str, int] = {}
+        self._postings: List[_Postings] = []
+        self._incidents: List[Incident] = []
+        self._by_key: Dict[Tuple[str, str], int] = {}
+        self._categories: Dict[Optional[str], int] = {}
+        self._category_codes = np.empty(1024, dtype=np.int16)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._scores = np.zeros(1024, dtype=np.float32)
+        self._seq = 0
+
+    def _load(self, connection: sqlite3.Connection):
+        """Index the most recently closed incidents"""
+        self._reset()
+        rows = connection.execute(
+            f"SELECT {_COLUMNS} FROM incidents WHERE seq IS NOT NULL ORDER BY seq DESC LIMIT ?", (self.max_incidents,)
+        ).fetchall()
+        # Postings are collected in lists and converted once, instead of growing arrays per incident
+        pending: Dict[int, Tuple[List[int], List[float]]] = {}
+        for row in reversed(rows):
+            self._add(Incident(*row), pending)
+        for index, (docs, weights) in pending.items():
+            self._postings[index].extend(docs, weights)
+        self._seq = rows[0][-1] if rows else 0
+        self._data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        self._loaded = True
+        logger.info("Incident history loaded", extra={'path': self.path, 'incidents': len(rows)})
+
+    def _add(self, incident: Incident, pending: Optional[Dict[int, Tuple[List[int], List[float]]]] = None):
+        key = (incident.channel, incident.thread_ts)
+        previous = self._by_key.get(key)
+        if previous is not None:
+            if self._incidents[previous].seq == incident.seq:
+                return
+            self._alive[previous] = False
+        doc = len(self._incidents)
+        if doc == len(self._alive):
+            import numpy as np
+            self._alive = np.resize(self._alive, doc * 2)
+            self._category_codes = np.resize(self._category_codes, doc * 2)
+            self._scores = np.resize(self._scores, doc * 2)
+        self._alive[doc] = True
+        self._category_codes[doc] = self._categories.setdefault(incident.category, len(self._categories))
+        self._by_key[key] = doc
+
+        # lnc weights: log term frequency, length-normalized; IDF is applied at query time
+        counts = Counter(tokenize(incident.text))
+        weights = {word: 1 + math.log(count) for word, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        for word, weight in weights.items():
+            index = self._words.get(word)
+            if index is None:
+                index = self._words[word] = len(self._postings)
+                self._postings.append(_Postings())
+            if pending is None:
+                self._postings[index].append(doc, weight / norm)
+            else:
+                docs, postings = pending.setdefault(index, ([], []))
+                docs.append(doc)
+                postings.append(weight / norm)
+        # Only the display part of the text is kept in memory
+        incident.text = incident.text[:SNIPPET]
+        self._incidents.append(incident)
+
+    def _sync(self, connection: sqlite3.Connection):
+        """Index incidents closed by other processes since the last look"""
+        if not self._loaded:
+            self._load(connection)
+            return
+        version = connection.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+        rows = connection.execute(
+            f"SELECT {_COLUMNS} FROM incidents WHERE seq > ? ORDER BY seq", (self._seq,)
+        ).fetchall()
+        for row in rows:
+            self._add(Incident(*row))
+        if rows:
+            self._seq = rows[-1][-1]
+        self._maybe_rebuild(connection)
+
+    def _maybe_rebuild(self, connection: sqlite3.Connection):
+        live = len(self._by_key)
+        if len(self._incidents) - live > live // 4 or live > self.max_incidents * 5 // 4:
+            self._counters['rebuilds'] += 1
+            self._load(connection)
+
+    def load(self):
+        """Build the index now instead of on the first search or close"""
+        with self._lock:
+            self._sync(self._connect())
+
+    def record(self, channel: str, thread_ts: str, category: Optional[str], text: str):
+        """Remember an alert HOLMES answered; it becomes searchable once it closes"""
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                f"INSERT OR IGNORE INTO incidents ({_COLUMNS}) VALUES (?, ?, ?, ?, NULL, ?, NULL, NULL)",
+                (channel, thread_ts, category, text[:MAX_TEXT], time.time())
+            )
+            self._counters['recorded'] += 1
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                connection.execute("DELETE FROM incidents WHERE opened_at < ?", (time.time() - self.retention,))
+
+    def close(self, channel: str, thread_ts: str, resolution: str) -> Optional[Incident]:
+        """Close the incident of a thread with a resolution; None if HOLMES recorded no alert there"""
+        with self._lock:
+            connection = self._connect()
+            self._sync(connection)
+            # One statement, so the sequence number is unique across processes
+            cursor = connection.execute(
+                "UPDATE incidents SET resolution = ?, closed_at = ?, "
+                "seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM incidents) WHERE channel = ? AND thread_ts = ?",
+                (resolution, time.time(), channel, thread_ts)
+            )
+            if not cursor.rowcount:
+                return None
+            row = connection.execute(
+                f"SELECT {_COLUMNS} FROM incidents WHERE channel = ? AND thread_ts = ?", (channel, thread_ts)
+            ).fetchone()
+            incident = Incident(*row)
+            self._add(incident)
+            self._counters['closed'] += 1
+            self._maybe_rebuild(connection)
+            return incident
+
+    def similar(self, text: str, category: Optional[str] = None, k: int = 3) -> List[Tuple[Incident, float]]:
+        """Up to k closed incidents most similar to an alert text, of its category if given, best first"""
+        import numpy as np
+        counts = Counter(tokenize(text))
+        with self._lock:
+            self._sync(self._connect())
+            self._counters['searches'] += 1
+            live = len(self._by_key)
+            if not live or not counts:
+                return []
+            code = self._categories.get(category) if category is not None else None
+            if category is not None and code is None:
+                return []
+
+            # ltc query weights: log term frequency times IDF, normalized, so scores are cosines.
+            # Scores accumulate in one reused buffer: a fresh array per search costs more in page
+            # faults than the scoring itself
+            size = len(self._incidents)
+            scores = self._scores[:size]
+            scores[:] = 0
+            norm, matched = 0.0, False
+            for word, count in counts.items():
+                index = self._words.get(word)
+                # Words never seen count toward the query norm at the highest IDF
+                frequency = self._postings[index].size if index is not None else 1
+                weight = (1 + math.log(count)) * math.log(1 + live / frequency)
+                norm += weight * weight
+                if index is None:
+                    continue
+                postings = self._postings[index]
+                start = max(0, postings.size - self.max_postings)
+                np.add.at(scores, postings.ids[start:postings.size],
+                          postings.weights[start:postings.size] * np.float32(weight))
+                matched = True
+            if not matched:
+                return []
+            norm = math.sqrt(norm)
+            scores *= self._alive[:size]
+            if code is not None:
+                scores *= self._category_codes[:size] == code
+
+            # k argmax passes: faster than a partition for small k, and repeated alerts tie exactly.
+            # Ties go to the most recent incident
+            similar = []
+            newest_first = scores[::-1]
+            for _ in range(k):
+                position = int(np.argmax(newest_first))
+                score = float(newest_first[position]) / norm
+                if score < self.min_score:
+                    break
+                doc = size - 1 - position
+                similar.append((self._incidents[doc], score))
+                scores[doc] = 0
+            return similar
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, 'loaded': self._loaded, 'indexed': len(self._by_key), 'words': len(self._words)}
+
+
+def create_incident_index() -> IncidentIndex:
+    """Index at INCIDENTS_SQLITE_PATH, size and retention from INCIDENTS_* settings"""
+    return IncidentIndex(
+        os.environ.get('INCIDENTS_SQLITE_PATH', '/tmp/holmes-incidents.sqlite3'),
+        max_incidents=int(os.environ.get('INCIDENTS_MAX_INDEXED', 200000)),
+        retention=float(os.environ.get('INCIDENTS_RETENTION_DAYS', 365)) * 86400,
+    )
@@ -0,0 +1,334 @@
+"""
+Alert Webhook Ingestion for HOLMES
+
+POST /alerts/ingest takes alerts as structured JSON straight from the alerting
+system, instead of as Slack messages whose text has to be re-parsed. A request
+body may be:
+
+- an Alertmanager webhook payload ({"alerts": [...], ...}), which Grafana's
+  unified alerting webhook also sends
+- a legacy Grafana webhook payload ({"ruleName", "state", "tags", ...})
+- a JSON array of payloads or of bare alerts ({"labels", "annotations", ...}),
+  or several payloads one after another (e.g. one per line)
+
+The body is parsed as it is read: alerts are decoded one at a time from the
+request stream, so a large batch never has to fit in memory as a whole, and an
+alert larger than `max_alert_bytes` rejects the request.
+
+Each firing alert is classified by its labels: the first of CATEGORY_LABELS that
+names a known category. Alerts without one fall back to the text classifier over
+their alertname and summary, all of a request's in one batch, and are counted as such. The target channel is the
+`slack_channel` or `channel` label (a channel ID or a name from the channel
+registry), else ALERT_INGEST_CHANNEL. Resolved alerts, alerts for unmonitored
+channels and categories a channel does not handle are counted and skipped.
+
+Firing alerts are grouped by (channel, category) and each group is answered with
+one Slack post, so a storm of 500 alerts costs one request in and one post per
+group out, and repeats of the same group are coalesced into that post.
+
+The route is enabled by setting ALERT_INGEST_TOKEN. Requests must send it as
+`Authorization: Bearer <token>` (Alertmanager's http_config.authorization).
+"""
+
+import codecs
+import hmac
+import json
+import logging
+import os
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Labels naming an alert's category, in order of precedence
+CATEGORY_LABELS = ('holmes_category', 'category', 'alert_category')
+CHANNEL_LABELS = ('slack_channel', 'channel')
+
+_WHITESPACE = ' \t\r\n'
+_NUMBER_TAIL = '.eE+-'
+
+
+class IngestError(ValueError):
+    """The request body is not a batch of alerts; status is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class IngestedAlert:
+    """One firing alert, classified and routed"""
+
+    __slots__ = ('name', 'severity', 'summary', 'url', 'labels', 'category', 'channel')
+
+    def __init__(self, name: str, severity: str, summary: str, url: str, labels: Dict[str, str]):
+        self.name = name
+        self.severity = severity
+        self.summary = summary
+        self.url = url
+        self.labels = labels
+        self.category: Optional[str] = None
+        self.channel: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return f"{self.name}: {self.summary}" if self.summary else self.name
+
+
+class _StreamReader:
+    """Decodes JSON values one at a time from a byte stream"""
+
+    def __init__(self, stream, chunk_size: int, max_buffer: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.max_buffer = max_buffer
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer; False at the end of the stream"""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.buffer = self.buffer[self.pos:] + self._text.decode(b'', final=True)
+            self.pos = 0
+            return False
+        # Drop what was already decoded, so the buffer only ever holds the value being decoded
+        self.buffer = self.buffer[self.pos:] + self._text.decode(chunk)
+        self.pos = 0
+        if len(self.buffer) > self.max_buffer:
+            raise IngestError(f"alert larger than {self.max_buffer} bytes", status=413)
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, '' at the end of the stream"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def take(self, expected: str) -> str:
+        """Consume the next character, which must be one of expected"""
+        char = self.peek()
+        if not char or char not in expected:
+            raise IngestError(f"expected one of {expected!r}, found {char or 'end of body'!r}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise IngestError(f"invalid JSON: {e.msg}") from None
+            # A number at the end of the buffer may go on in the next chunk, also when it was cut just after
+            # its '.', 'e' or exponent sign, which the decoder leaves behind
+            if (isinstance(value, (int, float)) and len(self.buffer) - end <= 2
+                    and not self.buffer[end:].strip(_NUMBER_TAIL) and self._fill()):
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_value(reader: _StreamReader) -> Iterator[Dict[str, Any]]:
+    """Alerts in the next value: a payload, a bare alert, or an array of either"""
+    char = reader.peek()
+    if char == '[':
+        reader.take('[')
+        if reader.peek() == ']':
+            reader.take(']')
+            return
+        while True:
+            yield from _iter_value(reader)
+            if reader.take(',]') == ']':
+                return
+    if char != '{':
+        raise IngestError("expected an alert payload object or array")
+
+    reader.take('{')
+    fields: Dict[str, Any] = {}
+    has_alerts = False
+    if reader.peek() == '}':
+        reader.take('}')
+        return
+    while True:
+        key = reader.value()
+        reader.take(':')
+        if key == 'alerts' and reader.peek() == '[':
+            # Alertmanager's alerts array: one alert decoded at a time
+            has_alerts = True
+            reader.take('[')
+            if reader.peek() == ']':
+                reader.take(']')
+            else:
+                while True:
+                    alert = reader.value()
+                    if isinstance(alert, dict):
+                        yield alert
+                    if reader.take(',]') == ']':
+                        break
+        else:
+            fields[key] = reader.value()
+        if reader.take(',}') == '}':
+            break
+    if not has_alerts and ('labels' in fields or 'ruleName' in fields):
+        yield fields
+
+
+def iter_alerts(stream, chunk_size: int = 64 * 1024, max_alert_bytes: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Raw alert objects of a request body, decoded incrementally from a byte stream"""
+    reader = _StreamReader(stream, chunk_size, max_alert_bytes)
+    while reader.peek():
+        yield from _iter_value(reader)
+
+
+def normalize_alert(raw: Dict[str, Any]) -> Optional[IngestedAlert]:
+    """IngestedAlert of an Alertmanager or Grafana alert; None unless it is firing"""
+    labels = raw.get('labels') or raw.get('tags') or {}
+    if not isinstance(labels, dict):
+        labels = {}
+    labels = {str(key): str(value) for key, value in labels.items()}
+    status = raw.get('status')
+    if status is None and 'state' in raw:
+        # Legacy Grafana: alerting, ok, no_data, paused, pending
+        status = 'firing' if raw['state'] == 'alerting' else 'resolved'
+    if status not in (None, 'firing'):
+        return None
+    annotations = raw.get('annotations') or {}
+    if not isinstance(annotations, dict):
+        annotations = {}
+    name = labels.get('alertname') or raw.get('ruleName') or raw.get('title') or 'alert'
+    summary = annotations.get('summary') or annotations.get('description') or raw.get('message') or ''
+    url = raw.get('generatorURL') or raw.get('panelURL') or raw.get('ruleUrl') or ''
+    return IngestedAlert(str(name), labels.get('severity', ''), str(summary), str(url), labels)
+
+
+def classify_labels(labels: Dict[str, str], categories: Iterable[str]) -> Optional[str]:
+    """Category named by the first of CATEGORY_LABELS holding a known category"""
+    for label in CATEGORY_LABELS:
+        value = labels.get(label, '').strip().lower()
+        if value in categories:
+            return value
+    return None
+
+
+class IngestBatch:
+    """Firing alerts of one request grouped by (channel, category), and what was skipped"""
+
+    __slots__ = ('groups', 'counts')
+
+    def __init__(self):
+        self.groups: Dict[Tuple[str, str], List[IngestedAlert]] = {}
+        self.counts: Counter = Counter()
+
+
+class AlertIngestor:
+    """Parses, classifies and routes batches of alerts for /alerts/ingest"""
+
+    def __init__(self, registry, categories: Iterable[str],
+                 classify_texts: Callable[[List[str]], List[Optional[str]]],
+                 default_channel: Optional[str] = None, token: Optional[str] = None, max_alerts: int = 10000,
+                 max_alert_bytes: int = 1 << 20):
+        self.registry = registry
+        self.categories = frozenset(categories)
+        self.classify_texts = classify_texts
+        self.default_channel = default_channel
+        self.token = token
+        self.max_alerts = max_alerts
+        self.max_alert_bytes = max_alert_bytes
+        self._counts: Counter = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def authorized(self, authorization: Optional[str]) -> bool:
+        scheme, _, credentials = (authorization or '').partition(' ')
+        return (self.enabled and scheme.lower() == 'bearer'
+                and hmac.compare_digest(credentials.strip().encode(), self.token.encode()))
+
+    def _channel_for(self, labels: Dict[str, str]) -> Optional[str]:
+        for label in CHANNEL_LABELS:
+            if labels.get(label):
+                name = labels[label].lstrip('#')
+                return self.registry.channel_id(name) or name
+        if self.default_channel:
+            return self.registry.channel_id(self.default_channel) or self.default_channel
+        return None
+
+    def parse(self, stream) -> IngestBatch:
+        """Read a request body; raises IngestError if it is malformed or too large"""
+        batch = IngestBatch()
+        try:
+            self._read(stream, batch)
+        except IngestError:
+            self._counts['rejected'] += 1
+            raise
+        self._counts.update(batch.counts)
+        self._counts['requests'] += 1
+        self._counts['groups'] += len(batch.groups)
+        return batch
+
+    def _read(self, stream, batch: IngestBatch):
+        counts = batch.counts
+        unlabelled: List[IngestedAlert] = []
+        for raw in iter_alerts(stream, max_alert_bytes=self.max_alert_bytes):
+            counts['received'] += 1
+            if counts['received'] > self.max_alerts:
+                raise IngestError(f"more than {self.max_alerts} alerts in one request", status=413)
+            alert = normalize_alert(raw)
+            if alert is None:
+                counts['resolved'] += 1
+                continue
+            category = classify_labels(alert.labels, self.categories)
+            if category is None:
+                unlabelled.append(alert)
+            else:
+                self._route(alert, category, batch)
+        for alert, category in zip(unlabelled, self.classify_texts([alert.text for alert in unlabelled])):
+            if category is None:
+                counts['unclassified'] += 1
+                continue
+            counts['classified_by_text'] += 1
+            self._route(alert, category, batch)
+
+    def _route(self, alert: IngestedAlert, category: str, batch: IngestBatch):
+        channel = self._channel_for(alert.labels)
+        policy = self.registry.policy_for(channel) if channel else None
+        if policy is None:
+            batch.counts['unrouted'] += 1
+            return
+        if not policy.handles(category) or policy.response_mode == 'silent':
+            batch.counts['disabled'] += 1
+            return
+        alert.category, alert.channel = category, channel
+        batch.groups.setdefault((channel, category), []).append(alert)
+        batch.counts['accepted'] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+
+def create_alert_ingestor(registry, categories: Iterable[str],
+                          classify_texts: Callable[[List[str]], List[Optional[str]]]) -> AlertIngestor:
+    """Ingestor enabled by ALERT_INGEST_TOKEN, posting to ALERT_INGEST_CHANNEL by default"""
+    return AlertIngestor(
+        registry,
+        categories,
+        classify_texts,
+        default_channel=os.environ.get('ALERT_INGEST_CHANNEL', 'incidents') or None,
+        token=os.environ.get('ALERT_INGEST_TOKEN') or None,
+        max_alerts=int(os.environ.get('ALERT_INGEST_MAX_ALERTS', 10000)),
+    )
@@ -0,0 +1,132 @@
+"""
+Logging Configuration for HOLMES
+
+Structured JSON logs written off the request path:
+- Handlers only enqueue records (QueueHandler); a background QueueListener
+  formats them as one JSON object per line and writes them to stdout.
+- The level comes from LOG_LEVEL (default INFO).
+- Records on the `holmes.hotpath` logger (per-message and per-request chatter)
+  are sampled: only one in every 1/LOG_SAMPLE_RATE records below WARNING is kept.
+  Warnings and errors are never sampled.
+
+Usage:
+    logger = logging.getLogger(__name__)
+    logger.info("Alert detected", extra={'alert_type': 'revenue', 'channel': channel})
+"""
+
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+HOT_PATH_LOGGER = 'holmes.hotpath'
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_queue = None
+_queue_handler = None
+_stream_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object including its extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records with the message and traceback resolved, leaving formatting to the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in every `every` records below WARNING"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if not self.every:
+            return False
+        # itertools.count is atomic under the GIL, so no lock is needed
+        return next(self._counter) % self.every == 0
+
+
+def _start_listener():
+    """Start the writer thread; also runs in each forked child, which inherits no threads"""
+    global _listener
+    _listener = logging.handlers.QueueListener(_queue, _stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_in_child():
+    """Records queued before the fork belong to the parent, so the child starts a fresh queue"""
+    global _queue
+    _queue = queue.SimpleQueue()
+    _queue_handler.queue = _queue
+    _start_listener()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def setup_logging(level: str = None, sample_rate: float = None):
+    """Route all logging through a non-blocking queue to a JSON stdout writer"""
+    global _queue, _queue_handler, _stream_handler
+    if _listener is not None:
+        return
+
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    if sample_rate is None:
+        sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+
+    _stream_handler = logging.StreamHandler(sys.stdout)
+    _stream_handler.setFormatter(JsonFormatter())
+    _queue = queue.SimpleQueue()
+    _start_listener()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+    _queue_handler = NonBlockingQueueHandler(_queue)
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(level)
+
+    hot_path = logging.getLogger(HOT_PATH_LOGGER)
+    hot_path.filters[:] = [SamplingFilter(sample_rate)]
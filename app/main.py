@@ -1,19 +1,51 @@
+import asyncio
+import atexit
+import json
+import logging
 import os
-import sys
+import re
 import time
 from datetime import datetime
 from slack_bolt import App
-from slack_bolt.adapter.flask import SlackRequestHandler
-from flask import Flask
-
-# Add the current directory to Python path so we can import actions
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from slack_sdk import WebClient
+
+from bootstrap import READINESS, select_mode, warm_authorization
+from channels import build_async_channel_filter_middleware, build_channel_filter_middleware, create_channel_registry
+from classifier import AlertClassifier
+from coalesce import AlertCoalescer
+from decision_tree import create_decision_tree
+from enrichment import create_enricher
+from incidents import create_incident_index
+from ingest import IngestError, create_alert_ingestor
+from log_config import HOT_PATH_LOGGER, setup_logging
+from metrics import ALERT_CLASSIFICATIONS, CONTENT_TYPE, REGISTRY, instrument_app
+from profiler import create_profiler
+from sessions import create_session_store
+from sharding import build_async_shard_filter_middleware, build_shard_filter_middleware, create_sharder
+from dedup import build_async_dedup_middleware, build_dedup_middleware, create_idempotency_store
+from actions.registry import discover_actions
+from admission import MESSAGE, classify_request, create_admission_controller
+from web_api import build_async_client_middleware, build_client_middleware, create_dispatcher
+from work_queue import QueuedAppBridge
+
+logger = logging.getLogger("holmes")
+# Per-message chatter is sampled (see log_config)
+hot_path_logger = logging.getLogger(HOT_PATH_LOGGER)
 
 # Initialize Slack app
 app = App(
     token=os.environ.get("SLACK_BOT_TOKEN"),
-    signing_secret=os.environ.get("SLACK_SIGNING_SECRET")
+    signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),
+    # No network call at import: auth.test is a deferred startup step (see bootstrap)
+    token_verification_enabled=False,
+    # SLACK_API_URL points the Web API at another server, e.g. a local fake in benchmarks
+    client=WebClient(
+        token=os.environ.get("SLACK_BOT_TOKEN"),
+        base_url=os.environ["SLACK_API_URL"]
+    ) if os.environ.get("SLACK_API_URL") else None
 )
+# Ack latency of every request, over HTTP and Socket Mode alike (see metrics)
+instrument_app(app)
 
 # Configuration
 MONITORING_URLS = {
@@ -47,6 +79,26 @@ MONITORED_CHANNELS = [
     # Add other channels where alerts are posted
 ]
 
+# Indexed lookups and per-channel policy; overridable and hot-reloaded from HOLMES_CHANNELS_FILE
+CHANNEL_REGISTRY = create_channel_registry(MONITORED_CHANNELS, CHANNELS)
+
+# Open investigations by thread, persisted across restarts in SESSIONS_SQLITE_PATH
+SESSION_STORE = create_session_store()
+
+# Past alerts and their resolutions, searched for the ones most similar to a new alert; indexed
+# (with NumPy) once the process listens, see main()
+INCIDENTS = create_incident_index()
+
+# Investigation flow: nodes, buttons and runbooks from app/decision_tree.json, hot-reloaded
+DECISION_TREE = create_decision_tree(
+    {'urls': MONITORING_URLS, 'contacts': TEAM_CONTACTS},
+    CHANNEL_REGISTRY.channel_id,
+    # Buttons may also lead to action plugins (see actions/registry)
+    known_actions=[action_id for spec in discover_actions() for action_id in spec.action_ids],
+    sessions=SESSION_STORE,
+    incidents=INCIDENTS
+)
+
 # Alert detection patterns
 ALERT_PATTERNS = {
     'revenue': [
@@ -72,152 +124,91 @@ ALERT_PATTERNS = {
 }
 
 
+# Patterns lowercased and deduplicated once at startup; each message is checked with substring
+# scans (or one trie regex for large pattern sets, see classifier)
+ALERT_CLASSIFIER = AlertClassifier(ALERT_PATTERNS)
+
+# Learned from labelled alert history, with the keyword patterns as its fallback; None unless
+# HOLMES_CLASSIFIER_MODEL is set (see alert_model), and only then is NumPy imported for it
+ALERT_MODEL = None
+if os.environ.get("HOLMES_CLASSIFIER_MODEL"):
+    from alert_model import create_alert_model
+    ALERT_MODEL = create_alert_model(ALERT_PATTERNS)
+
+# Repeats of the same alert update one HOLMES response instead of posting new ones
+ALERT_COALESCER = AlertCoalescer(
+    window=float(os.environ.get("ALERT_COALESCE_WINDOW_SECONDS", 300)),
+    update_interval=float(os.environ.get("ALERT_COALESCE_UPDATE_SECONDS", 10))
+)
+
+
+# Live numbers added to alert responses, from the providers in HOLMES_ENRICHMENT_FILE
+ENRICHER = create_enricher()
+
+
 def classify_alert(text):
     """Classify alert based on text content"""
-    text_lower = text.lower()
-    
-    scores = {}
-    for category, patterns in ALERT_PATTERNS.items():
-        score = 0
-        for pattern in patterns:
-            if pattern.lower() in text_lower:
-                score += 1
-        scores[category] = score
-    
+    if ALERT_MODEL is not None:
+        return ALERT_MODEL.classify(text, ALERT_CLASSIFIER.classify)
     # Return the category with highest score, or None if no patterns match
-    if max(scores.values()) > 0:
-        return max(scores, key=scores.get)
-    return None
-
-
-def get_alert_response_blocks(alert_type, original_message, user_id):
-    """Get response blocks for detected alert"""
-    timestamp = int(time.time())
-    
-    if alert_type == 'revenue':
-        return [
-            {
-                'type': 'header',
-                'text': {'type': 'plain_text', 'text': '🚨 HOLMES: Revenue Alert Detected'}
-            },
-            {
-                'type': 'section',
-                'text': {
-                    'type': 'mrkdwn',
-                    'text': f'*Alert detected by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n\n*🎯 INVESTIGATION RECOMMENDED:*\n• Check <{MONITORING_URLS["main_dashboard"]}|Performance Dashboard>\n• Review <{MONITORING_URLS["temporal_dashboard"]}|Temporal workflows>\n• Verify bidder capping system status'
-                }
-            },
-            {
-                'type': 'actions',
-                'elements': [
-                    {
-                        'type': 'button',
-                        'text': {'type': 'plain_text', 'text': '🔍 Start Investigation'},
-                        'value': 'start_revenue_investigation',
-                        'action_id': 'start_revenue_investigation',
-                        'style': 'primary'
-                    }
-                ]
-            }
-        ]
-    elif alert_type == 'traffic':
-        return [
-            {
-                'type': 'header',
-                'text': {'type': 'plain_text', 'text': '📊 HOLMES: Traffic Alert Detected'}
-            },
-            {
-                'type': 'section',
-                'text': {
-                    'type': 'mrkdwn',
-                    'text': f'*Alert detected by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n\n*🎯 INVESTIGATION RECOMMENDED:*\n• Check <{MONITORING_URLS["rollouts_audit"]}|Rollouts audit>\n• Review <{MONITORING_URLS["sro_updates"]}|SRO updates>\n• Monitor bid request patterns'
-                }
-            },
-            {
-                'type': 'actions',
-                'elements': [
-                    {
-                        'type': 'button',
-                        'text': {'type': 'plain_text', 'text': '🔍 Start Investigation'},
-                        'value': 'start_traffic_investigation',
-                        'action_id': 'start_traffic_investigation',
-                        'style': 'primary'
-                    }
-                ]
-            }
-        ]
-    elif alert_type == 'errors':
-        return [
-            {
-                'type': 'header',
-                'text': {'type': 'plain_text', 'text': '⚠️ HOLMES: Error Rate Alert Detected'}
-            },
-            {
-                'type': 'section',
-                'text': {
-                    'type': 'mrkdwn',
-                    'text': f'*Alert detected by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n\n*🎯 INVESTIGATION RECOMMENDED:*\n• Check infrastructure status\n• Review recent deployments\n• Monitor service health'
-                }
-            },
-            {
-                'type': 'actions',
-                'elements': [
-                    {
-                        'type': 'button',
-                        'text': {'type': 'plain_text', 'text': '🔍 Start Investigation'},
-                        'value': 'start_error_investigation',
-                        'action_id': 'start_error_investigation',
-                        'style': 'primary'
-                    }
-                ]
-            }
-        ]
-    else:
-        return [
-            {
-                'type': 'header',
-                'text': {'type': 'plain_text', 'text': '🕵️ HOLMES: Alert Detected'}
-            },
-            {
-                'type': 'section',
-                'text': {
-                    'type': 'mrkdwn',
-                    'text': f'*Alert detected by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n\n*🎯 INVESTIGATION AVAILABLE:*\nHOLMES can help investigate this alert.'
-                }
-            },
-            {
-                'type': 'actions',
-                'elements': [
-                    {
-                        'type': 'button',
-                        'text': {'type': 'plain_text', 'text': '🔍 Start Investigation'},
-                        'value': 'start_investigation',
-                        'action_id': 'start_investigation',
-                        'style': 'primary'
-                    }
-                ]
-            }
-        ]
+    return ALERT_CLASSIFIER.classify(text)
+
+
+def classify_alerts(texts):
+    """Classify a batch of alert texts, scored by the learned model in one pass"""
+    if ALERT_MODEL is not None:
+        return ALERT_MODEL.classify_batch(texts, ALERT_CLASSIFIER.classify)
+    return [ALERT_CLASSIFIER.classify(text) for text in texts]
+
+
+# Structured alerts POSTed to /alerts/ingest, classified by their labels (see ingest)
+ALERT_INGESTOR = create_alert_ingestor(CHANNEL_REGISTRY, ALERT_PATTERNS, classify_alerts)
+
+
+# Alert responses: (header, investigation text, button action_id) per category, with the dashboard
+# URLs bound once at import. Built with plain literals per message, which renders faster than a
+# BlockTemplate for blocks whose only static parts are this small (see benchmarks/blocks_benchmark.py)
+def _alert_response(header, details, action_id):
+    return header, details.format(urls=MONITORING_URLS), action_id
+
+
+ALERT_RESPONSES = {
+    'revenue': _alert_response(
+        '🚨 HOLMES: Revenue Alert Detected',
+        '*🎯 INVESTIGATION RECOMMENDED:*\n• Check <{urls[main_dashboard]}|Performance Dashboard>\n• Review <{urls[temporal_dashboard]}|Temporal workflows>\n• Verify bidder capping system status',
+        'start_revenue_investigation'
+    ),
+    'traffic': _alert_response(
+        '📊 HOLMES: Traffic Alert Detected',
+        '*🎯 INVESTIGATION RECOMMENDED:*\n• Check <{urls[rollouts_audit]}|Rollouts audit>\n• Review <{urls[sro_updates]}|SRO updates>\n• Monitor bid request patterns',
+        'start_traffic_investigation'
+    ),
+    'errors': _alert_response(
+        '⚠️ HOLMES: Error Rate Alert Detected',
+        '*🎯 INVESTIGATION RECOMMENDED:*\n• Check infrastructure status\n• Review recent deployments\n• Monitor service health',
+        'start_error_investigation'
+    ),
+}
+GENERIC_ALERT_RESPONSE = _alert_response(
+    '🕵️ HOLMES: Alert Detected',
+    '*🎯 INVESTIGATION AVAILABLE:*\nHOLMES can help investigate this alert.',
+    'start_investigation'
+)
 
 
-def get_initial_decision_blocks():
-    """Initial decision tree blocks"""
+def build_alert_response_blocks(alert_type, user_id, timestamp):
+    """Header, who detected the alert and when, what to check, and the button starting the investigation"""
+    header, details, action_id = ALERT_RESPONSES.get(alert_type, GENERIC_ALERT_RESPONSE)
     return [
         {
             'type': 'header',
-            'text': {
-                'type': 'plain_text',
-                'text': '🕵️ HOLMES: Health Operations & Live Monitoring Expert System'
-            }
+            'text': {'type': 'plain_text', 'text': header}
         },
         {
             'type': 'section',
             'text': {
                 'type': 'mrkdwn',
-                'text': '*First, verify in monitoring dashboards:*\n• <{}|Performance Monitoring Dashboard>\n• <{}|Health Dashboard>\n\n*What type of anomaly detected?*'.format(
-                    MONITORING_URLS["main_dashboard"],
-                    MONITORING_URLS["health_dashboard"]
-                )
+                'text': f"*Alert detected by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n\n{details}"
             }
         },
         {
@@ -225,139 +216,165 @@ def get_initial_decision_blocks():
             'elements': [
                 {
                     'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '💰 Revenue/Spend Issue'},
-                    'value': 'revenue_issue',
-                    'action_id': 'select_revenue'
-                },
-                {
-                    'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '📊 Traffic Issue'},
-                    'value': 'traffic_issue',
-                    'action_id': 'select_traffic'
-                }
-            ]
-        },
-        {
-            'type': 'actions',
-            'elements': [
-                {
-                    'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '⚠️ Error Rate Issue'},
-                    'value': 'error_issue',
-                    'action_id': 'select_error'
-                },
-                {
-                    'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '🐌 Latency Issue'},
-                    'value': 'latency_issue',
-                    'action_id': 'select_latency'
-                }
-            ]
-        },
-        {
-            'type': 'actions',
-            'elements': [
-                {
-                    'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '📋 Data Discrepancy'},
-                    'value': 'data_discrepancy',
-                    'action_id': 'select_discrepancy'
+                    'text': {'type': 'plain_text', 'text': '🔍 Start Investigation'},
+                    'value': action_id,
+                    'action_id': action_id,
+                    'style': 'primary'
                 }
             ]
         }
     ]
 
 
+def get_alert_storm_block(count, last_seen):
+    """Context appended to an alert response while repeats of the alert are coalesced into it"""
+    return {
+        'type': 'context',
+        'elements': [
+            {
+                'type': 'mrkdwn',
+                'text': f"🔁 *Repeated {count} times*, last at <!date^{last_seen}^{{time}}|{last_seen}>"
+            }
+        ]
+    }
+
+
+def get_live_metrics_block(readings):
+    """Section listing live metric readings (see enrichment)"""
+    lines = '\n'.join(f"• {reading.text}" for reading in readings)
+    return {'type': 'section', 'text': {'type': 'mrkdwn', 'text': f"*📈 LIVE METRICS:*\n{lines}"}}
+
+
+def get_similar_incidents_block(similar):
+    """Section linking the most similar past incidents and how they were resolved (see incidents)"""
+    lines = []
+    for incident, _ in similar:
+        snippet = ' '.join(incident.text.split())[:120]
+        snippet = snippet.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        date = datetime.fromtimestamp(incident.opened_at).strftime('%b %d')
+        lines.append(f"• <{incident.link}|{date}> resolved as `{incident.resolution}`: _{snippet}_")
+    return {'type': 'section', 'text': {'type': 'mrkdwn', 'text': "*🗂️ SIMILAR PAST INCIDENTS:*\n" + '\n'.join(lines)}}
+
+
+def get_ingested_alerts_block(alerts, limit=10):
+    """Section listing the firing alerts of an ingested group (see ingest)"""
+    lines = []
+    for alert in alerts[:limit]:
+        summary = ' '.join(alert.summary.split())[:150]
+        line = f"• *{alert.severity}* {alert.name}" if alert.severity else f"• {alert.name}"
+        if summary:
+            line += f": {summary}"
+        lines.append(line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                     + (f" (<{alert.url}|source>)" if alert.url else ''))
+    if len(alerts) > limit:
+        lines.append(f"…and {len(alerts) - limit} more")
+    return {'type': 'section', 'text': {'type': 'mrkdwn', 'text': f"*🔥 FIRING ({len(alerts)}):*\n" + '\n'.join(lines)}}
+
+
+def get_alert_response_blocks(alert_type, original_message, user_id, readings=(), similar=(), alerts=()):
+    """Get response blocks for detected alert, with ingested alerts, live metric readings and similar past incidents
+    above the buttons"""
+    blocks = build_alert_response_blocks(alert_type, user_id, int(time.time()))
+    if alerts:
+        blocks.insert(-1, get_ingested_alerts_block(alerts))
+    if readings:
+        blocks.insert(-1, get_live_metrics_block(readings))
+    if similar:
+        blocks.insert(-1, get_similar_incidents_block(similar))
+    return blocks
 
 
-
-def get_latency_options_blocks():
-    """Latency issue option blocks"""
-    return [
-        {
-            'type': 'header',
-            'text': {'type': 'plain_text', 'text': '🐌 Latency Issue Analysis'}
-        },
-        {
-            'type': 'section',
-            'text': {'type': 'mrkdwn', 'text': '*What kind of latency pattern detected?*'}
-        },
-        {
-            'type': 'actions',
-            'elements': [
-                {
-                    'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '📈 35-50% degradation in specific DC'},
-                    'value': 'latency_degradation_dc',
-                    'action_id': 'latency_degradation_dc'
-                },
-                {
-                    'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '🌍 Cross-DC routing issues'},
-                    'value': 'cross_dc_routing',
-                    'action_id': 'cross_dc_routing'
-                }
-            ]
-        }
-    ]
+def get_initial_decision_blocks():
+    """Initial decision tree blocks"""
+    return DECISION_TREE.node_blocks()
 
 
-def get_critical_overspend_blocks(user_id, timestamp):
-    """Critical overspend incident blocks"""
-    exchange_ops_id = TEAM_CONTACTS.get('exchange_revenue_ops', 'exchange_revenue_ops')
+# On-demand sampling profiles of the live process for HOLMES_PROFILE_USERS (see profiler)
+PROFILER = create_profiler()
 
-    return [
-        {
-            'type': 'header',
-            'text': {'type': 'plain_text', 'text': '🔥 CRITICAL: Massive Overspend (>$100K)'}
-        },
-        {
-            'type': 'section',
-            'text': {
-                'type': 'mrkdwn',
-                'text': f'*Reported by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n*Investigation:* HOLMES System'
-            }
-        },
-        {
-            'type': 'section',
-            'text': {
-                'type': 'mrkdwn',
-                'text': f'*🎯 PRIMARY SUSPECT:* Bidder Capping System Failure\n*🔧 LIKELY CAUSE:* Druid Database unavailability\n\n*⚡ CHECK IMMEDIATELY:*\n• <{MONITORING_URLS["temporal_dashboard"]}|Temporal workflows>\n• Bidder settings in BM Dashboard\n• Druid database status\n\n*👥 ESCALATION:* <@{exchange_ops_id}>'
-            }
-        },
-        {
-            'type': 'actions',
-            'elements': [
-                {
-                    'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '✅ Druid is Available'},
-                    'value': 'druid_available',
-                    'action_id': 'druid_check_yes',
-                    'style': 'primary'
-                },
-                {
-                    'type': 'button',
-                    'text': {'type': 'plain_text', 'text': '❌ Druid is Down/Unavailable'},
-                    'value': 'druid_unavailable',
-                    'action_id': 'druid_check_no',
-                    'style': 'danger'
-                }
-            ]
-        }
-    ]
+HOLMES_HELP_TEXT = (
+    "*🕵️ HOLMES commands:*\n"
+    "• `/holmes`: start an investigation\n"
+    "• `/holmes profile <seconds>`: profile this HOLMES process and upload a flamegraph-ready file\n"
+    "• `/holmes help`: this list"
+)
 
+PROFILE_UPLOAD_FAILED_TEXT = "\n_The collapsed-stack file could not be uploaded (does the app have `files:write`?)_"
 
 
+def check_profile_request(body, argument):
+    """(seconds, None) if the user may profile for that long, else (None, reason)"""
+    if not PROFILER.enabled:
+        return None, "Profiling is disabled: no users are listed in `HOLMES_PROFILE_USERS`."
+    if not PROFILER.authorized(body.get('user_id')):
+        PROFILER.count_refused()
+        logger.warning("Refused /holmes profile", extra={'user_id': body.get('user_id')})
+        return None, "You are not allowed to profile HOLMES."
+    try:
+        seconds = float(argument) if argument else 10.0
+    except ValueError:
+        return None, "Usage: `/holmes profile <seconds>`"
+    if not 0 < seconds <= PROFILER.max_seconds:
+        return None, f"Profiles last from a fraction of a second up to {PROFILER.max_seconds:g} seconds."
+    return seconds, None
+
+
+def get_profile_summary(profile, limit=8):
+    """Samples per handler (action_id, command or event) and the hottest frames of each"""
+    total = sum(profile.stacks.values())
+    handlers = profile.by_handler()
+    busy = sum(handlers.values())
+    lines = [f"*🔬 HOLMES profile of pid {os.getpid()}:* {profile.duration:.1f} s, {profile.samples} samples of "
+             f"{profile.threads} threads, {busy / total if total else 0:.0%} of thread samples in handlers"]
+    for handler, count in handlers.most_common(limit):
+        frames = ', '.join(f"`{frame}` {frame_count}" for frame, frame_count in profile.hot_frames(handler, 3))
+        lines.append(f"• *{handler}*: {count} ({count / busy:.0%}) in {frames}")
+    if not handlers:
+        lines.append("_No handler ran while profiling._")
+    return '\n'.join(lines)
+
+
+def get_profile_filename():
+    return f"holmes-profile-{os.getpid()}-{int(time.time())}.collapsed"
+
+
+def handle_profile_command(body, client, respond, argument):
+    """Sample the process for the requested seconds, then post the summary and collapsed stacks to the channel"""
+    seconds, refusal = check_profile_request(body, argument)
+    if refusal:
+        respond(refusal)
+        return
+    respond(f"🔬 Profiling pid {os.getpid()} for {seconds:g} s…")
+    profile = PROFILER.profile(seconds)
+    if profile is None:
+        respond("A profile of this process is already running.")
+        return
+    summary = get_profile_summary(profile)
+    try:
+        client.files_upload_v2(channel=body.get('channel_id'), content=profile.collapsed(),
+                               filename=get_profile_filename(), title="HOLMES profile (collapsed stacks)",
+                               initial_comment=summary)
+    except Exception:
+        logger.exception("Could not upload profile")
+        respond(summary + PROFILE_UPLOAD_FAILED_TEXT)
 
 
 # Slash command handler
-@app.command("/holmes")
 def handle_holmes_command(ack, body, client, respond):
     """Handle /holmes slash command"""
     ack()
     
-    print(f"Received /holmes command from channel: {body.get('channel_id', 'unknown')}")
-    print(f"User: {body.get('user_id', 'unknown')}")
+    logger.info("Received /holmes command", extra={
+        'channel': body.get('channel_id', 'unknown'), 'user_id': body.get('user_id', 'unknown')
+    })
+
+    subcommand, _, argument = (body.get('text') or '').strip().partition(' ')
+    if subcommand == 'help':
+        respond(HOLMES_HELP_TEXT)
+        return
+    if subcommand == 'profile':
+        handle_profile_command(body, client, respond, argument.strip())
+        return
 
     try:
         # Post message publicly in the channel instead of ephemeral response
@@ -366,9 +383,9 @@ def handle_holmes_command(ack, body, client, respond):
             blocks=get_initial_decision_blocks(),
             text="🕵️ HOLMES: Platform Investigation System"
         )
-        print("Successfully sent public message")
-    except Exception as e:
-        print(f"Error sending initial message: {e}")
+        logger.debug("Successfully sent public message")
+    except Exception:
+        logger.exception("Error sending initial message")
         # Fallback to direct message if channel fails
         try:
             client.chat_postMessage(
@@ -376,672 +393,378 @@ def handle_holmes_command(ack, body, client, respond):
                 blocks=get_initial_decision_blocks(),
                 text="🕵️ HOLMES: Platform Investigation System"
             )
-            print(f"Sent as DM to user {body.get('user_id')}")
-        except Exception as e2:
-            print(f"Error sending DM: {e2}")
+            logger.info("Sent as DM", extra={'user_id': body.get('user_id')})
+        except Exception:
+            logger.exception("Error sending DM")
 
 
-# Alert detection message handler
-@app.event("message")
-def handle_alert_messages(message, say, client):
-    """Detect alerts in monitored channels and respond with investigation help"""
-    
-    print(f"📨 Received message event: channel={message.get('channel')}, user={message.get('user')}, subtype={message.get('subtype')}")
-    
-    # Skip bot messages
-    if message.get('bot_id') or message.get('subtype') == 'bot_message':
-        print(f"⏭️ Skipping bot message")
-        return
-    
-    channel = message.get('channel')
-    text = message.get('text', '')
-    user = message.get('user', '')
-    ts = message.get('ts', '')
-    
-    print(f"📍 Channel: {channel}, Monitored: {MONITORED_CHANNELS}")
-    
-    # Check if channel is monitored OR if it's a DM for testing
-    if not channel or (channel not in MONITORED_CHANNELS and not channel.startswith('D')):
-        print(f"⏭️ Channel {channel} not monitored")
+async def handle_holmes_command_async(ack, body, client, respond):
+    """Async runtime variant of /holmes; the DM fallback depends on the first call failing"""
+    await ack()
+
+    subcommand, _, argument = (body.get('text') or '').strip().partition(' ')
+    if subcommand == 'help':
+        await respond(HOLMES_HELP_TEXT)
         return
-    
-    print(f"🔍 Checking message: {text[:100]}...")
-    
-    # Classify the alert
-    alert_type = classify_alert(text)
-    
-    if alert_type:
-        print(f"🚨 Alert detected! Type: {alert_type}, User: {user}")
-        
+    if subcommand == 'profile':
+        seconds, refusal = check_profile_request(body, argument.strip())
+        if refusal:
+            await respond(refusal)
+            return
+        await respond(f"🔬 Profiling pid {os.getpid()} for {seconds:g} s…")
+        # Sampled from a thread, so the event loop keeps running (and is profiled) meanwhile
+        profile = await asyncio.to_thread(PROFILER.profile, seconds)
+        if profile is None:
+            await respond("A profile of this process is already running.")
+            return
+        summary = get_profile_summary(profile)
         try:
-            # Respond in a thread to the original message
-            client.chat_postMessage(
-                channel=channel,
-                thread_ts=ts,  # This makes it a thread reply
-                blocks=get_alert_response_blocks(alert_type, text, user),
-                text=f"🕵️ HOLMES: {alert_type.title()} alert detected - Investigation assistance available"
-            )
-            print(f"✅ Posted HOLMES alert response in thread for {alert_type} alert")
-            
-        except Exception as e:
-            print(f"❌ Error posting alert response: {e}")
-    else:
-        print(f"ℹ️ No alert patterns detected in message")
-
-
-# Button action handlers
-
-
-@app.action("select_discrepancy")
-def handle_discrepancy_selection(ack, body, respond, client):
-    """Handle data discrepancy selection"""
-    ack()
-    user_id = body.get('user', {}).get('id', 'unknown')
-    print(f"🔍 Button clicked: select_discrepancy by user {user_id}")
-    try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show what was selected (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="✅ User selected: *Data Discrepancy*",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'✅ <@{user_id}> selected: *Data Discrepancy*'
-                    }
-                }
-            ]
-        )
-        
-        # Post new message in thread with discrepancy analysis
-        client.chat_postMessage(
-            channel=channel,
-            thread_ts=thread_ts,
-            blocks=[
-                {
-                    'type': 'header',
-                    'text': {'type': 'plain_text', 'text': '📋 Data Discrepancy Analysis'}
-                },
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': 'Data discrepancy investigation started. Please check:\n• Revenue reporting differences\n• Analytics data consistency\n• Database synchronization issues'
-                    }
-                }
-            ],
-            text="Data Discrepancy Analysis"
-        )
-        print("✅ Posted new message with discrepancy analysis")
-    except Exception as e:
-        print(f"❌ Error handling discrepancy selection: {e}")
-        print(f"Full body keys: {list(body.keys())}")
-
-
-
-
-
-
-# Traffic sub-option handlers
-
-
-
-
-
-
-
-
-
-# Latency sub-option handlers  
-@app.action("latency_degradation_dc")
-def handle_latency_degradation_dc(ack, body, respond, client):
-    """Handle latency degradation in specific DC"""
-    ack()
-    user_id = body.get('user', {}).get('id', 'unknown')
-    print(f"🔍 Button clicked: latency_degradation_dc by user {user_id}")
+            await client.files_upload_v2(channel=body.get('channel_id'), content=profile.collapsed(),
+                                         filename=get_profile_filename(), title="HOLMES profile (collapsed stacks)",
+                                         initial_comment=summary)
+        except Exception:
+            logger.exception("Could not upload profile")
+            await respond(summary + PROFILE_UPLOAD_FAILED_TEXT)
+        return
 
     try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show what was selected (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="✅ User selected: *Latency Degradation in DC*",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'✅ <@{user_id}> selected: *Latency Degradation in DC*'
-                    }
-                }
-            ]
-        )
-        
-        # Post new message in thread with investigation steps
-        client.chat_postMessage(
-            channel=channel,
-            thread_ts=thread_ts,
-            blocks=[
-                {
-                    'type': 'header',
-                    'text': {'type': 'plain_text', 'text': '📈 Latency Degradation Investigation'}
-                },
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'*Investigation started by:* <@{user_id}>\n\n*INVESTIGATION STEPS:*\n• Check CPU and memory usage in affected DC\n• Verify network routing configuration\n• Review recent deployment changes\n• Monitor database connection pool status'
-                    }
-                }
-            ],
-            text="Latency Degradation Investigation Steps"
+        await client.chat_postMessage(
+            channel=body.get('channel_id'),
+            blocks=get_initial_decision_blocks(),
+            text="🕵️ HOLMES: Platform Investigation System"
         )
-        print("✅ Successfully handled latency_degradation_dc")
-    except Exception as e:
-        print(f"❌ Error handling latency_degradation_dc: {e}")
-
+    except Exception:
+        logger.exception("Error sending initial message")
+        try:
+            await client.chat_postMessage(
+                channel=body.get('user_id'),
+                blocks=get_initial_decision_blocks(),
+                text="🕵️ HOLMES: Platform Investigation System"
+            )
+        except Exception:
+            logger.exception("Error sending DM")
 
-@app.action("cross_dc_routing")
-def handle_cross_dc_routing(ack, body, respond, client):
-    """Handle cross-DC routing issues"""
-    ack()
-    user_id = body.get('user', {}).get('id', 'unknown')
-    print(f"🔍 Button clicked: cross_dc_routing by user {user_id}")
 
-    try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show what was selected (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="✅ User selected: *Cross-DC Routing Issues*",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'✅ <@{user_id}> selected: *Cross-DC Routing Issues*'
-                    }
-                }
-            ]
-        )
-        
-        # Post new message in thread with investigation steps
-        client.chat_postMessage(
-            channel=channel,
-            thread_ts=thread_ts,
-            blocks=[
-                {
-                    'type': 'header',
-                    'text': {'type': 'plain_text', 'text': '🌍 Cross-DC Routing Issues Investigation'}
-                },
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'*Investigation started by:* <@{user_id}>\n\n*INVESTIGATION STEPS:*\n• Check inter-DC network connectivity\n• Verify load balancer routing rules\n• Review DNS resolution times\n• Monitor cross-region latency metrics'
-                    }
-                }
-            ],
-            text="Cross-DC Routing Investigation Steps"
-        )
-        print("✅ Successfully handled cross_dc_routing")
-    except Exception as e:
-        print(f"❌ Error handling cross_dc_routing: {e}")
+handle_holmes_command.async_handler = handle_holmes_command_async
 
 
-# Alert investigation starters
-@app.action("start_revenue_investigation")
-def handle_start_revenue_investigation(ack, body, respond, client):
-    """Start revenue investigation from alert"""
-    ack()
-    user_id = body.get('user', {}).get('id', 'unknown')
-    print(f"🔍 Starting revenue investigation from alert by user {user_id}")
+# Alert detection message handler
+def match_alert(message):
+    """(channel policy, alert type) if HOLMES should respond to this message, else None"""
+    # Unmonitored channels are dropped first, before any text processing or logging
+    policy = CHANNEL_REGISTRY.policy_for(message.get('channel'))
+    if policy is None:
+        return None
     
-    try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show investigation started (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="🔍 Investigation Started: *Revenue Issue*",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'🔍 <@{user_id}> started: *Revenue Issue Investigation*'
-                    }
-                }
-            ]
-        )
-        
-        # Post new message in thread with revenue options
-        client.chat_postMessage(
-            channel=channel,
-            thread_ts=thread_ts,
-            blocks=get_revenue_options_blocks(),
-            text="Revenue Issue Investigation Options"
-        )
-        print("✅ Started revenue investigation")
-    except Exception as e:
-        print(f"❌ Error starting revenue investigation: {e}")
-        print(f"Full body keys: {list(body.keys())}")
-
-
-@app.action("start_traffic_investigation")
-def handle_start_traffic_investigation(ack, body, respond, client):
-    """Start traffic investigation from alert"""
-    ack()
-    user_id = body.get('user', {}).get('id', 'unknown')
-    print(f"🔍 Starting traffic investigation from alert by user {user_id}")
+    # Skip bot messages
+    if message.get('bot_id') or message.get('subtype') == 'bot_message':
+        hot_path_logger.debug("Skipping bot message")
+        return None
     
-    try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show investigation started (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="🔍 Investigation Started: *Traffic Issue*",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'🔍 <@{user_id}> started: *Traffic Issue Investigation*'
-                    }
-                }
-            ]
-        )
-        
-        # Post new message in thread with traffic options
-        client.chat_postMessage(
-            channel=channel,
-            thread_ts=thread_ts,
-            blocks=get_traffic_options_blocks(),
-            text="Traffic Issue Investigation Options"
-        )
-        print("✅ Started traffic investigation")
-    except Exception as e:
-        print(f"❌ Error starting traffic investigation: {e}")
-        print(f"Full body keys: {list(body.keys())}")
-
-
-@app.action("start_error_investigation")
-def handle_start_error_investigation(ack, body, respond, client):
-    """Start error investigation from alert"""
-    ack()
-    user_id = body.get('user', {}).get('id', 'unknown')
-    print(f"🔍 Starting error investigation from alert by user {user_id}")
+    channel = message.get('channel')
     
-    try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show investigation started (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="🔍 Investigation Started: *Error Rate Issue*",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'🔍 <@{user_id}> started: *Error Rate Issue Investigation*'
-                    }
-                }
-            ]
-        )
-        
-        # Post new message in thread with error options
-        error_blocks = [
-            {
-                'type': 'header',
-                'text': {'type': 'plain_text', 'text': '⚠️ Error Rate Issue Analysis'}
-            },
-            {
-                'type': 'section',
-                'text': {'type': 'mrkdwn', 'text': '*What kind of error pattern detected?*'}
-            },
-            {
-                'type': 'actions',
-                'elements': [
-                    {
-                        'type': 'button',
-                        'text': {'type': 'plain_text', 'text': '🏗️ 5xx errors in specific DC'},
-                        'value': '5xx_errors_dc',
-                        'action_id': '5xx_errors_dc'
-                    },
-                    {
-                        'type': 'button',
-                        'text': {'type': 'plain_text', 'text': '⏱️ High timeout rates'},
-                        'value': 'high_timeouts',
-                        'action_id': 'high_timeouts'
-                    }
-                ]
-            }
-        ]
-        client.chat_postMessage(
-            channel=channel,
-            thread_ts=thread_ts,
-            blocks=error_blocks,
-            text="Error Rate Issue Investigation Options"
-        )
-        print("✅ Started error investigation")
-    except Exception as e:
-        print(f"❌ Error starting error investigation: {e}")
-        print(f"Full body keys: {list(body.keys())}")
-
-
-@app.action("start_investigation")
-def handle_start_general_investigation(ack, body, respond, client):
-    """Start general investigation from alert"""
-    ack()
-    user_id = body.get('user', {}).get('id', 'unknown')
-    print(f"🔍 Starting general investigation from alert by user {user_id}")
+    # Classify the alert
+    alert_type = classify_alert(message.get('text', ''))
     
-    try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show investigation started (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="🔍 Investigation Started: *General Analysis*",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'🔍 <@{user_id}> started: *HOLMES Investigation*'
-                    }
-                }
-            ]
-        )
-        
-        # Post new message in thread with investigation options
-        client.chat_postMessage(
-            channel=channel,
-            thread_ts=thread_ts,
-            blocks=get_initial_decision_blocks(),
-            text="HOLMES Investigation Options"
-        )
-        print("✅ Started general investigation")
-    except Exception as e:
-        print(f"❌ Error starting general investigation: {e}")
-        print(f"Full body keys: {list(body.keys())}")
+    if not alert_type:
+        ALERT_CLASSIFICATIONS.inc('none', 'unmatched')
+        hot_path_logger.debug("No alert patterns detected in message", extra={'channel': channel})
+        return None
+    if not policy.handles(alert_type):
+        ALERT_CLASSIFICATIONS.inc(alert_type, 'disabled')
+        hot_path_logger.debug("Alert category disabled for channel", extra={'alert_type': alert_type, 'channel': channel})
+        return None
+    if policy.response_mode == 'silent':
+        ALERT_CLASSIFICATIONS.inc(alert_type, 'silent')
+        logger.info("Alert detected", extra={'alert_type': alert_type, 'channel': channel, 'response_mode': 'silent'})
+        return None
+    ALERT_CLASSIFICATIONS.inc(alert_type, 'matched')
+    return policy, alert_type
+
+
+def get_alert_storm_blocks(storm):
+    """Alert response blocks of a storm, with its running repeat count"""
+    blocks = build_alert_response_blocks(storm.category, storm.user_id, int(storm.first_seen))
+    # Updates run on the coalescer's timer (or the event loop), so only cached readings are shown
+    readings = ENRICHER.cached(storm.category)
+    if readings:
+        blocks.insert(-1, get_live_metrics_block(readings))
+    similar = INCIDENTS.similar(storm.text, storm.category)
+    if similar:
+        blocks.insert(-1, get_similar_incidents_block(similar))
+    blocks.append(get_alert_storm_block(storm.count, int(storm.last_seen)))
+    return blocks
+
+
+def get_alert_storm_text(storm):
+    return f"🕵️ HOLMES: {storm.category.title()} alert repeated {storm.count} times - Investigation assistance available"
 
 
-@app.action("select_latency")
-def handle_latency_selection(ack, body, respond, client):
-    """Handle latency issue selection"""
-    ack()
-    user_id = body.get('user', {}).get('id', 'unknown')
-    print(f"🔍 Button clicked: select_latency by user {user_id}")
-    try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show what was selected (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="✅ User selected: *Latency Issue*",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'✅ <@{user_id}> selected: *Latency Issue*'
-                    }
-                }
-            ]
-        )
-        
-        # Post new message in thread with latency options
-        client.chat_postMessage(
-            channel=channel,
-            thread_ts=thread_ts,
-            blocks=get_latency_options_blocks(),
-            text="Latency Issue Analysis Options"
-        )
-        print("✅ Posted new message with latency options")
-    except Exception as e:
-        print(f"❌ Error handling latency selection: {e}")
-        print(f"Full body keys: {list(body.keys())}")
+def handle_alert_messages(message, say, client):
+    """Detect alerts in monitored channels and respond with investigation help"""
+    match = match_alert(message)
+    if match is None:
+        return
+    policy, alert_type = match
+    channel = message.get('channel')
+    text = message.get('text', '')
+    user = message.get('user', '')
+    ts = message.get('ts', '')
+    respond_to_alert(client, policy, alert_type, channel, text, user, ts)
 
 
-@app.action("massive_overspend")
-def handle_massive_overspend(ack, body, respond, client):
-    """Handle massive overspend critical incident"""
-    ack()
+def respond_to_alert(client, policy, alert_type, channel, text, user, ts, alerts=()):
+    """Post (or coalesce) the investigation response to an alert at ts in channel
+
+    ts is None for alerts that were never posted to Slack (see ingest_alerts): the
+    response then goes to the channel itself, and lists the ingested alerts.
+    """
 
-    user_id = body.get('user', {}).get('id', 'unknown')
-    timestamp = int(time.time())
-    print(f"🔍 Button clicked: massive_overspend by user {user_id}")
+    def send_update():
+        client.chat_update(channel=channel, ts=storm.response_ts,
+                           blocks=get_alert_storm_blocks(storm), text=get_alert_storm_text(storm))
 
+    # Repeats of a recent alert only bump the count on the existing response
+    storm, is_new = ALERT_COALESCER.observe(channel, alert_type, text, user)
+    if not is_new:
+        hot_path_logger.debug("Coalesced repeated alert", extra={'alert_type': alert_type, 'channel': channel, 'count': storm.count})
+        ALERT_COALESCER.repeated(storm, send_update)
+        return
+    
+    logger.info("Alert detected", extra={'alert_type': alert_type, 'channel': channel, 'user_id': user})
+    if not policy.allow():
+        logger.warning("Channel over its response rate cap, not responding", extra={
+            'channel': channel, 'rate_cap': policy.rate_cap
+        })
+        # Otherwise repeats would only count towards a response that was never posted
+        ALERT_COALESCER.forget(storm)
+        return
+    
     try:
-        # Get channel and thread info
-        channel = body.get('channel', {}).get('id') or body.get('container', {}).get('channel_id')
-        message_ts = body.get('message', {}).get('ts') or body.get('container', {}).get('message_ts')
-        thread_ts = body.get('message', {}).get('thread_ts') or message_ts
-        
-        # Update original message to show what was selected (visible to all)
-        client.chat_update(
-            channel=channel,
-            ts=message_ts,
-            text="⚠️ MASSIVE OVERSPEND Selected",
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'🚨 <@{user_id}> selected: *MASSIVE OVERSPEND (>$100K)*'
-                    }
-                }
-            ]
-        )
-        
-        # Post critical alert in thread
-        client.chat_postMessage(
+        # Current numbers from every provider of the category, fetched concurrently within the budget
+        readings = ENRICHER.readings(alert_type)
+        similar = INCIDENTS.similar(text, alert_type)
+        # Respond in a thread to the original message, or in the channel itself
+        response = client.chat_postMessage(
             channel=channel,
-            thread_ts=thread_ts,
-            blocks=[
-                {
-                    'type': 'header',
-                    'text': {'type': 'plain_text', 'text': '🔥 CRITICAL: Massive Overspend Investigation'}
-                },
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'*Investigator:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n\n*🎯 PRIMARY SUSPECT:* Bidder Capping System Failure\n*🔧 LIKELY CAUSE:* Druid Database unavailability\n\n*⚡ IMMEDIATE ACTIONS:*\n\n1️⃣ Check <{MONITORING_URLS["temporal_dashboard"]}|Temporal workflows>\n2️⃣ Verify Bidder settings in BM Dashboard\n3️⃣ Check Druid database status\n4️⃣ Monitor real-time spend\n\n*👥 ESCALATION REQUIRED:* Notify Exchange Revenue Ops team immediately!'
-                    }
-                }
-            ],
-            text="🔥 CRITICAL: Massive Overspend Investigation"
+            thread_ts=ts if policy.response_mode == 'thread' else None,
+            blocks=get_alert_response_blocks(alert_type, text, user, readings, similar, alerts),
+            text=f"🕵️ HOLMES: {alert_type.title()} alert detected - Investigation assistance available"
         )
+        logger.debug("Posted HOLMES alert response", extra={'alert_type': alert_type, 'response_mode': policy.response_mode})
+        ALERT_COALESCER.posted(storm, response['ts'], send_update)
+        # Clicks on the response belong to this thread's investigation, which closes its incident
+        thread_ts = ts if policy.response_mode == 'thread' and ts else response['ts']
+        SESSION_STORE.open(channel, thread_ts, alert_type, user)
+        INCIDENTS.record(channel, thread_ts, alert_type, text)
         
-        # Also post to incidents channel if configured
-        if CHANNELS.get('incidents'):
-            client.chat_postMessage(
-                channel=CHANNELS['incidents'],
-                text=f"🚨 CRITICAL INCIDENT: Massive Overspend Detected by <@{user_id}>",
-                blocks=[
-                    {
-                        'type': 'section',
-                        'text': {
-                            'type': 'mrkdwn',
-                            'text': f'🚨 *CRITICAL INCIDENT ALERT*\n\n*Reported by:* <@{user_id}>\n*Type:* Massive Overspend (>$100K)\n*Investigation:* In progress\n\n*See thread for details:* <#{channel}>'
-                        }
-                    }
-                ]
-            )
-
-        print("✅ Successfully handled massive_overspend")
-    except Exception as e:
-        print(f"❌ Error handling massive overspend: {e}")
-
-
-
-
-
-
-@app.action("druid_check_no")
-def handle_druid_unavailable(ack, body, client):
-    """Handle Druid unavailable scenario"""
-    ack()
+    except Exception:
+        logger.exception("Error posting alert response")
+        ALERT_COALESCER.forget(storm)
 
-    try:
-        client.chat_update(
-            channel=body['channel']['id'],
-            ts=body['message']['ts'],
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': '🔥 *CRITICAL ACTION REQUIRED*\n\n*ROOT CAUSE CONFIRMED:* Druid Database Unavailable\n*BIDDER CAPPING SYSTEM OFFLINE*'
-                    },
-                    'accessory': {
-                        'type': 'image',
-                        'image_url': 'https://via.placeholder.com/50x50/e53e3e/ffffff?text=!',
-                        'alt_text': 'Critical'
-                    }
-                },
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': '*⚡ IMMEDIATE ACTIONS:*\n1. 🛑 *Manually disable affected bidder in BM Dashboard*\n2. 📞 *Contact DevOps team to restore Druid*\n3. 📊 *Monitor spend in real-time*\n4. 📝 *Document total overspend amount*\n\n*📋 FOLLOW-UP:*\n• Implement real-time billing events pipeline\n• Review Druid SLA and backup procedures'
-                    }
-                }
-            ]
-        )
-    except Exception as e:
-        print(f"Error handling Druid unavailable: {e}")
 
+async def handle_alert_messages_async(message, client):
+    """Async runtime variant of handle_alert_messages; storm updates need the posted message ts"""
+    match = match_alert(message)
+    if match is None:
+        return
+    policy, alert_type = match
+    channel = message.get('channel')
+    text = message.get('text', '')
+    user = message.get('user', '')
+    loop = asyncio.get_running_loop()
 
-@app.action("sro_deploy_found")
-def handle_sro_deployment_issue(ack, body, client):
-    """Handle SRO deployment issue"""
-    ack()
+    async def update():
+        try:
+            await client.chat_update(channel=channel, ts=storm.response_ts,
+                                     blocks=get_alert_storm_blocks(storm), text=get_alert_storm_text(storm))
+        except Exception:
+            logger.exception("Alert storm update failed", extra={'channel': channel})
+
+    def send_update():
+        # May run on the coalescer's timer thread
+        asyncio.run_coroutine_threadsafe(update(), loop)
+
+    storm, is_new = ALERT_COALESCER.observe(channel, alert_type, text, user)
+    if not is_new:
+        hot_path_logger.debug("Coalesced repeated alert", extra={'alert_type': alert_type, 'channel': channel, 'count': storm.count})
+        ALERT_COALESCER.repeated(storm, send_update)
+        return
 
-    baptiste_id = TEAM_CONTACTS.get('baptiste_poirier', 'baptiste.poirier')
-    nika_id = TEAM_CONTACTS.get('nika_kozhukh', 'nika.kozhukh')
+    logger.info("Alert detected", extra={'alert_type': alert_type, 'channel': channel, 'user_id': user})
+    if not policy.allow():
+        logger.warning("Channel over its response rate cap, not responding", extra={
+            'channel': channel, 'rate_cap': policy.rate_cap
+        })
+        # Otherwise repeats would only count towards a response that was never posted
+        ALERT_COALESCER.forget(storm)
+        return
 
     try:
-        client.chat_update(
-            channel=body['channel']['id'],
-            ts=body['message']['ts'],
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': '📉 *SRO DEPLOYMENT ISSUE CONFIRMED*\n\n*ROOT CAUSE:* Recent SRO model file deployment'
-                    }
-                },
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'*⚡ IMMEDIATE ACTIONS:*\n1. 🔄 *Rollback SRO file to previous version*\n2. 📊 *Monitor bid request recovery*\n3. 🔍 *Check notebook file naming for errors*\n\n*👥 NOTIFY:* <@{baptiste_id}> <@{nika_id}>\n*📍 CHECK:* <{MONITORING_URLS["sro_updates"]}|SRO Updates Channel>'
-                    }
-                }
-            ]
+        readings = await ENRICHER.readings_async(alert_type)
+        similar = INCIDENTS.similar(text, alert_type)
+        response = await client.chat_postMessage(
+            channel=channel,
+            thread_ts=message.get('ts') if policy.response_mode == 'thread' else None,
+            blocks=get_alert_response_blocks(alert_type, text, user, readings, similar),
+            text=f"🕵️ HOLMES: {alert_type.title()} alert detected - Investigation assistance available"
         )
-    except Exception as e:
-        print(f"Error handling SRO deployment issue: {e}")
-
-
-@app.action("sdk_activation_found")
-def handle_sdk_issue(ack, body, client):
-    """Handle SDK activation issue"""
-    ack()
-
-    sergei_id = TEAM_CONTACTS.get('sergei_smirnov', 'sergei.smirnov')
-    celine_id = TEAM_CONTACTS.get('celine_tran', 'celine.tran')
-
+        ALERT_COALESCER.posted(storm, response['ts'], send_update)
+        thread_ts = message.get('ts') if policy.response_mode == 'thread' else response['ts']
+        SESSION_STORE.open(channel, thread_ts, alert_type, user)
+        INCIDENTS.record(channel, thread_ts, alert_type, text)
+    except Exception:
+        logger.exception("Error posting alert response")
+        ALERT_COALESCER.forget(storm)
+
+
+handle_alert_messages.async_handler = handle_alert_messages_async
+
+
+def register_handlers(app):
+    """Register the core HOLMES handlers with the Slack app"""
+    app.command("/holmes")(handle_holmes_command)
+    app.event("message")(handle_alert_messages)
+
+
+def register_decision_tree(app):
+    """Answer every button from the decision tree; register last, so action plugins match first"""
+    # One catch-all listener, so actions added to the tree by a reload need no new registration
+    app.action(re.compile(r".+"))(DECISION_TREE.handle)
+
+
+def create_detection(client, sharder=None):
+    """Anomaly detection from HOLMES_DETECTION_FILE, reporting to its channel, not yet started; None if unset"""
+    path = os.environ.get("HOLMES_DETECTION_FILE")
+    if not path:
+        return None
+    # The detectors are only imported when detection is configured
+    from detection import load_detection
+
+    def report(detection):
+        channel = CHANNEL_REGISTRY.channel_id(runner.channel) or runner.channel
+        # Every replica evaluates the series; only the owner of the detection channel reports
+        if sharder is not None and not sharder.owns(channel):
+            return
+        policy = CHANNEL_REGISTRY.policy_for(channel)
+        if policy is None or not policy.handles(detection.category):
+            logger.warning("Detection channel is not monitored for this category", extra={
+                'channel': runner.channel, 'alert_type': detection.category
+            })
+            return
+        ALERT_CLASSIFICATIONS.inc(detection.category, 'detected')
+        # The detection is posted as an alert by HOLMES itself, then answered like any other
+        posted = client.chat_postMessage(channel=channel, text=detection.text)
+        respond_to_alert(client, policy, detection.category, channel, detection.text,
+                         posted.get('message', {}).get('user', ''), posted['ts'])
+
+    runner = load_detection(path, ALERT_PATTERNS, report)
+    if not runner.channel:
+        raise ValueError(f"Detection file {path} names no channel")
+    return runner
+
+
+def post_alert_group(client, channel, alert_type, alerts):
+    """Answer a group of ingested alerts of one category in one channel with a single response"""
+    policy = CHANNEL_REGISTRY.policy_for(channel)
+    if policy is None:
+        return
+    ALERT_CLASSIFICATIONS.inc(alert_type, 'ingested')
+    # Sorted, so that Alertmanager re-sending the same group is coalesced into the first response
+    text = '\n'.join(sorted(alert.text for alert in alerts))
+    # Attributed to HOLMES itself, as its auth.test identity
+    user = (warm_authorization(app, client) or {}).get('user_id', '')
+    respond_to_alert(client, policy, alert_type, channel, text, user, None, alerts)
+
+
+def ingest_alerts(authorization, stream, client, admission=None):
+    """Handle a POST to /alerts/ingest; (body, status)"""
+    if not ALERT_INGESTOR.enabled:
+        return {"error": "alert ingestion is disabled"}, 404
+    if not ALERT_INGESTOR.authorized(authorization):
+        return {"error": "unauthorized"}, 401
     try:
-        client.chat_update(
-            channel=body['channel']['id'],
-            ts=body['message']['ts'],
-            blocks=[
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': '🏗️ *SDK FEATURE ISSUE CONFIRMED*\n\n*ROOT CAUSE:* Recent SDK feature activation without proper infrastructure'
-                    }
-                },
-                {
-                    'type': 'section',
-                    'text': {
-                        'type': 'mrkdwn',
-                        'text': f'*⚡ IMMEDIATE ACTIONS:*\n1. 🛑 *Disable new SDK features immediately*\n2. 🔍 *Check Analytics V2 status in affected region*\n3. 📊 *Monitor error rate recovery*\n\n*👥 CONTACTS:* <@{sergei_id}> <@{celine_id}>\n*📍 VERIFY:* Infrastructure availability in affected DC'
-                    }
-                }
-            ]
-        )
-    except Exception as e:
-        print(f"Error handling SDK issue: {e}")
+        batch = ALERT_INGESTOR.parse(stream)
+    except IngestError as e:
+        logger.warning("Rejected alert batch", extra={'error': str(e)})
+        return {"error": str(e)}, e.status
+
+    shed = 0
+    for (channel, alert_type), alerts in batch.groups.items():
+        if admission is None:
+            post_alert_group(client, channel, alert_type, alerts)
+        # Queued behind earlier alert responses of the channel, at the priority of alert messages
+        elif not admission.submit(MESSAGE, channel, post_alert_group, client=client, channel=channel,
+                                  alert_type=alert_type, alerts=alerts):
+            shed += 1
+    logger.info("Ingested alert batch", extra={'groups': len(batch.groups), 'shed': shed, **batch.counts})
+    body = {"groups": len(batch.groups), "shed": shed, **batch.counts}
+    # Alertmanager retries on 5xx; groups already posted are coalesced on the retry
+    return body, 503 if shed else 202
+
+
+def get_health_status(admission=None, dispatcher=None, detection=None, socket_mode=None, sharder=None):
+    """Body of /health: liveness plus the counters of every component"""
+    status = {"status": "HOLMES system operational", "timestamp": datetime.now().isoformat()}
+    if admission is not None:
+        status["admission"] = admission.stats()
+        if status["admission"]["saturated"]:
+            status["status"] = "HOLMES saturated"
+    if dispatcher is not None:
+        status["web_api"] = dispatcher.stats()
+    status["alert_storms"] = ALERT_COALESCER.stats()
+    status["investigations"] = SESSION_STORE.stats()
+    status["enrichment"] = ENRICHER.stats()
+    status["incidents"] = INCIDENTS.stats()
+    if ALERT_MODEL is not None:
+        status["alert_model"] = ALERT_MODEL.stats()
+    if PROFILER.enabled:
+        status["profiler"] = PROFILER.stats()
+    if ALERT_INGESTOR.enabled:
+        status["alert_ingest"] = ALERT_INGESTOR.stats()
+    if detection is not None:
+        status["detection"] = detection.stats()
+    if socket_mode is not None:
+        status["socket_mode"] = socket_mode.stats()
+    if sharder is not None:
+        status["sharding"] = sharder.stats(CHANNEL_REGISTRY.monitored_channels())
+    status["readiness"] = READINESS.stats()
+    return status
+
+
+def watch_admission(admission):
+    """Export work queue depths by priority and saturation, read when /metrics is scraped"""
+    REGISTRY.gauge_callback(
+        'holmes_work_queue_depth', 'Jobs waiting in each work queue shard', ['priority', 'shard'],
+        lambda: {(priority, str(index)): depth
+                 for priority, work_queue in admission.queues.items()
+                 for index, depth in enumerate(work_queue.stats()['shard_depths'])})
+    REGISTRY.gauge_callback(
+        'holmes_saturated', 'Whether admission control is shedding work or over its high-water marks', [],
+        lambda: {(): int(admission.saturated())})
 
 
 # Flask integration for existing backend
-def create_flask_app():
+def create_flask_app(admission=None, dispatcher=None, detection=None, sharder=None):
+    # Imported here so that Socket Mode and the async runtime never load Flask
+    from flask import Flask, jsonify, request
+    from slack_bolt.adapter.flask import SlackRequestHandler
 
     flask_app = Flask(__name__)
     handler = SlackRequestHandler(app)
 
     @flask_app.route("/slack/events", methods=["POST"])
     def slack_events():
-        from flask import request, jsonify
-        print(f"Received request to /slack/events")
-        print(f"Headers: {dict(request.headers)}")
-        print(f"Content-Type: {request.content_type}")
-        
-        # Log the raw body for debugging
-        body = request.get_data(as_text=True)
-        print(f"Body: {body[:500]}")  # First 500 chars
+        # Request bodies and headers carry user content and signatures, so never log them
+        hot_path_logger.debug("Received request to /slack/events", extra={
+            'content_type': request.content_type, 'content_length': request.content_length
+        })
         
         # Handle URL verification challenge
         if request.content_type == 'application/json':
             data = request.get_json()
             if data and data.get('type') == 'url_verification':
-                print(f"Handling URL verification challenge")
+                logger.info("Handling URL verification challenge")
                 return jsonify({"challenge": data.get('challenge')})
         
         # Handle normal Slack requests
@@ -1050,54 +773,151 @@ def create_flask_app():
     # Add a specific slash command route as fallback
     @flask_app.route("/slack/slash", methods=["POST"])
     def slack_slash():
-        from flask import request
-        print(f"Received SLASH command to /slack/slash")
-        print(f"Form data: {dict(request.form)}")
+        hot_path_logger.debug("Received request to /slack/slash", extra={'content_length': request.content_length})
         return handler.handle(request)
 
-    # Health check endpoint
+    # Structured alerts from Alertmanager or Grafana, answered without a Slack message to classify
+    @flask_app.route("/alerts/ingest", methods=["POST"])
+    def alerts_ingest():
+        client = dispatcher.client if dispatcher is not None else app.client
+        body, status = ingest_alerts(request.headers.get('Authorization'), request.stream, client, admission)
+        return jsonify(body), status
+
+    # Health check endpoint (liveness)
     @flask_app.route("/health")
     def health_check():
-        return {"status": "HOLMES system operational", "timestamp": datetime.now().isoformat()}
+        return get_health_status(admission, dispatcher, detection, sharder=sharder)
+
+    # Readiness: 503 until this worker's startup steps are done
+    @flask_app.route("/ready")
+    def readiness_check():
+        status, body = READINESS.probe()
+        return body, status
+
+    @flask_app.route("/metrics")
+    def metrics():
+        return REGISTRY.render(), 200, {'Content-Type': CONTENT_TYPE}
 
     return flask_app
 
 
+def serve_status(admission, dispatcher, detection, socket_mode, sharder, port):
+    """Serve /health, /ready and /metrics without Flask, for Socket Mode"""
+    from status_server import create_status_server
+
+    def health():
+        return 200, 'application/json', json.dumps(get_health_status(admission, dispatcher, detection,
+                                                                     socket_mode, sharder)).encode()
+
+    def ready():
+        status, body = READINESS.probe()
+        return status, 'application/json', json.dumps(body).encode()
+
+    def metrics():
+        return 200, CONTENT_TYPE, REGISTRY.render().encode()
+
+    server = create_status_server({'/health': health, '/ready': ready, '/metrics': metrics}, port)
+    READINESS.start()
+    server.serve_forever()
+
+
 # Main function
 def main():
     """Main function to run HOLMES bot"""
-    print("🕵️ Starting HOLMES: Health Operations & Live Monitoring Expert System")
-    print("Available commands: /holmes")
-    print(f"Monitoring channels: {list(CHANNELS.values())}")
+    setup_logging()
+    mode = select_mode()
+    logger.info("Starting HOLMES: Health Operations & Live Monitoring Expert System", extra={
+        'commands': ['/holmes'], 'channels': CHANNEL_REGISTRY.monitored_channels(), 'mode': mode
+    })
     
     # Register all actions
-    print("📋 Registering HOLMES actions...")
     from actions import register_all_actions
-    register_all_actions(app)
 
-    # Check if Socket Mode is enabled
-    if os.environ.get("SLACK_APP_TOKEN"):
-        print("Starting in Socket Mode...")
-        print(f"App token: {os.environ['SLACK_APP_TOKEN'][:20]}...")
-        try:
-            from slack_bolt.adapter.socket_mode import SocketModeHandler
-            handler = SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
-            handler.start()
-        except Exception as e:
-            print(f"Socket Mode failed to start: {e}")
-            print("Falling back to HTTP mode...")
-            flask_app = create_flask_app()
-            flask_app.run(host="0.0.0.0", port=3000)
+    # Duplicate deliveries (Slack retries, double clicks) are dropped before any handler runs
+    idempotency_store = create_idempotency_store()
+    click_window = float(os.environ.get("DEDUP_CLICK_WINDOW_SECONDS", 30))
+
+    # Web API calls share pooled connections and are paced to Slack's rate limit tiers
+    dispatcher = create_dispatcher()
+
+    # Indexed in each serving process before its first alert, rather than at import
+    READINESS.defer('incidents', INCIDENTS.load)
+
+    # With HOLMES_SHARDING, replicas split the monitored channels between them
+    sharder = create_sharder()
+    if sharder is not None:
+        # Joined by each serving process once it listens, never by the gunicorn master before it forks
+        READINESS.defer('sharding', sharder.start)
+        atexit.register(sharder.leave)
+
+    # Loaded now, so a bad file fails startup; started after sharding in each serving process, where
+    # the workers of a host take turns through a lock file so that each series is evaluated once
+    detection = create_detection(dispatcher.client, sharder)
+    if detection is not None:
+        detection_lock = os.environ.get("DETECTION_LOCK_PATH", "/tmp/holmes-detection.lock")
+        READINESS.defer('detection', lambda: detection.start(detection_lock))
+
+    # Async runtime: one event loop serves many interactions concurrently
+    if mode == 'async':
+        from async_runtime import create_async_app, run_async
+        async_app = create_async_app(register_handlers, register_all_actions, register_decision_tree)
+        async_app.use(build_async_channel_filter_middleware(CHANNEL_REGISTRY))
+        if sharder is not None:
+            async_app.use(build_async_shard_filter_middleware(sharder))
+        async_app.use(build_async_dedup_middleware(idempotency_store, click_window))
+        async_app.use(build_async_client_middleware(dispatcher))
+        READINESS.defer('auth.test', lambda: warm_authorization(async_app, dispatcher.client))
+        run_async(async_app, port=3000)
+        return
+
+    # Messages from unmonitored channels, or from channels another replica owns, are acked and dropped
+    # before dedup and queueing
+    app.use(build_channel_filter_middleware(CHANNEL_REGISTRY))
+    if sharder is not None:
+        app.use(build_shard_filter_middleware(sharder))
+    app.use(build_dedup_middleware(idempotency_store, click_window))
+    app.use(build_client_middleware(dispatcher))
+    # The App skipped auth.test at import; it runs once the process is listening
+    READINESS.defer('auth.test', lambda: warm_authorization(app, app.client))
+
+    # Handlers ack immediately; their work runs on a bounded queue per priority, escalations first
+    admission = create_admission_controller(lambda body: classify_request(body, DECISION_TREE.escalates))
+    atexit.register(admission.shutdown)
+    watch_admission(admission)
+    # Saturated replicas report not ready, so the load balancer routes around them
+    READINESS.require('admission', lambda: not admission.saturated())
+    queued_app = QueuedAppBridge(app, admission)
+    register_handlers(queued_app)
+    register_all_actions(queued_app)
+    register_decision_tree(queued_app)
+
+    if mode == 'socket':
+        from socket_mode import create_socket_mode_runtime
+        logger.info("Starting in Socket Mode")
+        # Raises if a connection cannot be opened: there is no HTTP endpoint for Slack to fall back to
+        socket_mode = create_socket_mode_runtime(app).start()
+        # Registered after admission control, so it runs first: acked envelopes are dispatched before the queues drain
+        atexit.register(socket_mode.close)
+        READINESS.require('socket_mode', lambda: socket_mode.stats()['connected'] > 0)
+        # Slack traffic arrives over the connections; port 3000 only serves the status endpoints
+        serve_status(admission, dispatcher, detection, socket_mode, sharder, port=3000)
     else:
         # Use Flask for webhook mode
-        flask_app = create_flask_app()
+        flask_app = create_flask_app(admission, dispatcher, detection, sharder)
         # Use port 3000 inside container (mapped to 4241 outside)
         port = 3000
-        
-        if os.environ.get("FLASK_ENV") == "development":
-            flask_app.run(debug=True, host="0.0.0.0", port=port)
-        else:
-            flask_app.run(host="0.0.0.0", port=port)
+        serve_http(flask_app, port=port, debug=True)
+
+
+def serve_http(flask_app, port, debug):
+    """Serve the Flask app: Werkzeug dev server in development, gunicorn otherwise"""
+    if os.environ.get("FLASK_ENV") == "development":
+        # The dev server gives no hook once it listens; the startup steps only call out to Slack
+        READINESS.start()
+        flask_app.run(debug=debug, host="0.0.0.0", port=port)
+    else:
+        from server import run_production_server
+        run_production_server(flask_app, port, on_worker_start=READINESS.start)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,388 @@
+"""
+Metrics for HOLMES
+
+Counters and histograms served at /metrics in the Prometheus text format:
+
+- holmes_ack_duration_seconds{kind}: time from receiving a Slack request to acking it
+  (App.dispatch, for HTTP and Socket Mode alike)
+- holmes_handler_duration_seconds{handler} and holmes_handler_errors_total{handler}:
+  time spent in each handler, by action_id (or command / event type)
+- holmes_slack_api_duration_seconds{method} and holmes_slack_api_errors_total{method, error}
+- holmes_alert_classifications_total{category, outcome}
+- gauges read at scrape time, such as work queue depths
+
+Recording takes no lock: each thread adds to its own cells, and a scrape sums the
+cells of every thread. The lock is only taken the first time a thread records, and
+when the thread exits: its cells are then folded into the totals of exited threads,
+so short-lived threads (e.g. coalescer timers) do not add a shard each for good.
+
+Gunicorn workers are separate processes, and a scrape reaches only one of them. With
+HOLMES_METRICS_DIR set, every process also writes its totals to a file there every
+METRICS_FLUSH_SECONDS, and /metrics adds up the files of all workers. Counters of
+exited workers are kept, so totals never go backwards; their gauges are dropped.
+"""
+
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Slack retries a request that is not acked within 3 seconds
+ACK_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ''
+
+    __slots__ = ('registry', 'name', 'help', 'labelnames')
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    __slots__ = ()
+
+    def inc(self, *labels: str, amount: float = 1):
+        cells = self.registry.cells()
+        key = (self.name, labels)
+        cells[key] = cells.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, plus their sum"""
+
+    kind = 'histogram'
+
+    __slots__ = ('buckets',)
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        cells = self.registry.cells()
+        key = (self.name, labels)
+        cell = cells.get(key)
+        if cell is None:
+            # One count per bucket (not cumulative), one for +Inf, then the sum
+            cell = cells[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+
+class GaugeCallback(_Metric):
+    """Gauge whose values are read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    __slots__ = ('callback',)
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Labels, float]]):
+        super().__init__(registry, name, help, labelnames)
+        self.callback = callback
+
+
+def _merge(current: Any, value: Any) -> Any:
+    if current is None:
+        return list(value) if isinstance(value, list) else value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(current, value)]
+    return current + value
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ShardOwner:
+    """Kept in a thread's local storage only, so it is collected when the thread exits"""
+
+    __slots__ = ('__weakref__',)
+
+
+class MetricsRegistry:
+    """Per-thread metric cells of one process, rendered in the Prometheus text format"""
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # Cells recorded before the fork belong to the parent
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._local = threading.local()
+        # Cells of live threads by id(), and the summed cells of exited threads
+        self._shards: Dict[int, Dict[Tuple[str, Labels], Any]] = {}
+        self._retired: Dict[Tuple[str, Labels], Any] = {}
+        self._flusher: Optional[threading.Thread] = None
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, help, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help: str, labelnames: Sequence[str],
+                       callback: Callable[[], Dict[Labels, float]]) -> GaugeCallback:
+        """Register (or replace) a gauge read from callback() at scrape time"""
+        return self._add(GaugeCallback(self, name, help, labelnames, callback))
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def cells(self) -> Dict[Tuple[str, Labels], Any]:
+        """This thread's cells, written only by this thread"""
+        try:
+            return self._local.cells
+        except AttributeError:
+            return self._new_shard()
+
+    def _new_shard(self) -> Dict[Tuple[str, Labels], Any]:
+        cells: Dict[Tuple[str, Labels], Any] = {}
+        owner = _ShardOwner()
+        self._local.cells = cells
+        self._local.owner = owner
+        weakref.finalize(owner, self._retire, cells).atexit = False
+        with self._lock:
+            self._shards[id(cells)] = cells
+            if self.directory and self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='holmes-metrics', daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+        return cells
+
+    def _retire(self, cells: Dict[Tuple[str, Labels], Any]):
+        """Fold the cells of an exited thread into the retired totals"""
+        with self._lock:
+            # Not ours if the registry was reset by a fork since
+            if self._shards.get(id(cells)) is not cells:
+                return
+            del self._shards[id(cells)]
+            for key, value in cells.items():
+                self._retired[key] = _merge(self._retired.get(key), value)
+
+    def shard_count(self) -> int:
+        """Cell shards held: one per live thread that recorded"""
+        with self._lock:
+            return len(self._shards)
+
+    def collect(self) -> Dict[str, Dict[Labels, Any]]:
+        """Totals of this process: cells of all threads (live and exited) summed, gauges read"""
+        with self._lock:
+            # Copied together, so a thread retiring meanwhile is counted exactly once
+            shards = list(self._shards.values())
+            shards.append(dict(self._retired))
+            metrics = list(self._metrics.values())
+        totals: Dict[str, Dict[Labels, Any]] = {}
+        for shard in shards:
+            # list() copies the dict in one step, so concurrent inserts cannot break the iteration
+            for (name, labels), value in list(shard.items()):
+                by_labels = totals.setdefault(name, {})
+                by_labels[labels] = _merge(by_labels.get(labels), value)
+        for metric in metrics:
+            if isinstance(metric, GaugeCallback):
+                try:
+                    totals[metric.name] = {tuple(map(str, labels)): value for labels, value in metric.callback().items()}
+                except Exception:
+                    logger.exception("Metrics callback failed", extra={'metric': metric.name})
+        return totals
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self):
+        """Write this process's totals to HOLMES_METRICS_DIR"""
+        if not self.directory:
+            return
+        snapshot = {name: [[list(labels), value] for labels, value in by_labels.items()]
+                    for name, by_labels in self.collect().items()}
+        path = self._path(os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{path}.tmp", 'w') as snapshot_file:
+                json.dump(snapshot, snapshot_file)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            logger.exception("Could not write metrics snapshot", extra={'path': path})
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _other_processes(self) -> Iterable[Tuple[bool, Dict[str, list]]]:
+        """(whether still live, snapshot) of every other process in the metrics directory"""
+        own = self._path(os.getpid())
+        stale_before = time.time() - 3 * self.flush_interval
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not (name.startswith('metrics-') and name.endswith('.json')) or path == own:
+                continue
+            try:
+                live = os.path.getmtime(path) >= stale_before
+                with open(path) as snapshot_file:
+                    yield live, json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        totals = self.collect()
+        if self.directory:
+            for live, snapshot in self._other_processes():
+                for name, entries in snapshot.items():
+                    metric = self._metrics.get(name)
+                    if metric is None or (metric.kind == 'gauge' and not live):
+                        continue
+                    by_labels = totals.setdefault(name, {})
+                    for labels, value in entries:
+                        labels = tuple(labels)
+                        by_labels[labels] = _merge(by_labels.get(labels), value)
+
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in sorted(totals.get(metric.name, {}).items()):
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float('inf'),), value):
+                        cumulative += count
+                        le = 'le="+Inf"' if bound == float('inf') else f'le="{float(bound)!r}"'
+                        lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, labels, le)} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_format_labels(metric.labelnames, labels)} {_format_value(value[-1])}")
+                    lines.append(f"{metric.name}_count{_format_labels(metric.labelnames, labels)} {cumulative}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def request_kind(body: Dict[str, Any]) -> str:
+    """Kind of a Slack request: block_actions, command, event, ..."""
+    if 'command' in body:
+        return 'command'
+    kind = body.get('type')
+    return 'event' if kind == 'event_callback' else kind or 'unknown'
+
+
+def handler_label(body: Dict[str, Any]) -> str:
+    """Handler a request runs: the action_id, command or event type"""
+    actions = body.get('actions')
+    if actions:
+        return actions[0].get('action_id') or 'unknown'
+    if body.get('command'):
+        return body['command']
+    return body.get('event', {}).get('type') or body.get('type') or 'unknown'
+
+
+def create_metrics_registry() -> MetricsRegistry:
+    """Registry sharing totals through HOLMES_METRICS_DIR if set"""
+    return MetricsRegistry(
+        os.environ.get('HOLMES_METRICS_DIR') or None,
+        flush_interval=float(os.environ.get('METRICS_FLUSH_SECONDS', 5)),
+    )
+
+
+REGISTRY = create_metrics_registry()
+
+ACK_DURATION = REGISTRY.histogram(
+    'holmes_ack_duration_seconds', 'Time from receiving a Slack request to acking it', ['kind'], ACK_BUCKETS)
+HANDLER_DURATION = REGISTRY.histogram(
+    'holmes_handler_duration_seconds', 'Time spent in a handler, by action_id, command or event', ['handler'])
+HANDLER_ERRORS = REGISTRY.counter(
+    'holmes_handler_errors_total', 'Handlers that raised, by action_id, command or event', ['handler'])
+SLACK_API_DURATION = REGISTRY.histogram(
+    'holmes_slack_api_duration_seconds', 'Slack Web API call latency including retries', ['method'])
+SLACK_API_ERRORS = REGISTRY.counter(
+    'holmes_slack_api_errors_total', 'Slack Web API calls that failed', ['method', 'error'])
+ALERT_CLASSIFICATIONS = REGISTRY.counter(
+    'holmes_alert_classifications_total', 'Messages in monitored channels by alert category and outcome',
+    ['category', 'outcome'])
+ADMISSION_SHED = REGISTRY.counter(
+    'holmes_admission_shed_total', 'Jobs shed by admission control, by priority and reason', ['priority', 'reason'])
+
+
+def timed_handler(label: str, func: Callable, **kwargs):
+    """Run a handler, recording its duration and failure under label"""
+    started = time.perf_counter()
+    try:
+        return func(**kwargs)
+    except Exception:
+        HANDLER_ERRORS.inc(label)
+        raise
+    finally:
+        HANDLER_DURATION.observe(time.perf_counter() - started, label)
+
+
+def instrument_app(app):
+    """Record ack latency of every request an App dispatches, whichever adapter delivers it"""
+    dispatch = app.dispatch
+
+    def timed_dispatch(req):
+        started = time.perf_counter()
+        try:
+            return dispatch(req)
+        finally:
+            ACK_DURATION.observe(time.perf_counter() - started, request_kind(req.body))
+
+    app.dispatch = timed_dispatch
+    return app
+
+
+def instrument_async_app(async_app):
+    """AsyncApp variant of instrument_app"""
+    dispatch = async_app.async_dispatch
+
+    async def timed_dispatch(req):
+        started = time.perf_counter()
+        try:
+            return await dispatch(req)
+        finally:
+            ACK_DURATION.observe(time.perf_counter() - started, request_kind(req.body))
+
+    async_app.async_dispatch = timed_dispatch
+    return async_app
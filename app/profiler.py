@@ -0,0 +1,166 @@
+"""
+Sampling Profiler for HOLMES
+
+`/holmes profile <seconds>` profiles the live process it reaches, without a
+redeploy or any instrumentation left running:
+
+- Every `interval` seconds the profiler reads the stack of every other thread
+  (sys._current_frames): work queue workers, Socket Mode receivers, the event
+  loop, the coalescer timer, ... Nothing runs between profiles, and while one
+  runs the cost is one stack walk per thread per sample, on the thread that
+  serves the command (a diagnostic priority worker, see admission).
+- Each stack is attributed to the handler it is running: the action_id, command
+  or event type in the `label` local of the innermost timed_handler (metrics) or
+  async runtime listener frame on it. Stacks outside any handler are attributed
+  to their thread alone.
+- The result is a collapsed-stack file (`thread;handler;module.function;... count`
+  per line, root first) that flamegraph.pl, speedscope and inferno read as is,
+  plus the hottest frames of each handler by samples spent in them.
+
+Only Slack users listed in HOLMES_PROFILE_USERS may profile, one profile at a
+time per process, for at most PROFILE_MAX_SECONDS. Under gunicorn the command
+profiles the worker that received it.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Functions whose `label` local names the handler running below them (metrics.timed_handler,
+# the listeners of async_runtime)
+LABEL_FUNCTIONS = frozenset(('timed_handler', 'listener'))
+
+# Worker numbers are dropped from thread names, so the workers of a pool share one flame
+_THREAD_NUMBER = re.compile(r"[-_]?\d+(_\d+)?$")
+
+
+class Profile:
+    """Samples of one profiling run, as collapsed stacks"""
+
+    def __init__(self, stacks: Counter, samples: int, duration: float, threads: int):
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+        self.threads = threads
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text, one `frame;frame;... count` line per distinct stack"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def by_handler(self) -> Counter:
+        """Thread samples spent in each handler"""
+        handlers = Counter()
+        for stack, count in self.stacks.items():
+            if len(stack) > 1 and stack[1].startswith('handler:'):
+                handlers[stack[1][len('handler:'):]] += count
+        return handlers
+
+    def hot_frames(self, handler: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """Innermost frames of a handler by samples: where its time actually goes"""
+        frames = Counter()
+        for stack, count in self.stacks.items():
+            if len(stack) > 2 and stack[1] == f"handler:{handler}":
+                frames[stack[-1]] += count
+        return frames.most_common(limit)
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads of the process on demand"""
+
+    def __init__(self, users=(), interval: float = 0.01, max_seconds: float = 60.0, max_depth: int = 128):
+        self.users = frozenset(users)
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.max_depth = max_depth
+        self._running = threading.Lock()
+        self._names: Dict[object, str] = {}
+        self._counts = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.users)
+
+    def authorized(self, user_id: Optional[str]) -> bool:
+        return user_id in self.users
+
+    def _frame_name(self, frame) -> str:
+        code = frame.f_code
+        name = self._names.get(code)
+        if name is None:
+            name = self._names[code] = f"{frame.f_globals.get('__name__', '?')}.{code.co_name}"
+        return name
+
+    def _sample(self, stacks: Counter, own: int, thread_names: Dict[int, str]):
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            frames: List[str] = []
+            handler = None
+            while frame is not None and len(frames) < self.max_depth:
+                code_name = frame.f_code.co_name
+                if handler is None and code_name in LABEL_FUNCTIONS:
+                    label = frame.f_locals.get('label')
+                    if isinstance(label, str):
+                        handler = label
+                frames.append(self._frame_name(frame))
+                frame = frame.f_back
+            frames.reverse()
+            root = [thread_names.get(ident, 'thread')]
+            if handler is not None:
+                root.append(f"handler:{handler}")
+            stacks[tuple(root + frames)] += 1
+
+    def profile(self, seconds: float) -> Optional[Profile]:
+        """Sample for `seconds` (capped at max_seconds) on the calling thread; None if a profile is running"""
+        if not self._running.acquire(blocking=False):
+            self._counts['busy'] += 1
+            return None
+        try:
+            seconds = min(max(seconds, self.interval), self.max_seconds)
+            own = threading.get_ident()
+            stacks: Counter = Counter()
+            samples = 0
+            threads = set()
+            started = time.monotonic()
+            deadline = started + seconds
+            while True:
+                thread_names = {thread.ident: _THREAD_NUMBER.sub('', thread.name) or thread.name
+                                for thread in threading.enumerate()}
+                threads.update(thread_names)
+                self._sample(stacks, own, thread_names)
+                samples += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(self.interval, remaining))
+            duration = time.monotonic() - started
+            self._counts['runs'] += 1
+            self._counts['samples'] += samples
+            logger.info("Profiled process", extra={'seconds': round(duration, 1), 'samples': samples,
+                                                    'stacks': len(stacks)})
+            return Profile(stacks, samples, duration, len(threads) - 1)
+        finally:
+            self._running.release()
+
+    def count_refused(self):
+        self._counts['refused'] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+
+def create_profiler() -> SamplingProfiler:
+    """Profiler for the users in HOLMES_PROFILE_USERS (comma separated Slack user IDs; none if unset)"""
+    users = [user.strip() for user in os.environ.get('HOLMES_PROFILE_USERS', '').split(',') if user.strip()]
+    return SamplingProfiler(
+        users,
+        interval=float(os.environ.get('PROFILE_INTERVAL_MS', 10)) / 1000,
+        max_seconds=float(os.environ.get('PROFILE_MAX_SECONDS', 60)),
+    )
@@ -0,0 +1,69 @@
+"""
+Production HTTP Server for HOLMES
+
+Serves the Flask app from create_flask_app() with gunicorn instead of the
+single-process Werkzeug development server. Gunicorn pre-forks worker processes,
+and each worker uses a thread pool (gthread) so that requests waiting on
+Slack's Web API do not block acks for other requests.
+
+Configuration (environment variables):
+    WEB_CONCURRENCY     Number of worker processes (default: CPU count)
+    GUNICORN_THREADS    Threads per worker (default: 8)
+    GUNICORN_KEEPALIVE  Seconds to hold idle keep-alive connections (default: 75,
+                        above the idle timeout of typical load balancers)
+    GUNICORN_TIMEOUT    Seconds before a silent worker is restarted (default: 30)
+    GUNICORN_BACKLOG    Pending connection queue size (default: 2048)
+"""
+
+import logging
+import multiprocessing
+import os
+from typing import Any, Callable, Dict, Optional
+
+from gunicorn.app.base import BaseApplication
+
+logger = logging.getLogger(__name__)
+
+
+def get_server_options(port: int) -> Dict[str, Any]:
+    """Build gunicorn settings from the environment"""
+    return {
+        'bind': f"0.0.0.0:{port}",
+        'workers': int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count())),
+        'worker_class': 'gthread',
+        'threads': int(os.environ.get('GUNICORN_THREADS', 8)),
+        'keepalive': int(os.environ.get('GUNICORN_KEEPALIVE', 75)),
+        'timeout': int(os.environ.get('GUNICORN_TIMEOUT', 30)),
+        'graceful_timeout': int(os.environ.get('GUNICORN_TIMEOUT', 30)),
+        'backlog': int(os.environ.get('GUNICORN_BACKLOG', 2048)),
+        'errorlog': '-',
+    }
+
+
+class HolmesServer(BaseApplication):
+    """Runs an already-built WSGI app under gunicorn; workers inherit it on fork"""
+
+    def __init__(self, application, options: Dict[str, Any]):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def run_production_server(flask_app, port: int, on_worker_start: Optional[Callable[[], Any]] = None):
+    """Serve flask_app with gunicorn until shutdown; on_worker_start() runs in each worker once it is listening"""
+    options = get_server_options(port)
+    if on_worker_start is not None:
+        options['post_worker_init'] = lambda worker: on_worker_start()
+    logger.info("Starting production server", extra={
+        'port': port, 'workers': options['workers'], 'threads': options['threads']
+    })
+    HolmesServer(flask_app, options).run()
+
@@ -0,0 +1,239 @@
+"""
+Investigation Session Store for HOLMES
+
+Records the investigations HOLMES has open, one per Slack thread, so a click is
+answered with the context of earlier steps (category, who started it, the path
+taken) instead of only what the Slack payload carries, and so that context
+survives restarts.
+
+- Sessions live in a SQLite file in WAL mode: the primary key is
+  (channel, thread_ts), with secondary indexes on category and state.
+- Each process keeps a write-through cache of InvestigationSession records
+  (`__slots__`, no per-instance dict). Writes go to SQLite and the cache together;
+  reads are served from the cache.
+- Worker processes share the file. Every lookup checks SQLite's data_version,
+  which changes only when another process commits; the cache is then dropped
+  and sessions are re-read by primary key on demand.
+- Open sessions are loaded into the cache at startup. Sessions not updated for
+  SESSIONS_RETENTION_DAYS are purged.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATES = ('open', 'escalated', 'identified', 'resolved')
+
+# Action IDs kept per session; older steps are dropped from the path
+MAX_PATH = 50
+
+_COLUMNS = 'channel, thread_ts, category, state, node, started_by, started_at, updated_at, path'
+
+
+class InvestigationSession:
+    """One investigation, keyed by the Slack thread it runs in"""
+
+    __slots__ = ('channel', 'thread_ts', 'category', 'state', 'node', 'started_by', 'started_at',
+                 'updated_at', 'path')
+
+    def __init__(self, channel: str, thread_ts: str, category: Optional[str] = None, state: str = 'open',
+                 node: Optional[str] = None, started_by: Optional[str] = None, started_at: float = 0.0,
+                 updated_at: float = 0.0, path: Tuple[str, ...] = ()):
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.category = category
+        self.state = state
+        self.node = node
+        self.started_by = started_by
+        self.started_at = started_at
+        self.updated_at = updated_at
+        self.path = path
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "InvestigationSession":
+        channel, thread_ts, category, state, node, started_by, started_at, updated_at, path = row
+        return cls(channel, thread_ts, category, state, node, started_by, started_at, updated_at,
+                   tuple(path.split()) if path else ())
+
+    def to_row(self) -> tuple:
+        return (self.channel, self.thread_ts, self.category, self.state, self.node, self.started_by,
+                self.started_at, self.updated_at, ' '.join(self.path))
+
+
+class SessionStore:
+    """SQLite-backed investigation sessions with a per-process write-through cache"""
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, max_cached: int = 10000, retention: float = 30 * 86400):
+        self.path = path
+        self.max_cached = max_cached
+        self.retention = retention
+        self._cache: "OrderedDict[Tuple[str, str], InvestigationSession]" = OrderedDict()
+        # One connection per process, shared by its threads: data_version then only
+        # changes for commits made by other processes
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._writes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'invalidations': 0}
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS investigations ("
+                "channel TEXT NOT NULL, thread_ts TEXT NOT NULL, category TEXT, state TEXT NOT NULL, "
+                "node TEXT, started_by TEXT, started_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "path TEXT NOT NULL DEFAULT '', PRIMARY KEY (channel, thread_ts))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS investigations_category ON investigations (category)")
+            connection.execute("CREATE INDEX IF NOT EXISTS investigations_state ON investigations (state)")
+            self._warm(connection)
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection is never shared with a forked process
+        pid = os.getpid()
+        if self._pid != pid:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection = connection
+            self._pid = pid
+            self._data_version = None
+            self._cache.clear()
+        return self._connection
+
+    def _warm(self, connection: sqlite3.Connection):
+        rows = connection.execute(
+            f"SELECT {_COLUMNS} FROM investigations WHERE state != 'resolved' ORDER BY updated_at DESC LIMIT ?",
+            (self.max_cached,)
+        ).fetchall()
+        for row in reversed(rows):
+            session = InvestigationSession.from_row(row)
+            self._cache[(session.channel, session.thread_ts)] = session
+        logger.info("Investigation sessions loaded", extra={'path': self.path, 'open': len(rows)})
+
+    def _check_data_version(self, connection: sqlite3.Connection):
+        version = connection.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            if self._data_version is not None and self._cache:
+                self._cache.clear()
+                self._counters['invalidations'] += 1
+            self._data_version = version
+
+    def _remember(self, session: InvestigationSession):
+        key = (session.channel, session.thread_ts)
+        self._cache[key] = session
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _get(self, connection: sqlite3.Connection, channel: str, thread_ts: str) -> Optional[InvestigationSession]:
+        self._check_data_version(connection)
+        session = self._cache.get((channel, thread_ts))
+        if session is not None:
+            self._counters['hits'] += 1
+            self._cache.move_to_end((channel, thread_ts))
+            return session
+        self._counters['misses'] += 1
+        row = connection.execute(
+            f"SELECT {_COLUMNS} FROM investigations WHERE channel = ? AND thread_ts = ?", (channel, thread_ts)
+        ).fetchone()
+        if row is None:
+            return None
+        session = InvestigationSession.from_row(row)
+        self._remember(session)
+        return session
+
+    def _put(self, connection: sqlite3.Connection, session: InvestigationSession):
+        connection.execute(
+            f"INSERT OR REPLACE INTO investigations ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            session.to_row()
+        )
+        # Our own commit does not change data_version on this connection
+        self._remember(session)
+        self._counters['writes'] += 1
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            connection.execute("DELETE FROM investigations WHERE updated_at < ?", (time.time() - self.retention,))
+
+    def get(self, channel: str, thread_ts: str) -> Optional[InvestigationSession]:
+        """Session of a thread, None if no investigation ran in it"""
+        with self._lock:
+            return self._get(self._connect(), channel, thread_ts)
+
+    def open(self, channel: str, thread_ts: str, category: Optional[str], started_by: Optional[str]) -> InvestigationSession:
+        """Start the session of a thread, or return the one already running there"""
+        with self._lock:
+            connection = self._connect()
+            session = self._get(connection, channel, thread_ts)
+            if session is not None and session.state != 'resolved':
+                return session
+            now = time.time()
+            session = InvestigationSession(channel, thread_ts, category, 'open', None, started_by, now, now)
+            self._put(connection, session)
+            return session
+
+    def advance(self, channel: str, thread_ts: str, action_id: str, node: Optional[str], user_id: Optional[str],
+                category: Optional[str] = None, state: Optional[str] = None) -> InvestigationSession:
+        """Record a step of the investigation in a thread, starting one if needed"""
+        if state is not None and state not in STATES:
+            raise ValueError(f"Unknown investigation state {state!r}")
+        with self._lock:
+            connection = self._connect()
+            current = self._get(connection, channel, thread_ts)
+            now = time.time()
+            if current is None or current.state == 'resolved':
+                current = InvestigationSession(channel, thread_ts, category, 'open', None, user_id, now, now)
+            # Records are replaced, never mutated, so readers holding one see a consistent state
+            session = InvestigationSession(
+                channel, thread_ts,
+                category or current.category,
+                state or current.state,
+                node,
+                current.started_by or user_id,
+                current.started_at,
+                now,
+                (current.path + (action_id,))[-MAX_PATH:],
+            )
+            self._put(connection, session)
+            return session
+
+    def find(self, state: Optional[str] = None, category: Optional[str] = None, limit: int = 100) -> List[InvestigationSession]:
+        """Most recently updated sessions, filtered by state and category"""
+        clauses, args = [], []
+        if state is not None:
+            clauses.append("state = ?")
+            args.append(state)
+        if category is not None:
+            clauses.append("category = ?")
+            args.append(category)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {_COLUMNS} FROM investigations {where}ORDER BY updated_at DESC LIMIT ?", (*args, limit)
+            ).fetchall()
+        return [InvestigationSession.from_row(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters and sessions per state"""
+        with self._lock:
+            by_state = dict(self._connect().execute(
+                "SELECT state, COUNT(*) FROM investigations GROUP BY state"
+            ).fetchall())
+            return {**self._counters, 'cached': len(self._cache), 'states': by_state}
+
+
+def create_session_store() -> SessionStore:
+    """Store at SESSIONS_SQLITE_PATH, cache and retention from SESSIONS_* settings"""
+    return SessionStore(
+        os.environ.get('SESSIONS_SQLITE_PATH', '/tmp/holmes-sessions.sqlite3'),
+        max_cached=int(os.environ.get('SESSIONS_CACHE_SIZE', 10000)),
+        retention=float(os.environ.get('SESSIONS_RETENTION_DAYS', 30)) * 86400,
+    )
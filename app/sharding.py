@@ -0,0 +1,275 @@
+"""
+Channel Sharding for HOLMES
+
+With HOLMES_SHARDING set, HOLMES replicas that each receive every event split the
+monitored channels between them, so each message is classified and answered by
+one replica and message classification scales with the number of replicas:
+
+- Membership: every replica heartbeats its member ID (SHARDING_MEMBER_ID, the
+  hostname by default) into a shared membership store every
+  SHARDING_HEARTBEAT_SECONDS. A member whose heartbeat is older than
+  SHARDING_MEMBER_TTL_SECONDS is gone, and one that shuts down cleanly leaves at once.
+- Ownership: channels are mapped onto a consistent hash ring of the live members
+  (SHARDING_VNODES points per member). When a replica joins or leaves, only the
+  channels of the ring segments it takes or gives up change owner.
+- Filtering: a Bolt middleware acks and drops message events for channels this
+  replica does not own, before dedup, queueing or classification. Clicks and
+  commands are never dropped: Slack delivers each one to a single replica, and a
+  user is waiting for its answer.
+
+Stores, selected by HOLMES_SHARDING:
+- sqlite: a SQLite file (SHARDING_SQLITE_PATH) shared by the replicas, e.g. on a
+  volume mounted into every container on a host
+- memory: per process, for a single replica and for benchmarks
+- module:factory: any other store, built by calling factory(); it needs the
+  heartbeat(member_id, ttl), members() and leave(member_id) methods
+
+A replica that dies without leaving keeps its channels until its heartbeat
+expires, so their messages are dropped for up to the TTL. Until a process has
+read the membership once, it owns every channel rather than drop messages.
+"""
+
+import bisect
+import hashlib
+import importlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from slack_bolt.response import BoltResponse
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring of members, each placed at `vnodes` points"""
+
+    __slots__ = ('members', '_points', '_owners')
+
+    def __init__(self, members: Iterable[str], vnodes: int = 64):
+        self.members = tuple(sorted(set(members)))
+        points = sorted((_hash(f"{member}#{index}"), member) for member in self.members for index in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Member owning key: the first point clockwise from its hash"""
+        if not self._points:
+            return None
+        return self._owners[bisect.bisect(self._points, _hash(key)) % len(self._points)]
+
+
+class MemoryMembershipStore:
+    """Membership of the replicas sharing this store object"""
+
+    def __init__(self):
+        self._expiry: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def heartbeat(self, member_id: str, ttl: float):
+        with self._lock:
+            self._expiry[member_id] = time.time() + ttl
+
+    def members(self) -> List[str]:
+        now = time.time()
+        with self._lock:
+            return sorted(member for member, expires_at in self._expiry.items() if expires_at > now)
+
+    def leave(self, member_id: str):
+        with self._lock:
+            self._expiry.pop(member_id, None)
+
+
+class SQLiteMembershipStore:
+    """Membership in a SQLite file shared by the replicas"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS shard_members (member_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections are never shared across threads or forked processes
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    def heartbeat(self, member_id: str, ttl: float):
+        now = time.time()
+        connection = self._connect()
+        connection.execute(
+            "INSERT INTO shard_members (member_id, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(member_id) DO UPDATE SET expires_at = excluded.expires_at",
+            (member_id, now + ttl),
+        )
+        connection.execute("DELETE FROM shard_members WHERE expires_at <= ?", (now,))
+
+    def members(self) -> List[str]:
+        rows = self._connect().execute(
+            "SELECT member_id FROM shard_members WHERE expires_at > ? ORDER BY member_id", (time.time(),))
+        return [member_id for member_id, in rows]
+
+    def leave(self, member_id: str):
+        self._connect().execute("DELETE FROM shard_members WHERE member_id = ?", (member_id,))
+
+
+class ChannelSharder:
+    """Which channels this replica owns, kept current by a heartbeat thread"""
+
+    def __init__(self, store, member_id: str, heartbeat_interval: float = 5.0, ttl: float = 15.0, vnodes: int = 64):
+        self.store = store
+        self.member_id = member_id
+        self.heartbeat_interval = heartbeat_interval
+        self.ttl = ttl
+        self.vnodes = vnodes
+        # Swapped by assignment, so owns() never takes a lock
+        self._ring: Optional[HashRing] = None
+        self._pid: Optional[int] = None
+        # The replica leaves when this process exits, not when a forked worker is replaced
+        self._main_pid = os.getpid()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._rebalances = 0
+        self._last_heartbeat = 0.0
+
+    def start(self):
+        """Join and start heartbeating in this process, once per process"""
+        if self._pid == os.getpid():
+            return self
+        self._refresh()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='holmes-sharding', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self._refresh()
+            except Exception:
+                logger.exception("Shard membership heartbeat failed", extra={'member_id': self.member_id})
+
+    def _refresh(self):
+        self.store.heartbeat(self.member_id, self.ttl)
+        self._last_heartbeat = time.time()
+        members = self.store.members()
+        # A store that lags behind its own write still counts this replica as a member
+        if self.member_id not in members:
+            members.append(self.member_id)
+        ring = self._ring
+        if ring is not None and ring.members == tuple(sorted(members)):
+            return
+        self._ring = HashRing(members, self.vnodes)
+        if ring is not None:
+            self._rebalances += 1
+        logger.info("Shard membership changed", extra={
+            'member_id': self.member_id, 'members': list(self._ring.members),
+            'previous': list(ring.members) if ring is not None else None
+        })
+
+    def owns(self, channel: Optional[str]) -> bool:
+        """Whether this replica handles channel; every channel until the membership is known"""
+        ring = self._ring
+        if ring is None or not channel:
+            return True
+        return ring.owner(channel) == self.member_id
+
+    def count_dropped(self):
+        with self._lock:
+            self._dropped += 1
+
+    def leave(self):
+        """Stop heartbeating and hand this replica's channels to the others at once"""
+        self._stop.set()
+        # A heartbeat still in flight would add this replica back after it left, until its TTL
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(self.ttl)
+        if os.getpid() != self._main_pid:
+            return
+        try:
+            self.store.leave(self.member_id)
+        except Exception:
+            logger.exception("Could not leave shard membership", extra={'member_id': self.member_id})
+
+    def stats(self, channels: Iterable[str] = ()) -> Dict[str, object]:
+        """Members, drops and rebalances; with channels, how many of them this replica owns"""
+        ring = self._ring
+        channels = list(channels)
+        return {
+            'member_id': self.member_id,
+            'members': list(ring.members) if ring is not None else [],
+            'owned_channels': sum(1 for channel in channels if self.owns(channel)),
+            'channels': len(channels),
+            'dropped': self._dropped,
+            'rebalances': self._rebalances,
+            'heartbeat_age_seconds': round(time.time() - self._last_heartbeat, 1) if self._last_heartbeat else None,
+        }
+
+
+def build_shard_filter_middleware(sharder: ChannelSharder):
+    """Global Bolt middleware that acks and drops messages from channels another replica owns"""
+
+    def shard_filter_middleware(body, next):
+        event = body.get('event')
+        if event is not None and event.get('type') == 'message' and not sharder.owns(event.get('channel')):
+            sharder.count_dropped()
+            return BoltResponse(status=200, body="")
+        next()
+
+    return shard_filter_middleware
+
+
+def build_async_shard_filter_middleware(sharder: ChannelSharder):
+    """AsyncApp variant of build_shard_filter_middleware"""
+
+    async def shard_filter_middleware(body, next):
+        event = body.get('event')
+        if event is not None and event.get('type') == 'message' and not sharder.owns(event.get('channel')):
+            sharder.count_dropped()
+            return BoltResponse(status=200, body="")
+        await next()
+
+    return shard_filter_middleware
+
+
+def create_membership_store(backend: str):
+    """Store named by HOLMES_SHARDING: sqlite, memory or module:factory"""
+    if backend == 'sqlite':
+        return SQLiteMembershipStore(os.environ.get('SHARDING_SQLITE_PATH', '/tmp/holmes-shards.sqlite3'))
+    if backend == 'memory':
+        return MemoryMembershipStore()
+    module_name, _, factory = backend.partition(':')
+    if not factory:
+        raise ValueError(f"Unknown HOLMES_SHARDING backend {backend!r}")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+def create_sharder() -> Optional[ChannelSharder]:
+    """Sharder selected by HOLMES_SHARDING; None (every replica handles every channel) if unset"""
+    backend = os.environ.get('HOLMES_SHARDING')
+    if not backend:
+        return None
+    return ChannelSharder(
+        create_membership_store(backend),
+        member_id=os.environ.get('SHARDING_MEMBER_ID') or socket.gethostname(),
+        heartbeat_interval=float(os.environ.get('SHARDING_HEARTBEAT_SECONDS', 5)),
+        ttl=float(os.environ.get('SHARDING_MEMBER_TTL_SECONDS', 15)),
+        vnodes=int(os.environ.get('SHARDING_VNODES', 64)),
+    )
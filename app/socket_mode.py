@@ -0,0 +1,221 @@
+"""
+Multi-connection Socket Mode for HOLMES
+
+Bolt's SocketModeHandler holds a single WebSocket connection and acks each
+envelope only after the app has dispatched it. SocketModeRuntime instead:
+
+- Connections: opens several concurrent connections for the app token (Slack
+  allows up to 10). Slack spreads envelopes over all open connections, so one
+  slow or reconnecting connection does not stall delivery.
+- Ack first: each envelope is acked on the connection it arrived on as soon as it
+  is received, then dispatched to the Bolt app on a shared worker pool. Acks never
+  wait behind middleware or listeners, so Slack does not redeliver them. Listener
+  ack() payloads are not sent back, which HOLMES does not use (its listeners ack
+  empty and do their work on the work queue).
+- Reconnects: a connection that Slack asks to refresh (a "disconnect" message)
+  switches to its replacement as soon as that is open, and each socket is read by
+  its own thread. The builtin client reads every socket on one thread and closes
+  the old one first, so a refresh stalls envelopes and acks until the old socket's
+  3 s receive timeout. A dropped connection reconnects on its own while the others
+  keep receiving.
+
+A connection that cannot be opened at startup is an error: there is no fallback
+to HTTP, since Socket Mode deployments usually cannot receive Slack's requests.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from slack_bolt import App
+from slack_bolt.adapter.socket_mode.internals import build_headers
+from slack_bolt.request import BoltRequest
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackClientNotConnectedError
+from slack_sdk.socket_mode.builtin import SocketModeClient
+from slack_sdk.socket_mode.builtin.connection import Connection, ConnectionState
+from slack_sdk.socket_mode.request import SocketModeRequest
+from slack_sdk.socket_mode.response import SocketModeResponse
+
+logger = logging.getLogger(__name__)
+
+# Slack's limit of concurrent Socket Mode connections per app
+MAX_CONNECTIONS = 10
+
+
+class _SwappingSocketModeClient(SocketModeClient):
+    """SocketModeClient that switches to a new connection before closing the old one"""
+
+    def _run_current_session(self):
+        # Replaced by a reader thread per session, started by connect()
+        pass
+
+    def connect(self) -> None:
+        old_session, old_state = self.current_session, self.current_session_state
+        if self.wss_uri is None:
+            self.wss_uri = self.issue_new_wss_url()
+        session = Connection(
+            url=self.wss_uri,
+            logger=self.logger,
+            ping_interval=self.ping_interval,
+            trace_enabled=self.trace_enabled,
+            all_message_trace_enabled=self.all_message_trace_enabled,
+            ping_pong_trace_enabled=self.ping_pong_trace_enabled,
+            receive_buffer_size=self.receive_buffer_size,
+            proxy=self.proxy,
+            proxy_headers=self.proxy_headers,
+            on_message_listener=self._on_message,
+            on_error_listener=self._on_error,
+            on_close_listener=self._on_close,
+            ssl_context=self.web_client.ssl,
+        )
+        session.connect()
+        if not session.is_active():
+            # Connection.connect() reports failures to on_error only; the current session stays as it was
+            raise SlackClientNotConnectedError("Socket Mode connection could not be opened")
+
+        # Sends move to the new connection and it is read before the old one stops
+        state = ConnectionState()
+        threading.Thread(target=session.run_until_completion, args=(state,), name='holmes-socket-reader',
+                         daemon=True).start()
+        self.current_session = session
+        self.current_session_state = state
+        self.auto_reconnect_enabled = self.default_auto_reconnect_enabled
+        if old_state is not None:
+            old_state.terminated = True
+        if old_session is not None:
+            threading.Thread(target=old_session.close, name='holmes-socket-close', daemon=True).start()
+
+        if not self.current_app_monitor_started:
+            self.current_app_monitor_started = True
+            self.current_app_monitor.start()
+        self.logger.info("Socket Mode session established", extra={'session_id': self.session_id()})
+
+
+class SocketModeRuntime:
+    """Several Socket Mode connections feeding one Bolt app through a worker pool"""
+
+    def __init__(self, app: App, app_token: str, connections: int = 4, workers: int = 16,
+                 web_client: Optional[WebClient] = None, ping_interval: float = 10):
+        self.app = app
+        self.app_token = app_token
+        self.connections = min(max(1, connections), MAX_CONNECTIONS)
+        self.workers = max(1, workers)
+        self.web_client = web_client or app.client
+        self.ping_interval = ping_interval
+        self._clients: List[SocketModeClient] = []
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._counters = {'received': 0, 'acked': 0, 'ack_failed': 0, 'dispatched': 0, 'failed': 0,
+                          'unhandled': 0, 'closed': 0}
+        self._in_flight = 0
+        self._max_ack_ms = 0.0
+
+    def start(self):
+        """Open every connection; raises if one cannot be opened"""
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='holmes-socket')
+        try:
+            for _ in range(self.connections):
+                self._clients.append(self._connect())
+        except Exception:
+            self.close()
+            raise
+        logger.info("Socket Mode connected", extra={'connections': len(self._clients), 'workers': self.workers})
+        return self
+
+    def _connect(self) -> SocketModeClient:
+        client = _SwappingSocketModeClient(
+            app_token=self.app_token,
+            logger=logger,
+            web_client=self.web_client,
+            proxy=self.web_client.proxy,
+            auto_reconnect_enabled=True,
+            ping_interval=self.ping_interval,
+            # The connection's own thread only acks and hands off, so one is enough
+            concurrency=1,
+        )
+        client.socket_mode_request_listeners.append(self._on_request)
+        client.on_close_listeners.append(self._on_close)
+        try:
+            client.connect()
+        except Exception:
+            # Stops the client's runner threads, which would keep the process alive
+            client.close()
+            raise
+        return client
+
+    def _on_request(self, client: SocketModeClient, request: SocketModeRequest):
+        received = time.monotonic()
+        with self._lock:
+            self._counters['received'] += 1
+            self._in_flight += 1
+        try:
+            client.send_socket_mode_response(SocketModeResponse(envelope_id=request.envelope_id))
+        except Exception:
+            # Slack redelivers an unacked envelope and the dedup middleware drops whichever copy comes second
+            self._count('ack_failed')
+            logger.warning("Socket Mode ack failed", exc_info=True, extra={'envelope_type': request.type})
+        else:
+            ack_ms = (time.monotonic() - received) * 1000
+            with self._lock:
+                self._counters['acked'] += 1
+                self._max_ack_ms = max(self._max_ack_ms, ack_ms)
+        try:
+            self._pool.submit(self._dispatch, request)
+        except RuntimeError:
+            # Pool shut down by close()
+            with self._lock:
+                self._in_flight -= 1
+            logger.warning("Socket Mode envelope dropped during shutdown", extra={'envelope_type': request.type})
+
+    def _dispatch(self, request: SocketModeRequest):
+        try:
+            response = self.app.dispatch(BoltRequest(mode="socket_mode", body=request.payload,
+                                                     headers=build_headers(request)))
+            self._count('dispatched' if response.status == 200 else 'unhandled')
+        except Exception:
+            self._count('failed')
+            logger.exception("Socket Mode envelope failed", extra={'envelope_type': request.type})
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _on_close(self, code: int, reason: Optional[str] = None):
+        self._count('closed')
+        logger.info("Socket Mode connection closed", extra={'code': code, 'reason': reason})
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def close(self):
+        """Close every connection, then finish envelopes that were already acked"""
+        for client in self._clients:
+            try:
+                client.close()
+            except Exception:
+                logger.warning("Socket Mode connection did not close cleanly", exc_info=True)
+        self._clients = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of connection and envelope counters"""
+        connected = sum(1 for client in self._clients if client.is_connected())
+        with self._lock:
+            return {**self._counters, 'connections': self.connections, 'connected': connected,
+                    'in_flight': self._in_flight, 'max_ack_ms': round(self._max_ack_ms, 2)}
+
+
+def create_socket_mode_runtime(app: App) -> SocketModeRuntime:
+    """Build the runtime from SLACK_APP_TOKEN and the SOCKET_MODE_* settings"""
+    return SocketModeRuntime(
+        app,
+        app_token=os.environ["SLACK_APP_TOKEN"],
+        connections=int(os.environ.get('SOCKET_MODE_CONNECTIONS', 4)),
+        workers=int(os.environ.get('SOCKET_MODE_WORKERS', 16)),
+        ping_interval=float(os.environ.get('SOCKET_MODE_PING_SECONDS', 10)),
+    )
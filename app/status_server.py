@@ -0,0 +1,53 @@
+"""
+Status Endpoints for HOLMES
+
+In Socket Mode, Slack's traffic arrives over WebSockets, so the process only
+needs HTTP for its own /health, /ready and /metrics. They are served by the
+standard library's threaded HTTP server rather than Flask and gunicorn, which
+Socket Mode then never imports, and from the process that holds the connections
+(a forked worker would report its own empty counters).
+"""
+
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Route: () -> (HTTP status, content type, body)
+Route = Callable[[], Tuple[int, str, bytes]]
+
+
+def _handler_for(routes: Dict[str, Route]):
+
+    class StatusHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            route = routes.get(self.path.split('?', 1)[0])
+            if route is None:
+                status, content_type, body = 404, 'text/plain', b'Not Found'
+            else:
+                try:
+                    status, content_type, body = route()
+                except Exception:
+                    logger.exception("Status endpoint failed", extra={'path': self.path})
+                    status, content_type, body = 500, 'text/plain', b'Internal Server Error'
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            # Probes poll every few seconds; request lines are not worth a log record each
+            pass
+
+    return StatusHandler
+
+
+def create_status_server(routes: Dict[str, Route], port: int) -> ThreadingHTTPServer:
+    """Bind the status server; call serve_forever() on the result to serve"""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _handler_for(routes))
+    server.daemon_threads = True
+    logger.info("Status server listening", extra={'port': port, 'paths': sorted(routes)})
+    return server
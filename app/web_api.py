@@ -0,0 +1,433 @@
+"""
+Slack Web API Dispatcher for HOLMES
+
+Every Web API call made by a handler (client.chat_postMessage, chat_update, ...)
+goes through one dispatcher per process instead of Bolt's default per-request
+WebClient:
+
+- Pooling: the sync client keeps persistent keep-alive HTTPS connections per
+  thread instead of opening a new TLS connection for every call. This replaces a
+  private WebClient method, checked at startup against the pinned slack-sdk.
+- Rate limiting: calls are paced with token buckets sized to Slack's rate limit
+  tiers, per method (workspace-wide) and per channel for chat.postMessage. A call
+  that would have to wait longer than `max_wait` is dropped instead of piling up.
+- Retries: a 429 response pauses the method's bucket for Retry-After seconds, so
+  other callers queue behind it, and the call is retried after Retry-After plus
+  random jitter. Connection errors and 500/503 responses are retried with
+  exponential backoff and jitter.
+- Counters: stats() reports how many calls were made, queued behind a bucket,
+  throttled by Slack (429) and dropped. Latency and errors per method are also
+  recorded as metrics (see metrics).
+
+The dispatching client is installed into each request's context by
+build_client_middleware() (or build_async_client_middleware() for AsyncApp), so
+handlers keep calling `client.<method>(...)` unchanged. The AsyncWebClient
+variant lives in async_web_api and is only imported by the async runtime, so the
+sync runtimes do not load aiohttp.
+"""
+
+import http.client
+import inspect
+import io
+import logging
+import os
+import random
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+from slack_sdk.errors import SlackApiError, SlackClientError
+from slack_sdk.http_retry.builtin_handlers import (
+    ConnectionErrorRetryHandler,
+    RateLimitErrorRetryHandler,
+    ServerErrorRetryHandler,
+)
+from slack_sdk.http_retry.builtin_interval_calculators import BackoffRetryIntervalCalculator
+from slack_sdk.http_retry.jitter import RandomJitter
+from slack_sdk.version import __version__ as SLACK_SDK_VERSION
+from slack_sdk.web import WebClient
+
+from metrics import SLACK_API_DURATION, SLACK_API_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute allowed by each Slack rate limit tier
+TIER_LIMITS = {1: 1, 2: 20, 3: 50, 4: 100}
+
+# Tier of each Web API method HOLMES calls; unlisted methods are treated as tier 3
+METHOD_TIERS = {
+    'chat.update': 3,
+    'chat.delete': 3,
+    'chat.postEphemeral': 4,
+    'conversations.open': 3,
+    'conversations.info': 3,
+    'conversations.history': 3,
+    'reactions.add': 3,
+    'users.info': 4,
+    'views.open': 4,
+    'files.upload': 2,
+}
+
+# chat.postMessage has its own limit: about one message per second per channel with
+# short bursts, and several hundred messages per minute across the workspace
+POST_MESSAGE_PER_MINUTE = 300
+POST_MESSAGE_CHANNEL_RATE = 1.0
+POST_MESSAGE_CHANNEL_BURST = 3
+
+# Methods that are never paced (auth.test runs once at startup)
+UNLIMITED_METHODS = frozenset({'auth.test'})
+
+
+class CallDropped(SlackClientError):
+    """Raised instead of sending a call that would exceed the queueing budget"""
+
+
+class TokenBucket:
+    """Token bucket that hands out future tokens, so callers wait in arrival order"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'paused_until')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until the next token is available (refills the bucket first)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(0.0, self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def take(self):
+        # Tokens go negative while callers are waiting for future ones
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float):
+        """Hand out no tokens for `seconds`, as after a 429 response"""
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = min(self.tokens, 0)
+
+
+class RateLimiter:
+    """Per-method and per-channel token buckets matching Slack's rate limit tiers"""
+
+    def __init__(self, max_wait: float = 10.0, max_channels: int = 10000):
+        self.max_wait = max_wait
+        self.max_channels = max_channels
+        self._methods: Dict[str, TokenBucket] = {}
+        self._channels: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _method_bucket(method: str) -> TokenBucket:
+        per_minute = POST_MESSAGE_PER_MINUTE if method == 'chat.postMessage' else TIER_LIMITS[METHOD_TIERS.get(method, 3)]
+        # A tier allows its full per-minute budget as a burst
+        return TokenBucket(per_minute / 60, per_minute)
+
+    def _buckets(self, method: str, channel: Optional[str]):
+        bucket = self._methods.get(method)
+        if bucket is None:
+            bucket = self._methods[method] = self._method_bucket(method)
+        buckets = [bucket]
+        if channel and method == 'chat.postMessage':
+            key = (method, channel)
+            channel_bucket = self._channels.get(key)
+            if channel_bucket is None:
+                channel_bucket = self._channels[key] = TokenBucket(POST_MESSAGE_CHANNEL_RATE, POST_MESSAGE_CHANNEL_BURST)
+                # Forgetting the least recently used channel only resets it to a full bucket
+                if len(self._channels) > self.max_channels:
+                    self._channels.popitem(last=False)
+            else:
+                self._channels.move_to_end(key)
+            buckets.append(channel_bucket)
+        return buckets
+
+    def reserve(self, method: str, channel: Optional[str] = None) -> Optional[float]:
+        """Reserve a slot for one call; return seconds to wait, or None if over max_wait"""
+        if method in UNLIMITED_METHODS:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets(method, channel)
+            wait = max(bucket.wait_time(now) for bucket in buckets)
+            if wait > self.max_wait:
+                return None
+            for bucket in buckets:
+                bucket.take()
+            return wait
+
+    def pause(self, method: str, seconds: float):
+        """Stop handing out slots for a method after Slack returned Retry-After"""
+        now = time.monotonic()
+        with self._lock:
+            self._buckets(method, None)[0].pause(now, seconds)
+
+    def channel_count(self) -> int:
+        return len(self._channels)
+
+
+def _method_from_url(url: str) -> str:
+    return url.rstrip('/').rsplit('/', 1)[-1]
+
+
+def _retry_after(response) -> float:
+    for name, values in response.headers.items():
+        if name.lower() == 'retry-after':
+            value = values[0] if isinstance(values, list) else values
+            return float(value)
+    return 1.0
+
+
+class RetryAfterHandler(RateLimitErrorRetryHandler):
+    """Retries 429 responses after Retry-After plus jitter, pausing the method's bucket meanwhile"""
+
+    def __init__(self, dispatcher: "WebApiDispatcher", max_retry_count: int = 3, jitter: float = 1.0):
+        super().__init__(max_retry_count=max_retry_count)
+        self.dispatcher = dispatcher
+        self.jitter = jitter
+
+    def _delay(self, request, response) -> float:
+        retry_after = _retry_after(response)
+        method = _method_from_url(request.url)
+        self.dispatcher.limiter.pause(method, retry_after)
+        self.dispatcher.count('throttled')
+        logger.warning("Slack rate limited a Web API call", extra={'method': method, 'retry_after': retry_after})
+        return retry_after + random.uniform(0, self.jitter)
+
+    def prepare_for_next_attempt(self, *, state, request, response=None, error=None):
+        if response is None:
+            raise error
+        state.next_attempt_requested = True
+        time.sleep(self._delay(request, response))
+        state.increment_current_attempt()
+
+
+def _error_label(error: Exception) -> str:
+    if isinstance(error, SlackApiError):
+        return str(error.response.get('error') or error.response.status_code)
+    return type(error).__name__
+
+
+def _call_channel(kwargs: Dict[str, Any]) -> Optional[str]:
+    """Channel a Web API call targets, wherever the SDK put its arguments"""
+    for key in ('json', 'params', 'data'):
+        values = kwargs.get(key)
+        if isinstance(values, dict) and values.get('channel'):
+            return values['channel']
+    return None
+
+
+# WebClient has no public hook for its HTTP transport, so DispatchingWebClient overrides this private
+# method. slack-sdk is pinned to the minor version it was written against (pyproject.toml), and the
+# method's signature is checked when a client is created, so an SDK change fails startup instead of
+# every Web API call
+SDK_TRANSPORT_METHOD = '_perform_urllib_http_request_internal'
+SDK_TRANSPORT_PARAMETERS = ('self', 'url', 'req')
+
+
+def check_sdk_transport(client_class: type = WebClient):
+    """Raise if client_class no longer has the private transport method DispatchingWebClient overrides"""
+    method = getattr(client_class, SDK_TRANSPORT_METHOD, None)
+    parameters = tuple(inspect.signature(method).parameters) if callable(method) else None
+    if parameters != SDK_TRANSPORT_PARAMETERS:
+        raise RuntimeError(
+            f"slack_sdk {SLACK_SDK_VERSION} has WebClient.{SDK_TRANSPORT_METHOD}{parameters or ' missing'}, "
+            f"expected {SDK_TRANSPORT_PARAMETERS}: update DispatchingWebClient or pin slack-sdk"
+        )
+
+
+class DispatchingWebClient(WebClient):
+    """WebClient that paces calls through the dispatcher and reuses keep-alive connections"""
+
+    def __init__(self, dispatcher: "WebApiDispatcher", **kwargs):
+        check_sdk_transport()
+        super().__init__(**kwargs)
+        self.dispatcher = dispatcher
+        self._local = threading.local()
+
+    def api_call(self, api_method: str, **kwargs):
+        try:
+            delay = self.dispatcher.admit(api_method, _call_channel(kwargs))
+        except CallDropped:
+            SLACK_API_ERRORS.inc(api_method, 'dropped')
+            raise
+        if delay:
+            time.sleep(delay)
+        started = time.perf_counter()
+        try:
+            return super().api_call(api_method, **kwargs)
+        except SlackApiError as e:
+            if e.response.status_code == 429:
+                # Still rate limited after every retry
+                self.dispatcher.count('dropped')
+            SLACK_API_ERRORS.inc(api_method, _error_label(e))
+            raise
+        except Exception as e:
+            SLACK_API_ERRORS.inc(api_method, _error_label(e))
+            raise
+        finally:
+            SLACK_API_DURATION.observe(time.perf_counter() - started, api_method)
+
+    def _connection(self, netloc: str) -> Tuple[http.client.HTTPSConnection, bool]:
+        """This thread's connection to netloc, and whether it was used before"""
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            # Connections inherited across fork share sockets with the parent
+            self._local.connections = {}
+            self._local.pid = pid
+        connection = self._local.connections.get(netloc)
+        if connection is not None:
+            return connection, True
+        context = self.ssl or ssl.create_default_context()
+        connection = http.client.HTTPSConnection(netloc, timeout=self.timeout, context=context)
+        self._local.connections[netloc] = connection
+        return connection, False
+
+    def _discard(self, netloc: str):
+        connection = self._local.connections.pop(netloc, None)
+        if connection is not None:
+            connection.close()
+
+    def _perform_urllib_http_request_internal(self, url: str, req) -> Dict[str, Any]:
+        parsed = urlsplit(url)
+        if self.proxy is not None or parsed.scheme != 'https':
+            return super()._perform_urllib_http_request_internal(url, req)
+
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else '')
+        while True:
+            connection, reused = self._connection(parsed.netloc)
+            # Whether the failure shows Slack closed an idle keep-alive connection before our request reached it
+            stale = False
+            try:
+                try:
+                    connection.request(req.get_method(), path, body=req.data, headers=dict(req.header_items()))
+                except (BrokenPipeError, ConnectionResetError):
+                    stale = True
+                    raise
+                try:
+                    response = connection.getresponse()
+                except http.client.RemoteDisconnected:
+                    # Closed without sending a byte of response
+                    stale = True
+                    raise
+                body = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self._discard(parsed.netloc)
+                # Retry once on a fresh connection, and never after a timeout or a partial response:
+                # the request may have been processed, and chat.postMessage would post twice
+                if not (reused and stale):
+                    raise
+        if response.will_close:
+            self._discard(parsed.netloc)
+
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason, response.msg, io.BytesIO(body))
+        if response.msg.get_content_type() == 'application/gzip':
+            return {'status': response.status, 'headers': response.msg, 'body': body}
+        charset = response.msg.get_content_charset() or 'utf-8'
+        return {'status': response.status, 'headers': response.msg, 'body': body.decode(charset)}
+
+
+class WebApiDispatcher:
+    """Shared rate limiter, retry policy and counters for every Web API call in a process"""
+
+    def __init__(self, token: Optional[str], max_wait: float = 10.0, max_retries: int = 3,
+                 base_url: str = WebClient.BASE_URL):
+        self.limiter = RateLimiter(max_wait=max_wait)
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'queued': 0, 'throttled': 0, 'dropped': 0}
+        self._max_wait = 0.0
+
+        self.backoff = BackoffRetryIntervalCalculator(backoff_factor=0.5, jitter=RandomJitter())
+        self.client = DispatchingWebClient(self, token=token, base_url=base_url, retry_handlers=[
+            RetryAfterHandler(self, max_retry_count=max_retries),
+            ConnectionErrorRetryHandler(max_retry_count=max_retries, interval_calculator=self.backoff),
+            ServerErrorRetryHandler(max_retry_count=max_retries, interval_calculator=self.backoff),
+        ])
+        self._async_retry_handlers: Optional[list] = None
+
+    def admit(self, method: str, channel: Optional[str]) -> float:
+        """Seconds the call must wait before sending; raises CallDropped when over budget"""
+        delay = self.limiter.reserve(method, channel)
+        if delay is None:
+            self.count('dropped')
+            logger.warning("Dropped Web API call over the rate limit budget", extra={
+                'method': method, 'channel': channel, 'max_wait': self.limiter.max_wait
+            })
+            raise CallDropped(f"{method} would wait more than {self.limiter.max_wait}s for a rate limit slot")
+        with self._lock:
+            self._counters['calls'] += 1
+            if delay > 0:
+                self._counters['queued'] += 1
+                if delay > self._max_wait:
+                    self._max_wait = delay
+        return delay
+
+    def count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def async_client(self, base):
+        """Dispatching copy of a per-request AsyncWebClient, reusing its pooled session"""
+        from async_web_api import AsyncDispatchingWebClient, build_async_retry_handlers
+        if self._async_retry_handlers is None:
+            self._async_retry_handlers = build_async_retry_handlers(self)
+        return AsyncDispatchingWebClient(
+            self,
+            token=base.token,
+            base_url=base.base_url,
+            timeout=base.timeout,
+            ssl=base.ssl,
+            proxy=base.proxy,
+            session=base.session,
+            retry_handlers=self._async_retry_handlers,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of dispatch counters"""
+        with self._lock:
+            counters = dict(self._counters)
+            max_wait = self._max_wait
+        return {
+            **counters,
+            'max_queue_wait_ms': round(max_wait * 1000, 1),
+            'channel_buckets': self.limiter.channel_count(),
+        }
+
+
+def build_client_middleware(dispatcher: WebApiDispatcher):
+    """Global Bolt middleware that hands listeners the dispatching client"""
+
+    def client_middleware(context, next):
+        context['client'] = dispatcher.client
+        next()
+
+    return client_middleware
+
+
+def build_async_client_middleware(dispatcher: WebApiDispatcher):
+    """AsyncApp variant of build_client_middleware"""
+
+    async def client_middleware(context, next):
+        context['client'] = dispatcher.async_client(context.client)
+        await next()
+
+    return client_middleware
+
+
+def create_dispatcher() -> WebApiDispatcher:
+    """Build the dispatcher from SLACK_BOT_TOKEN and the SLACK_API_* settings"""
+    return WebApiDispatcher(
+        token=os.environ.get("SLACK_BOT_TOKEN"),
+        max_wait=float(os.environ.get('SLACK_API_MAX_QUEUE_SECONDS', 10)),
+        max_retries=int(os.environ.get('SLACK_API_MAX_RETRIES', 3)),
+        base_url=os.environ.get('SLACK_API_URL', WebClient.BASE_URL),
+    )
@@ -0,0 +1,233 @@
+"""
+Background Work Queue for HOLMES
+
+Lets handlers ack Slack right away and run their Web API calls on a bounded
+pool of background workers instead of the request thread.
+
+- Ordering: work is sharded by channel, and each shard is drained by a single
+  worker, so updates to one channel are sent in the order they were received.
+- Backpressure: each shard queue is bounded. When a shard is full, submit()
+  waits up to `put_timeout` seconds (0: not at all) and then rejects the job;
+  rejections and queue depths are reported by stats(). With `max_wait`, jobs
+  that waited longer than that in the queue are dropped as expired instead of run.
+- Shutdown: shutdown() stops accepting work and waits for queued jobs to finish.
+
+Worker threads are started lazily by the first submit() in each process, so a
+queue created before gunicorn forks its workers still runs inside every worker.
+"""
+
+import functools
+import inspect
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import handler_label, timed_handler
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WorkQueue:
+    """Bounded, channel-ordered worker pool"""
+
+    def __init__(self, workers: int = 8, max_size: int = 1000, put_timeout: float = 1.0,
+                 max_wait: Optional[float] = None, name: str = 'worker'):
+        self.workers = max(1, workers)
+        self.put_timeout = put_timeout
+        self.max_wait = max_wait
+        self.name = name
+        shard_size = max(1, max_size // self.workers)
+        self._shards: List[queue.Queue] = [queue.Queue(maxsize=shard_size) for _ in range(self.workers)]
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'expired': 0}
+        self._max_depth = 0
+        self._max_wait = 0.0
+        self._rejected_logged = 0
+        self._last_rejection_log = 0.0
+
+    def start(self):
+        """Start the worker threads in the current process"""
+        self._pid = os.getpid()
+        self._threads = []
+        for index, shard in enumerate(self._shards):
+            thread = threading.Thread(target=self._run, args=(shard,), name=f"holmes-{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _shard_for(self, key: Optional[str]) -> queue.Queue:
+        return self._shards[zlib.crc32((key or '').encode()) % self.workers]
+
+    def submit(self, key: Optional[str], func: Callable, /, *args, **kwargs) -> bool:
+        """Queue func(*args, **kwargs) behind earlier work for the same key"""
+        if self._closed:
+            self._reject(key)
+            return False
+
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.start()
+
+        shard = self._shard_for(key)
+        try:
+            shard.put((time.monotonic(), func, args, kwargs), timeout=self.put_timeout)
+        except queue.Full:
+            self._reject(key)
+            return False
+
+        depth = shard.qsize()
+        with self._lock:
+            self._counters['submitted'] += 1
+            if depth > self._max_depth:
+                self._max_depth = depth
+        return True
+
+    def submit_request(self, body: Dict[str, Any], func: Callable, /, **kwargs) -> bool:
+        """Queue the job of a Slack request behind earlier work for its channel"""
+        return self.submit(get_channel_key(body), func, **kwargs)
+
+    def _run(self, shard: queue.Queue):
+        while True:
+            item = shard.get()
+            if item is _STOP:
+                return
+            enqueued_at, func, args, kwargs = item
+            wait = time.monotonic() - enqueued_at
+            if self.max_wait is not None and wait > self.max_wait:
+                self._count('expired')
+                continue
+            try:
+                func(*args, **kwargs)
+                outcome = 'completed'
+            except Exception:
+                logger.exception("Background job failed", extra={'job': getattr(func, '__qualname__', repr(func))})
+                outcome = 'failed'
+            with self._lock:
+                self._counters[outcome] += 1
+                if wait > self._max_wait:
+                    self._max_wait = wait
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _reject(self, key: Optional[str]):
+        # A full queue rejects jobs in bursts; log at most once a second with the count since the last log
+        now = time.monotonic()
+        with self._lock:
+            self._counters['rejected'] += 1
+            if now - self._last_rejection_log < 1.0:
+                return
+            self._last_rejection_log = now
+            dropped = self._counters['rejected'] - self._rejected_logged
+            self._rejected_logged = self._counters['rejected']
+        logger.warning("Work queue full, dropped jobs", extra={'queue': self.name, 'channel': key, 'dropped': dropped})
+
+    def depth(self) -> int:
+        """Jobs waiting in all shards"""
+        return sum(shard.qsize() for shard in self._shards)
+
+    def capacity(self) -> int:
+        return sum(shard.maxsize for shard in self._shards)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of throughput and backpressure counters"""
+        depths = [shard.qsize() for shard in self._shards]
+        with self._lock:
+            counters = dict(self._counters)
+            max_depth, max_wait = self._max_depth, self._max_wait
+        return {
+            **counters,
+            'workers': self.workers,
+            'depth': sum(depths),
+            'shard_depths': depths,
+            'capacity': self.capacity(),
+            'max_shard_depth': max_depth,
+            'max_wait_ms': round(max_wait * 1000, 1),
+        }
+
+    def shutdown(self, timeout: float = 30.0) -> bool:
+        """Stop accepting work and drain queued jobs; return True if fully drained"""
+        if self._closed:
+            return True
+        self._closed = True
+        if self._pid != os.getpid():
+            # Never started in this process (e.g. the gunicorn master)
+            return True
+        deadline = time.monotonic() + timeout
+        for shard in self._shards:
+            # Blocks only while a full shard makes room; the stop marker goes after queued work
+            shard.put(_STOP)
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        drained = not any(thread.is_alive() for thread in self._threads)
+        logger.log(logging.INFO if drained else logging.WARNING, "Work queue shutdown",
+                   extra={'drained': drained, **self.stats()})
+        return drained
+
+
+def get_channel_key(body: Dict[str, Any]) -> Optional[str]:
+    """Channel a Slack payload belongs to, used as the ordering key"""
+    return (
+        body.get('channel', {}).get('id')
+        or body.get('container', {}).get('channel_id')
+        or body.get('channel_id')
+        or body.get('event', {}).get('channel')
+    )
+
+
+def _noop_ack(*args, **kwargs):
+    """The listener acks before queueing, so the handler's own ack is ignored"""
+
+
+def queued_handler(func: Callable, work_queue) -> Callable:
+    """Wrap a handler so it acks immediately and runs the rest on the work queue
+
+    work_queue is a WorkQueue, or anything with its submit_request(), such as the
+    AdmissionController that picks a queue by the request's priority.
+    """
+    wanted = list(inspect.signature(func).parameters)
+
+    def listener(ack, body, client, say, respond, message):
+        ack()
+        available = {
+            'ack': _noop_ack,
+            'body': body,
+            'message': message,
+            'client': client,
+            'say': say,
+            'respond': respond,
+        }
+        # Timed on the worker, under the action_id, command or event type it handles
+        job = functools.partial(timed_handler, handler_label(body), func)
+        work_queue.submit_request(body, job, **{arg: available[arg] for arg in wanted})
+
+    listener.__name__ = getattr(func, '__name__', 'listener')
+    return listener
+
+
+class QueuedAppBridge:
+    """Exposes the App registration API while registering queued listeners"""
+
+    def __init__(self, app, work_queue):
+        self.app = app
+        self.work_queue = work_queue
+
+    def action(self, constraints):
+        return lambda func: self.app.action(constraints)(queued_handler(func, self.work_queue))
+
+    def command(self, command):
+        return lambda func: self.app.command(command)(queued_handler(func, self.work_queue))
+
+    def event(self, event):
+        return lambda func: self.app.event(event)(queued_handler(func, self.work_queue))
@@ -0,0 +1,197 @@
+"""
+Slack Ack Latency Load Test
+
+Replays signed Slack payloads (button clicks, /holmes commands and message events)
+against a running HOLMES HTTP server and reports ack latency percentiles. Each
+client thread holds one keep-alive connection, like Slack's delivery workers.
+
+Usage:
+    SLACK_SIGNING_SECRET=... python benchmarks/ack_latency.py \\
+        --url http://localhost:3000 --requests 2000 --concurrency 32
+"""
+
+import argparse
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+ACTION_IDS = [
+    'start_investigation', 'start_revenue_investigation', 'start_traffic_investigation',
+    'start_error_investigation', 'select_revenue', 'select_traffic', 'select_latency',
+    'select_discrepancy', 'massive_overspend', 'latency_degradation_dc', 'cross_dc_routing',
+    'high_timeouts', 'ad_requests_drop', 'bid_requests_drop',
+]
+
+ALERT_TEXTS = [
+    'Massive OVERSPEND detected on bidder 42, budget exceeded',
+    'Bid requests drop of 30% in AMS',
+    'Gateway timeout spike, error rate above 5%',
+    'p99 latency degradation in FRA',
+    'deploy finished, all green',
+]
+
+
+def sign(secret, timestamp, body):
+    """Compute the X-Slack-Signature header for a request body"""
+    base = f"v0:{timestamp}:{body}".encode()
+    return 'v0=' + hmac.new(secret.encode(), base, hashlib.sha256).hexdigest()
+
+
+def build_payload(kind, rng, channel):
+    """Return (path, content type, body) for one synthetic Slack request"""
+    user = f"U{rng.randrange(10 ** 8):08d}"
+    if kind == 'action':
+        action_id = rng.choice(ACTION_IDS)
+        ts = f"{time.time():.6f}"
+        payload = {
+            'type': 'block_actions',
+            'team': {'id': 'T00000000'},
+            'user': {'id': user},
+            'api_app_id': 'A00000000',
+            'channel': {'id': channel},
+            'container': {'type': 'message', 'channel_id': channel, 'message_ts': ts},
+            'message': {'ts': ts},
+            'trigger_id': f"{rng.randrange(10 ** 12)}.{rng.randrange(10 ** 12)}",
+            'actions': [{'action_id': action_id, 'value': action_id, 'type': 'button',
+                         'action_ts': f"{time.time():.6f}"}],
+        }
+        return '/slack/events', 'application/x-www-form-urlencoded', urlencode({'payload': json.dumps(payload)})
+    if kind == 'command':
+        form = {'command': '/holmes', 'text': '', 'team_id': 'T00000000', 'channel_id': channel,
+                'user_id': user, 'trigger_id': f"{rng.randrange(10 ** 12)}", 'api_app_id': 'A00000000'}
+        return '/slack/slash', 'application/x-www-form-urlencoded', urlencode(form)
+    event = {
+        'type': 'event_callback',
+        'team_id': 'T00000000',
+        'api_app_id': 'A00000000',
+        'event_id': f"Ev{rng.randrange(10 ** 10)}",
+        'event_time': int(time.time()),
+        'event': {'type': 'message', 'channel': channel, 'user': user,
+                  'text': rng.choice(ALERT_TEXTS), 'ts': f"{time.time():.6f}"},
+    }
+    return '/slack/events', 'application/json', json.dumps(event)
+
+
+class Client:
+    """One keep-alive connection per thread"""
+
+    _local = threading.local()
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+
+    def post(self, path, headers, body):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            connection.request('POST', path, body=body.encode(), headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:3000')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--mix', default='action=6,command=1,message=3',
+                        help='Relative weights of payload kinds')
+    parser.add_argument('--channel', default='C09EB37M4HE')
+    parser.add_argument('--channels', type=int, default=1,
+                        help='Spread payloads over this many channels (suffixes --channel)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-p99-ms', type=float, default=None,
+                        help='Exit non-zero if p99 ack latency exceeds this budget')
+    args = parser.parse_args()
+
+    secret = os.environ.get('SLACK_SIGNING_SECRET')
+    if not secret:
+        parser.error('SLACK_SIGNING_SECRET must match the server under test')
+
+    weights = dict(item.split('=') for item in args.mix.split(','))
+    kinds = list(weights)
+    rng = random.Random(args.seed)
+    plan = rng.choices(kinds, weights=[float(weights[k]) for k in kinds], k=args.requests)
+
+    client = Client(args.url)
+    latencies = {kind: [] for kind in kinds}
+    errors = []
+    lock = threading.Lock()
+
+    def send(kind):
+        payload_rng = random.Random()
+        channel = args.channel
+        if args.channels > 1:
+            channel = f"{args.channel}{payload_rng.randrange(args.channels)}"
+        path, content_type, body = build_payload(kind, payload_rng, channel)
+        timestamp = str(int(time.time()))
+        headers = {
+            'Content-Type': content_type,
+            'X-Slack-Request-Timestamp': timestamp,
+            'X-Slack-Signature': sign(secret, timestamp, body),
+        }
+        start = time.perf_counter()
+        try:
+            status = client.post(path, headers, body)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            if status == 200:
+                latencies[kind].append(elapsed)
+            else:
+                errors.append(f"HTTP {status}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, plan))
+    duration = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {duration:.2f}s "
+          f"({args.requests / duration:,.0f} req/s), errors: {len(errors)}")
+    if not all_latencies:
+        print("No successful requests")
+        return 1
+    print(f"{'kind':>8} {'count':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind, values in list(latencies.items()) + [('all', all_latencies)]:
+        if values:
+            print(f"{kind:>8} {len(values):>6} {statistics.median(values):>8.1f} "
+                  f"{percentile(values, 0.99):>8.1f} {max(values):>8.1f}")
+    if errors:
+        print(f"first error: {errors[0]}")
+
+    p99 = percentile(all_latencies, 0.99)
+    if args.max_p99_ms is not None and p99 > args.max_p99_ms:
+        print(f"p99 {p99:.1f} ms exceeds budget of {args.max_p99_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Admission Control Benchmark
+
+Floods the background queues with message jobs (each holding a worker for a
+simulated Web API call) at several times the rate the workers can drain, while
+escalating clicks and ordinary clicks arrive every few milliseconds. Runs the
+same load through a single WorkQueue, as every handler shared before admission
+control, and through the AdmissionController, and reports for each:
+
+- wait of escalations and clicks from submit to start (p50, p99)
+- time the request thread spent in submit (a full queue used to block it)
+- jobs shed, by priority
+
+Usage:
+    python benchmarks/admission_benchmark.py [--seconds 5] [--message-rate 2000] [--job-ms 20]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from admission import CRITICAL, DEFAULT_LIMITS, INTERACTIVE, MESSAGE, AdmissionController, classify_request  # noqa: E402
+from work_queue import WorkQueue  # noqa: E402
+
+ESCALATION = {'actions': [{'action_id': 'massive_overspend'}], 'channel': {'id': 'C_ESCALATION'}}
+
+
+def click(index):
+    return {'actions': [{'action_id': 'start_investigation'}], 'channel': {'id': f"C_CLICK{index % 20}"}}
+
+
+def message(index):
+    return {'event': {'type': 'message', 'channel': f"C{index % 50}"}}
+
+
+def run_load(queue, seconds, message_rate, click_every, job_seconds):
+    """Submit the mixed load for `seconds`; return ({priority: waits}, submit durations, shed counts)"""
+    waits = {CRITICAL: [], INTERACTIVE: []}
+    lock = threading.Lock()
+
+    def job(priority, submitted):
+        wait = time.monotonic() - submitted
+        if priority in waits:
+            with lock:
+                waits[priority].append(wait)
+        time.sleep(job_seconds)
+
+    submit_durations, shed = [], {CRITICAL: 0, INTERACTIVE: 0, MESSAGE: 0}
+    started = time.monotonic()
+    index = 0
+    while time.monotonic() - started < seconds:
+        # Messages arrive at message_rate; every click_every-th arrival is also a click
+        index += 1
+        arrivals = [(MESSAGE, message(index))]
+        if index % click_every == 0:
+            arrivals.append((CRITICAL, ESCALATION) if index % (click_every * 2) == 0 else (INTERACTIVE, click(index)))
+        for priority, body in arrivals:
+            before = time.monotonic()
+            accepted = queue.submit_request(body, job, priority=priority, submitted=before)
+            submit_durations.append(time.monotonic() - before)
+            if not accepted:
+                shed[priority] += 1
+        next_arrival = started + index / message_rate
+        delay = next_arrival - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    queue.shutdown(timeout=60)
+    return waits, submit_durations, shed
+
+
+def report(name, waits, submit_durations, shed):
+    print(f"{name}:")
+    for priority, values in waits.items():
+        values = np.array(values or [0]) * 1000
+        print(f"  {priority:>11} wait: p50 {np.percentile(values, 50):7.1f} ms, p99 {np.percentile(values, 99):7.1f} ms "
+              f"({len(waits[priority])} run, {shed[priority]} shed)")
+    submit = np.array(submit_durations) * 1000
+    print(f"  submit: p99 {np.percentile(submit, 99):.2f} ms, max {submit.max():.1f} ms; messages shed {shed[MESSAGE]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--message-rate', type=float, default=2000, help="message jobs submitted per second")
+    parser.add_argument('--click-every', type=int, default=50, help="one click per this many messages")
+    parser.add_argument('--job-ms', type=float, default=20, help="worker time of each job")
+    parser.add_argument('--max-critical-p99-ms', type=float, default=100)
+    args = parser.parse_args()
+    job_seconds = args.job_ms / 1000
+
+    single = WorkQueue(workers=DEFAULT_LIMITS[MESSAGE].workers, max_size=DEFAULT_LIMITS[MESSAGE].max_size)
+    report('single work queue', *run_load(single, args.seconds, args.message_rate, args.click_every, job_seconds))
+
+    admission = AdmissionController(
+        DEFAULT_LIMITS, lambda body: classify_request(body, lambda action_id: action_id == 'massive_overspend'))
+    waits, submit_durations, shed = run_load(admission, args.seconds, args.message_rate, args.click_every, job_seconds)
+    report('admission control', waits, submit_durations, shed)
+
+    critical_p99 = np.percentile(np.array(waits[CRITICAL] or [0]) * 1000, 99)
+    if shed[CRITICAL] or critical_p99 > args.max_critical_p99_ms:
+        print(f"FAIL: escalations p99 wait {critical_p99:.1f} ms (budget {args.max_critical_p99_ms:.0f} ms), "
+              f"{shed[CRITICAL]} shed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
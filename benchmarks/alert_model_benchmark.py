@@ -0,0 +1,164 @@
+"""
+Learned Alert Classifier Benchmark
+
+Trains the hashed n-gram model (app/alert_model.py) on a synthetic labelled alert
+history, where, as in real channels, keywords are ambiguous ('timeout' is an error
+in one alert and latency in the next), some alerts use none of the keywords, and
+most chatter is not an alert. On held-out examples it reports:
+
+- accuracy of the keyword patterns, the learned model, and the model with the
+  keyword fallback for texts it is unsure of
+- calibration: expected calibration error of the model's confidences
+- throughput of scoring one text at a time and in batches, next to the keyword
+  matcher, and in batches for a model trained on alerts only (no `none` class),
+  which runs the keyword matcher on every text as well
+
+Fails when the model with fallback is less accurate than the keywords, when its
+ECE is over --max-ece, or when batch scoring is slower than --min-batch-rate.
+
+Usage:
+    python benchmarks/alert_model_benchmark.py [--examples 20000] [--batch 256]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from alert_model import NONE, evaluate, train  # noqa: E402
+from classifier import AlertClassifier  # noqa: E402
+from classify_benchmark import ALERT_PATTERNS  # noqa: E402
+
+TEMPLATES = {
+    'revenue': [
+        'Massive OVERSPEND detected on campaign {n}, daily budget exceeded by {p}%',
+        'Revenue drop: spend down {p}% vs last week on exchange {n}',
+        'Daily spend {p}% under forecast for publisher {n}',
+        'Campaign {n} pacing ahead, burned {p}% of the monthly budget today',
+        'eCPM collapse on {dc} exchange, payouts down {p}%',
+    ],
+    'traffic': [
+        'Bid requests drop of {p}% in {dc}',
+        'Ad requests below baseline on SDK traffic, fill rate dropped to {p}%',
+        'Inbound QPS from {dc} partners down {p}% in 15m',
+        'Request timeout from SSP {n}: {p}% fewer bid requests reaching the bidder',
+        'No impressions from placement {n} in the last 30 minutes',
+    ],
+    'errors': [
+        'Gateway 5xx error rate above {p}% on bidder-{n}',
+        'Exception spike: timeouts in tracker, error budget burning',
+        'Connection timeout to redis-{n}, requests failing with 503 error',
+        'Crashloop of pod bidder-{n} in {dc}, OOMKilled',
+        'Panic in auction service: nil pointer dereference on node {n}',
+    ],
+    'latency': [
+        'p99 latency degradation in {dc}: {n} ms',
+        'Upstream timeout budget nearly used, response time {n} ms in {dc}',
+        'Auction round trip slow in {dc}, median {n} ms over SLO',
+        'p95 of bidder handler at {n} milliseconds',
+        'Timeout threshold approached: tracker responses take {n} ms',
+    ],
+    'data': [
+        'Druid report discrepancy for publisher {n}: revenue mismatch',
+        'Reporting mismatch between ClickHouse and Druid for {dc}',
+        'Sync error: analytics export {n} missing rows',
+        'Rollup job {n} produced duplicate rows in the daily table',
+        'Data inconsistency in billing aggregates for account {n}',
+    ],
+    NONE: [
+        'deploy of bidder {n} finished, all green',
+        'lunch?',
+        'can someone review PR {n}',
+        'thanks, the p99 dashboard link works now',
+        'moving the error budget review to {dc} office hours',
+        'who owns the revenue report for {dc}?',
+        'rolled back build {n}, will retry tomorrow',
+    ],
+}
+
+DCS = ['AMS', 'FRA', 'SGP', 'US-EAST', 'US-WEST']
+FILLER = ['firing', 'grafana', 'alertmanager', 'cluster prod', 'severity=critical', 'please check', 'FYI', '']
+
+
+def synthesize(count, rng, noise=0.05):
+    """Labelled texts, half of them chatter (labelled None)
+
+    Words are dropped at random, and a share `noise` of the labels is picked at
+    random, as when people disagree on a category.
+    """
+    texts, labels = [], []
+    categories = [category for category in TEMPLATES if category != NONE]
+    for _ in range(count):
+        category = NONE if rng.random() < 0.5 else rng.choice(categories)
+        text = rng.choice(TEMPLATES[category]).format(n=rng.randint(1, 9999), p=rng.randint(2, 95),
+                                                      dc=rng.choice(DCS))
+        words = [word for word in f"{rng.choice(FILLER)} {text} {rng.choice(FILLER)}".split() if rng.random() > 0.15]
+        texts.append(' '.join(words))
+        if rng.random() < noise:
+            category = rng.choice(list(TEMPLATES))
+        labels.append(None if category == NONE else category)
+    return texts, labels
+
+
+def rate(function, items, batch):
+    started = time.perf_counter()
+    for start in range(0, len(items), batch):
+        function(items[start:start + batch])
+    return len(items) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--examples', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=256)
+    parser.add_argument('--max-ece', type=float, default=0.05)
+    parser.add_argument('--min-batch-rate', type=float, default=20000, help="texts/s scored in batches")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    texts, labels = synthesize(args.examples, rng)
+    started = time.perf_counter()
+    model, training = train(texts, labels)
+    print(f"train: {training['trained']} examples in {time.perf_counter() - started:.1f} s, "
+          f"temperature {training['temperature']}")
+
+    test_texts, test_labels = synthesize(args.examples // 4, random.Random(4))
+    keywords = AlertClassifier(ALERT_PATTERNS)
+    report = evaluate(model, test_texts, test_labels, fallback=keywords.classify)
+    keyword_accuracy = sum(1 for text, label in zip(test_texts, test_labels)
+                           if keywords.classify(text) == label) / len(test_texts)
+    print(f"accuracy: keywords {keyword_accuracy:.1%}, model {report['accuracy']:.1%}, "
+          f"model with keyword fallback {report['accuracy_with_fallback']:.1%}")
+    print(f"calibration: ECE {report['ece']:.3f}; {report['confident_share']:.1%} of texts over "
+          f"{model.min_confidence}, {report['confident_accuracy']:.1%} of those correct")
+    for category, scores in report['categories'].items():
+        print(f"  {category:>8}: precision {scores['precision']}, recall {scores['recall']}")
+
+    single = rate(lambda batch: [model.classify(text, keywords.classify) for text in batch], test_texts, 1)
+    batched = rate(lambda batch: model.classify_batch(batch, keywords.classify), test_texts, args.batch)
+    keyword_rate = rate(lambda batch: [keywords.classify(text) for text in batch], test_texts, 1)
+    print(f"throughput: model {single:,.0f} texts/s one at a time, {batched:,.0f} texts/s in batches of "
+          f"{args.batch}; keywords {keyword_rate:,.0f} texts/s")
+    alerts = [(text, label) for text, label in zip(texts, labels) if label is not None]
+    gated_model, _ = train([text for text, _ in alerts], [label for _, label in alerts])
+    gated = rate(lambda batch: gated_model.classify_batch(batch, keywords.classify), test_texts, args.batch)
+    print(f"alerts-only model (keyword_gated): {gated:,.0f} texts/s in batches of {args.batch}")
+
+    failures = []
+    if report['accuracy_with_fallback'] < keyword_accuracy:
+        failures.append(f"model with fallback {report['accuracy_with_fallback']:.1%} below keywords "
+                        f"{keyword_accuracy:.1%}")
+    if report['ece'] > args.max_ece:
+        failures.append(f"ECE {report['ece']:.3f} over {args.max_ece}")
+    if batched < args.min_batch_rate:
+        failures.append(f"batch scoring {batched:,.0f} texts/s under {args.min_batch_rate:,.0f}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Block Kit Template Benchmark
+
+Compares BlockTemplate rendering against the original builders that rebuilt every
+nested dict/list per call, both as Python objects and serialized to JSON as the
+Slack client sends them, and verifies both produce identical blocks.
+
+Templates pay off for mostly static trees such as the decision tree's nodes
+(initial_decision). Per-message blocks whose strings all carry fields
+(alert_response, critical_overspend) render no faster than a builder of
+literals, which is why main.py builds alert responses that way.
+
+Usage:
+    python benchmarks/blocks_benchmark.py [--iterations 100000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from block_templates import BlockTemplate  # noqa: E402
+
+# Kept in sync with app/main.py (importing main would build the Slack app)
+MONITORING_URLS = {
+    'main_dashboard': 'https://pivot.bidmachine.io/pivot/c/9585/-Exchange-_Daily_performance_monitoring',
+    'health_dashboard': 'https://grafana.appodeal.com/d/cde3ebce-204e-4f1d-967f-1a915e3ba429/health-checklist',
+    'temporal_dashboard': 'https://temporal.bidmachine.io/namespaces/default/workflows/',
+}
+EXCHANGE_OPS_ID = 't'
+
+
+def legacy_initial_decision_blocks():
+    return [
+        {'type': 'header', 'text': {'type': 'plain_text', 'text': '🕵️ HOLMES: Health Operations & Live Monitoring Expert System'}},
+        {'type': 'section', 'text': {'type': 'mrkdwn', 'text': '*First, verify in monitoring dashboards:*\n• <{}|Performance Monitoring Dashboard>\n• <{}|Health Dashboard>\n\n*What type of anomaly detected?*'.format(
+            MONITORING_URLS["main_dashboard"], MONITORING_URLS["health_dashboard"])}},
+        {'type': 'actions', 'elements': [
+            {'type': 'button', 'text': {'type': 'plain_text', 'text': '💰 Revenue/Spend Issue'}, 'value': 'revenue_issue', 'action_id': 'select_revenue'},
+            {'type': 'button', 'text': {'type': 'plain_text', 'text': '📊 Traffic Issue'}, 'value': 'traffic_issue', 'action_id': 'select_traffic'},
+        ]},
+        {'type': 'actions', 'elements': [
+            {'type': 'button', 'text': {'type': 'plain_text', 'text': '⚠️ Error Rate Issue'}, 'value': 'error_issue', 'action_id': 'select_error'},
+            {'type': 'button', 'text': {'type': 'plain_text', 'text': '🐌 Latency Issue'}, 'value': 'latency_issue', 'action_id': 'select_latency'},
+        ]},
+        {'type': 'actions', 'elements': [
+            {'type': 'button', 'text': {'type': 'plain_text', 'text': '📋 Data Discrepancy'}, 'value': 'data_discrepancy', 'action_id': 'select_discrepancy'},
+        ]},
+    ]
+
+
+def legacy_alert_response_blocks(user_id, timestamp):
+    return [
+        {'type': 'header', 'text': {'type': 'plain_text', 'text': '🚨 HOLMES: Revenue Alert Detected'}},
+        {'type': 'section', 'text': {'type': 'mrkdwn', 'text': f'*Alert detected by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n\n*🎯 INVESTIGATION RECOMMENDED:*\n• Check <{MONITORING_URLS["main_dashboard"]}|Performance Dashboard>\n• Review <{MONITORING_URLS["temporal_dashboard"]}|Temporal workflows>\n• Verify bidder capping system status'}},
+        {'type': 'actions', 'elements': [
+            {'type': 'button', 'text': {'type': 'plain_text', 'text': '🔍 Start Investigation'}, 'value': 'start_revenue_investigation', 'action_id': 'start_revenue_investigation', 'style': 'primary'},
+        ]},
+    ]
+
+
+def legacy_critical_overspend_blocks(user_id, timestamp):
+    return [
+        {'type': 'header', 'text': {'type': 'plain_text', 'text': '🔥 CRITICAL: Massive Overspend (>$100K)'}},
+        {'type': 'section', 'text': {'type': 'mrkdwn', 'text': f'*Reported by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n*Investigation:* HOLMES System'}},
+        {'type': 'section', 'text': {'type': 'mrkdwn', 'text': f'*🎯 PRIMARY SUSPECT:* Bidder Capping System Failure\n*🔧 LIKELY CAUSE:* Druid Database unavailability\n\n*⚡ CHECK IMMEDIATELY:*\n• <{MONITORING_URLS["temporal_dashboard"]}|Temporal workflows>\n• Bidder settings in BM Dashboard\n• Druid database status\n\n*👥 ESCALATION:* <@{EXCHANGE_OPS_ID}>'}},
+        {'type': 'actions', 'elements': [
+            {'type': 'button', 'text': {'type': 'plain_text', 'text': '✅ Druid is Available'}, 'value': 'druid_available', 'action_id': 'druid_check_yes', 'style': 'primary'},
+            {'type': 'button', 'text': {'type': 'plain_text', 'text': '❌ Druid is Down/Unavailable'}, 'value': 'druid_unavailable', 'action_id': 'druid_check_no', 'style': 'danger'},
+        ]},
+    ]
+
+
+INITIAL_DECISION_TEMPLATE = BlockTemplate([
+    {'type': 'header', 'text': {'type': 'plain_text', 'text': '🕵️ HOLMES: Health Operations & Live Monitoring Expert System'}},
+    {'type': 'section', 'text': {'type': 'mrkdwn', 'text': '*First, verify in monitoring dashboards:*\n• <{urls[main_dashboard]}|Performance Monitoring Dashboard>\n• <{urls[health_dashboard]}|Health Dashboard>\n\n*What type of anomaly detected?*'}},
+    {'type': 'actions', 'elements': [
+        {'type': 'button', 'text': {'type': 'plain_text', 'text': '💰 Revenue/Spend Issue'}, 'value': 'revenue_issue', 'action_id': 'select_revenue'},
+        {'type': 'button', 'text': {'type': 'plain_text', 'text': '📊 Traffic Issue'}, 'value': 'traffic_issue', 'action_id': 'select_traffic'},
+    ]},
+    {'type': 'actions', 'elements': [
+        {'type': 'button', 'text': {'type': 'plain_text', 'text': '⚠️ Error Rate Issue'}, 'value': 'error_issue', 'action_id': 'select_error'},
+        {'type': 'button', 'text': {'type': 'plain_text', 'text': '🐌 Latency Issue'}, 'value': 'latency_issue', 'action_id': 'select_latency'},
+    ]},
+    {'type': 'actions', 'elements': [
+        {'type': 'button', 'text': {'type': 'plain_text', 'text': '📋 Data Discrepancy'}, 'value': 'data_discrepancy', 'action_id': 'select_discrepancy'},
+    ]},
+], constants={'urls': MONITORING_URLS})
+
+ALERT_RESPONSE_TEMPLATE = BlockTemplate([
+    {'type': 'header', 'text': {'type': 'plain_text', 'text': '🚨 HOLMES: Revenue Alert Detected'}},
+    {'type': 'section', 'text': {'type': 'mrkdwn', 'text': '*Alert detected by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n\n*🎯 INVESTIGATION RECOMMENDED:*\n• Check <{urls[main_dashboard]}|Performance Dashboard>\n• Review <{urls[temporal_dashboard]}|Temporal workflows>\n• Verify bidder capping system status'}},
+    {'type': 'actions', 'elements': [
+        {'type': 'button', 'text': {'type': 'plain_text', 'text': '🔍 Start Investigation'}, 'value': 'start_revenue_investigation', 'action_id': 'start_revenue_investigation', 'style': 'primary'},
+    ]},
+], constants={'urls': MONITORING_URLS})
+
+CRITICAL_OVERSPEND_TEMPLATE = BlockTemplate([
+    {'type': 'header', 'text': {'type': 'plain_text', 'text': '🔥 CRITICAL: Massive Overspend (>$100K)'}},
+    {'type': 'section', 'text': {'type': 'mrkdwn', 'text': '*Reported by:* <@{user_id}>\n*Time:* <!date^{timestamp}^{{date_pretty}} at {{time}}|{timestamp}>\n*Investigation:* HOLMES System'}},
+    {'type': 'section', 'text': {'type': 'mrkdwn', 'text': '*🎯 PRIMARY SUSPECT:* Bidder Capping System Failure\n*🔧 LIKELY CAUSE:* Druid Database unavailability\n\n*⚡ CHECK IMMEDIATELY:*\n• <{urls[temporal_dashboard]}|Temporal workflows>\n• Bidder settings in BM Dashboard\n• Druid database status\n\n*👥 ESCALATION:* <@{exchange_ops_id}>'}},
+    {'type': 'actions', 'elements': [
+        {'type': 'button', 'text': {'type': 'plain_text', 'text': '✅ Druid is Available'}, 'value': 'druid_available', 'action_id': 'druid_check_yes', 'style': 'primary'},
+        {'type': 'button', 'text': {'type': 'plain_text', 'text': '❌ Druid is Down/Unavailable'}, 'value': 'druid_unavailable', 'action_id': 'druid_check_no', 'style': 'danger'},
+    ]},
+], constants={'urls': MONITORING_URLS, 'exchange_ops_id': EXCHANGE_OPS_ID})
+
+# (name, legacy builder, template, whether the builder takes user_id and timestamp)
+CASES = [
+    ('initial_decision', legacy_initial_decision_blocks, INITIAL_DECISION_TEMPLATE, False),
+    ('alert_response', legacy_alert_response_blocks, ALERT_RESPONSE_TEMPLATE, True),
+    ('critical_overspend', legacy_critical_overspend_blocks, CRITICAL_OVERSPEND_TEMPLATE, True),
+]
+
+
+def timed(func, iterations):
+    start = time.perf_counter()
+    for index in range(iterations):
+        func(index)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run(name, legacy, template, per_user, iterations):
+    """Benchmark one builder; return the number of mismatching renders"""
+    if per_user:
+        def legacy_call(i): return legacy(f"U{i}", 1700000000 + i)
+        def render(i): return template.render(user_id=f"U{i}", timestamp=1700000000 + i)
+    else:
+        def legacy_call(i): return legacy()
+        def render(i): return template.render()
+
+    mismatches = sum(1 for i in range(100) if legacy_call(i) != render(i))
+
+    legacy_us = timed(legacy_call, iterations)
+    render_us = timed(render, iterations)
+    legacy_json_us = timed(lambda i: json.dumps(legacy_call(i), ensure_ascii=False), iterations)
+    render_json_us = timed(lambda i: json.dumps(render(i), ensure_ascii=False), iterations)
+    print(f"{name:>20} {legacy_us:>9.2f} {render_us:>9.2f} {legacy_us / render_us:>7.1f}x "
+          f"{legacy_json_us:>10.2f} {render_json_us:>10.2f} {legacy_json_us / render_json_us:>7.1f}x {mismatches:>6}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{args.iterations} renders per builder, microseconds per call")
+    print(f"{'builder':>20} {'legacy':>9} {'render':>9} {'speedup':>8} "
+          f"{'legacy+json':>10} {'render+json':>10} {'speedup':>8} {'diffs':>6}")
+    mismatches = sum(run(*case, args.iterations) for case in CASES)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
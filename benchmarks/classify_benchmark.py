@@ -0,0 +1,147 @@
+"""
+Alert Classification Benchmark
+
+Compares the compiled AlertClassifier against the original per-pattern substring
+scan on large synthetic alert corpora, and verifies both give identical results.
+
+Usage:
+    python benchmarks/classify_benchmark.py [--messages 20000] [--extra-patterns 0 200 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from classifier import AlertClassifier  # noqa: E402
+
+# Kept in sync with ALERT_PATTERNS in app/main.py (importing main would build the Slack app)
+ALERT_PATTERNS = {
+    'revenue': [
+        'overspend', 'budget exceeded', 'cost spike', 'spend alert',
+        'revenue drop', 'massive spend', 'budget breach', '$100k'
+    ],
+    'traffic': [
+        'traffic drop', 'request drop', 'bid drop', 'impression drop',
+        'ad requests', 'bid requests', 'fill rate', 'ctr drop'
+    ],
+    'errors': [
+        '5xx', '500 error', '503 error', 'error rate', 'timeout',
+        'service unavailable', 'gateway timeout', 'internal server error'
+    ],
+    'latency': [
+        'latency', 'slow response', 'response time', 'timeout',
+        'degradation', 'p95', 'p99', 'milliseconds'
+    ],
+    'data': [
+        'data discrepancy', 'reporting mismatch', 'analytics',
+        'data inconsistency', 'sync error'
+    ]
+}
+
+FILLER_WORDS = [
+    'grafana', 'alertmanager', 'firing', 'resolved', 'cluster', 'eu-west-1', 'us-east-1',
+    'pod', 'exchange', 'bidder', 'threshold', 'value', 'instance', 'job', 'summary',
+    'description', 'runbook', 'severity', 'critical', 'warning', 'namespace', 'dc', 'ams',
+    'sgp', 'fra', '99.5%', '15m', 'rate', 'sum', 'avg', 'by', 'the', 'over', 'last'
+]
+
+
+def legacy_classify_alert(text, alert_patterns=ALERT_PATTERNS):
+    """Original implementation of classify_alert, used as the reference"""
+    text_lower = text.lower()
+
+    scores = {}
+    for category, patterns in alert_patterns.items():
+        score = 0
+        for pattern in patterns:
+            if pattern.lower() in text_lower:
+                score += 1
+        scores[category] = score
+
+    if max(scores.values()) > 0:
+        return max(scores, key=scores.get)
+    return None
+
+
+def expand_patterns(extra, rng):
+    """Add synthetic patterns to every category to simulate a larger rule set"""
+    expanded = {category: list(patterns) for category, patterns in ALERT_PATTERNS.items()}
+    categories = list(expanded)
+    for i in range(extra):
+        word = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 9)))
+        expanded[categories[i % len(categories)]].append(f"{word} {rng.choice(FILLER_WORDS)}")
+    return expanded
+
+
+def generate_corpus(count, patterns, rng):
+    """Generate synthetic alert messages of mixed length and pattern density"""
+    all_patterns = [p for category_patterns in patterns.values() for p in category_patterns]
+    corpus = []
+    for _ in range(count):
+        length = rng.choice([12, 40, 120, 400])
+        words = [rng.choice(FILLER_WORDS) for _ in range(length)]
+        for _ in range(rng.choice([0, 0, 1, 2, 3, 5])):
+            pattern = rng.choice(all_patterns)
+            if rng.random() < 0.3:
+                pattern = pattern.upper()
+            words.insert(rng.randrange(len(words) + 1), pattern)
+        corpus.append(' '.join(words))
+    return corpus
+
+
+def timed(func, corpus):
+    start = time.perf_counter()
+    results = [func(text) for text in corpus]
+    return results, time.perf_counter() - start
+
+
+def run(patterns, corpus):
+    """Benchmark every implementation on one corpus; return the mismatch count"""
+    pattern_count = sum(len(p) for p in patterns.values())
+    total_chars = sum(len(text) for text in corpus)
+    print(f"\n{pattern_count} patterns, {len(corpus)} messages, {total_chars / 1e6:.1f}M characters")
+
+    legacy_results, legacy_time = timed(lambda text: legacy_classify_alert(text, patterns), corpus)
+    print(f"{'legacy':>9}: {legacy_time:.3f}s  {len(corpus) / legacy_time:,.0f} msg/s")
+
+    mismatches = 0
+    for strategy in ('scan', 'regex'):
+        start = time.perf_counter()
+        classifier = AlertClassifier(patterns, strategy=strategy)
+        build_time = time.perf_counter() - start
+        results, elapsed = timed(classifier.classify, corpus)
+        errors = sum(1 for a, b in zip(legacy_results, results) if a != b)
+        mismatches += errors
+        print(f"{strategy:>9}: {elapsed:.3f}s  {len(corpus) / elapsed:,.0f} msg/s  "
+              f"speedup {legacy_time / elapsed:.2f}x  build {build_time * 1000:.1f} ms  "
+              f"mismatches {errors}")
+
+    default = AlertClassifier(patterns).strategy
+    print(f"  auto-selected strategy: {default}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--extra-patterns', type=int, nargs='*', default=[0, 200, 1000],
+                        help='Synthetic patterns added on top of ALERT_PATTERNS per run')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = 0
+    for extra in args.extra_patterns:
+        patterns = expand_patterns(extra, rng)
+        corpus = generate_corpus(args.messages, patterns, rng)
+        mismatches += run(patterns, corpus)
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
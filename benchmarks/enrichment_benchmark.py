@@ -0,0 +1,120 @@
+"""
+Live Metric Enrichment Benchmark
+
+Serves stub metric sources on local HTTP servers (a fast Prometheus API, a slow
+JSON endpoint past the budget, and one that fails), then fires bursts of
+concurrent alert enrichments at them. Reports how long alerts waited for their
+readings and how many requests reached each source, and fails if any alert waited
+past the budget or identical fetches were not coalesced.
+
+Usage:
+    python benchmarks/enrichment_benchmark.py [--alerts 200] [--budget-ms 300] [--slow-ms 1000]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from enrichment import JsonProvider, MetricEnricher, PrometheusProvider  # noqa: E402
+
+HITS: Counter = Counter()
+
+
+class StubSource(BaseHTTPRequestHandler):
+    """/api/v1/query answers like Prometheus; /slow answers after a delay; /fail is a 500"""
+
+    protocol_version = 'HTTP/1.1'
+    slow_seconds = 1.0
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        HITS[path] += 1
+        if path == '/fail':
+            self.send_error(500)
+            return
+        if path == '/slow':
+            time.sleep(self.slow_seconds)
+            body = {'data': {'count': 7}}
+        else:
+            time.sleep(0.02)
+            body = {'status': 'success', 'data': {'resultType': 'vector', 'result': [
+                {'metric': {}, 'value': [time.time(), '1234.5']}]}}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def burst(enricher, alerts):
+    """Enrich `alerts` concurrent revenue alerts; return each one's wait in seconds"""
+    def one(_):
+        started = time.perf_counter()
+        enricher.readings('revenue')
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=min(alerts, 64)) as pool:
+        return sorted(pool.map(one, range(alerts)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=200)
+    parser.add_argument('--budget-ms', type=float, default=300)
+    parser.add_argument('--slow-ms', type=float, default=1000)
+    args = parser.parse_args()
+    # The failing source is expected; keep its warnings out of the report
+    logging.basicConfig(level=logging.ERROR)
+
+    StubSource.slow_seconds = args.slow_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubSource)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    enricher = MetricEnricher([
+        PrometheusProvider('Spend rate', base, 'sum(rate(spend_usd_total[5m])) * 60',
+                           categories=['revenue'], format='${:,.0f}/min'),
+        JsonProvider('Failed workflows', f"{base}/slow", 'data.count', categories=['revenue'], timeout=5),
+        JsonProvider('Druid status', f"{base}/fail", 'status', categories=['revenue']),
+    ], budget=args.budget_ms / 1000)
+
+    budget = args.budget_ms / 1000
+    failures = 0
+    print(f"{args.alerts} concurrent alerts per burst, budget {args.budget_ms:.0f} ms")
+    print(f"{'burst':>22} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  requests per source")
+    for name in ('cold', 'warm (cached)'):
+        HITS.clear()
+        waits = burst(enricher, args.alerts)
+        p50, p99 = waits[len(waits) // 2] * 1000, waits[int(len(waits) * 0.99)] * 1000
+        print(f"{name:>22} {p50:>8.1f} {p99:>8.1f} {waits[-1] * 1000:>8.1f}  {dict(HITS)}")
+        # Scheduling slack on top of the budget
+        if waits[-1] > budget + 0.05:
+            print(f"  an alert waited {waits[-1] * 1000:.0f} ms, over the budget")
+            failures += 1
+        if any(count > 1 for count in HITS.values()):
+            print("  a source was asked more than once: fetches were not coalesced")
+            failures += 1
+        # Let the slow source answer, so the second burst finds everything cached
+        time.sleep(args.slow_ms / 1000)
+
+    for reading in enricher.readings('revenue'):
+        print(f"  {reading.text}")
+    server.shutdown()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
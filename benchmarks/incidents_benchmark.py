@@ -0,0 +1,123 @@
+"""
+Similar Incident Search Benchmark
+
+Fills an incident history with synthetic closed incidents (alert texts from a few
+dozen templates per category, each with its own resolution and random campaigns,
+DCs and numbers), loads it into an IncidentIndex, then measures:
+
+- closing incidents one by one, i.e. incremental index updates
+- similar-incident searches for new alerts, and how often the best match has the
+  resolution of the alert's template
+
+Fails if the search p99 is over the budget.
+
+Usage:
+    python benchmarks/incidents_benchmark.py [--incidents 100000] [--searches 2000] [--budget-ms 10]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from incidents import IncidentIndex  # noqa: E402
+
+SUBJECTS = {
+    'revenue': ['spend', 'budget', 'revenue', 'campaign pacing', 'overspend', 'payout', 'ecpm'],
+    'traffic': ['bid requests', 'ad requests', 'impressions', 'fill rate', 'qps', 'auction volume'],
+    'errors': ['5xx rate', 'exceptions', 'failed requests', 'timeouts', 'crash loop', 'oom kills'],
+    'latency': ['p99 latency', 'p95 latency', 'response time', 'slow queries', 'rtt'],
+    'data': ['druid ingestion', 'report discrepancy', 'kafka lag', 'missing partitions', 'etl job'],
+}
+CHANGES = ['dropped', 'spiked', 'exceeded threshold', 'below baseline', 'anomaly detected', 'degraded']
+SERVICES = ['exchange', 'bidder', 'tracker', 'reporting', 'pacer', 'gateway', 'sdk-api', 'druid-broker']
+RESOLUTIONS = ['sro_deploy_found', 'druid_check_no', 'sdk_activation_found', 'massive_overspend',
+               'traffic_partner_outage', 'rollback_done', 'config_fixed', 'false_alarm']
+DCS = ['ams', 'sgp', 'us-east', 'us-west', 'fra']
+
+
+def make_templates(rng, per_category):
+    """(category, words, resolution) alert templates"""
+    templates = []
+    for category, subjects in SUBJECTS.items():
+        for _ in range(per_category):
+            words = f"{rng.choice(subjects)} {rng.choice(CHANGES)} on {rng.choice(SERVICES)} {rng.choice(SERVICES)}"
+            templates.append((category, words, rng.choice(RESOLUTIONS)))
+    return templates
+
+
+def alert_text(rng, template):
+    category, words, _ = template
+    return (f"[FIRING] {category} alert: {words} in {rng.choice(DCS)} "
+            f"campaign {rng.randint(1000, 99999)} value {rng.random() * 100:.1f}% "
+            f"<https://grafana.example.com/d/{rng.getrandbits(32):08x}|dashboard>")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--incidents', type=int, default=100000)
+    parser.add_argument('--searches', type=int, default=2000)
+    parser.add_argument('--closes', type=int, default=2000)
+    parser.add_argument('--templates', type=int, default=40, help="alert templates per category")
+    parser.add_argument('--budget-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    templates = make_templates(rng, args.templates)
+    path = os.path.join(tempfile.mkdtemp(), 'incidents.sqlite3')
+    IncidentIndex(path)  # creates the schema
+
+    now = time.time()
+    rows = []
+    for seq in range(1, args.incidents + 1):
+        template = rng.choice(templates)
+        rows.append((f"C{seq % 7}", f"{now - seq:.6f}", template[0], alert_text(rng, template), template[2],
+                     now - seq, now - seq + 600, seq))
+    with sqlite3.connect(path) as connection:
+        connection.executemany("INSERT INTO incidents VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    started = time.perf_counter()
+    index = IncidentIndex(path)
+    index.load()
+    print(f"loaded {index.stats()['indexed']} incidents ({index.stats()['words']} words) "
+          f"in {time.perf_counter() - started:.1f} s")
+
+    # Incremental updates: alerts recorded when answered, closed when identified
+    timings = []
+    for number in range(args.closes):
+        template = rng.choice(templates)
+        thread_ts = f"{now + number:.6f}"
+        index.record('CNEW', thread_ts, template[0], alert_text(rng, template))
+        started = time.perf_counter()
+        index.close('CNEW', thread_ts, template[2])
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"close: p50 {timings[len(timings) // 2] * 1000:.2f} ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.2f} ms")
+
+    timings, correct, found = [], 0, 0
+    for _ in range(args.searches):
+        template = rng.choice(templates)
+        text = alert_text(rng, template)
+        started = time.perf_counter()
+        similar = index.similar(text, template[0])
+        timings.append(time.perf_counter() - started)
+        if similar:
+            found += 1
+            correct += similar[0][0].resolution == template[2]
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99)] * 1000
+    print(f"similar: p50 {timings[len(timings) // 2] * 1000:.2f} ms, p99 {p99:.2f} ms, max {timings[-1] * 1000:.2f} ms")
+    print(f"  {found}/{args.searches} alerts had a similar incident; best match had the right resolution "
+          f"for {correct / max(1, found):.0%}")
+    for incident, score in index.similar(alert_text(rng, templates[0]), templates[0][0]):
+        print(f"  {score:.2f} {incident.resolution}: {incident.text[:90]}")
+    return 1 if p99 > args.budget_ms else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Alert Ingestion Benchmark
+
+POSTs an Alertmanager webhook storm to /alerts/ingest of an in-process HOLMES
+(Flask test client, fake Slack Web API) and reports:
+
+- Slack calls out: one chat.postMessage per (channel, category) group, however
+  many alerts the storm holds; re-sending the same storm is coalesced
+- request latency of the storm POST, groups posted inline
+- parse throughput of iter_alerts over a large body, and its peak memory next to
+  the body size (alerts are decoded one at a time, never the whole body at once)
+
+Fails when a storm costs more Slack calls than it has groups, or when parsing
+holds more than --max-memory-ratio of the body in memory.
+
+Usage:
+    python benchmarks/ingest_benchmark.py [--alerts 500] [--parse-alerts 50000]
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from replay import CountingSlackApi  # noqa: E402
+
+TOKEN = 'ingest-benchmark'
+CHANNELS = ['incidents', 'C08T82KB0M7']
+CATEGORIES = ['revenue', 'traffic', 'errors']
+
+
+def alert(rng, index, status='firing'):
+    """One Alertmanager alert; a tenth carry no category label and are classified by text"""
+    category = rng.choice(CATEGORIES)
+    labels = {'alertname': f"{category.title()}Alert{index % 7}", 'severity': rng.choice(['critical', 'warning']),
+              'slack_channel': rng.choice(CHANNELS), 'instance': f"bidder-{index}"}
+    if index % 10:
+        labels['holmes_category'] = category
+    else:
+        labels['alertname'] = 'GatewayErrors'
+    return {
+        'status': status,
+        'labels': labels,
+        'annotations': {'summary': f"Gateway 5xx error rate above 5% on bidder-{index}"},
+        'startsAt': '2026-01-01T00:00:00Z',
+        'generatorURL': f"https://prometheus.example.com/graph?g0.expr=up&i={index}",
+    }
+
+
+def webhook(alerts):
+    return {'version': '4', 'status': 'firing', 'receiver': 'holmes', 'groupKey': '{}:{}',
+            'commonLabels': {}, 'commonAnnotations': {}, 'externalURL': 'https://alertmanager.example.com',
+            'alerts': alerts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=500)
+    parser.add_argument('--parse-alerts', type=int, default=50000)
+    parser.add_argument('--max-memory-ratio', type=float, default=0.1, help="peak parse memory / body size")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CountingSlackApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state_dir = tempfile.mkdtemp()
+    os.environ.update({
+        'SLACK_BOT_TOKEN': 'xoxb-ingest',
+        'SLACK_SIGNING_SECRET': 'ingest-benchmark',
+        'SLACK_API_URL': f"http://127.0.0.1:{server.server_address[1]}/",
+        'ALERT_INGEST_TOKEN': TOKEN,
+        'SESSIONS_SQLITE_PATH': os.path.join(state_dir, 'sessions.sqlite3'),
+        'INCIDENTS_SQLITE_PATH': os.path.join(state_dir, 'incidents.sqlite3'),
+        'LOG_LEVEL': 'WARNING',
+    })
+    import main as holmes
+    from ingest import iter_alerts
+
+    client = holmes.create_flask_app().test_client()
+    headers = {'Authorization': f"Bearer {TOKEN}", 'Content-Type': 'application/json'}
+    failures = []
+
+    rng = random.Random(7)
+    storm = json.dumps(webhook([alert(rng, index) for index in range(args.alerts)]))
+    assert client.post('/alerts/ingest', data=storm).status_code == 401
+
+    for attempt in ('storm', 'repeat'):
+        CountingSlackApi.calls.clear()
+        started = time.perf_counter()
+        response = client.post('/alerts/ingest', data=storm, headers=headers)
+        elapsed = time.perf_counter() - started
+        body = response.get_json()
+        posts = CountingSlackApi.calls['chat.postMessage']
+        print(f"{attempt:>6}: {args.alerts} alerts -> HTTP {response.status_code} in {elapsed * 1000:.0f} ms, "
+              f"{body['groups']} groups, {body.get('classified_by_text', 0)} classified by text, "
+              f"Slack calls {dict(CountingSlackApi.calls)}")
+        if response.status_code != 202:
+            failures.append(f"{attempt}: HTTP {response.status_code}")
+        limit = body['groups'] if attempt == 'storm' else 0
+        if posts > limit:
+            failures.append(f"{attempt}: {posts} chat.postMessage calls for {body['groups']} groups")
+
+    payload = json.dumps(webhook([alert(rng, index) for index in range(args.parse_alerts)])).encode()
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = sum(1 for _ in iter_alerts(io.BytesIO(payload)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ratio = peak / len(payload)
+    print(f" parse: {count} alerts, {len(payload) / 1e6:.1f} MB in {elapsed * 1000:.0f} ms "
+          f"({count / elapsed:,.0f} alerts/s), peak memory {peak / 1e6:.2f} MB ({ratio:.1%} of the body)")
+    if ratio > args.max_memory_ratio:
+        failures.append(f"parse peak memory {ratio:.1%} of the body, over {args.max_memory_ratio:.0%}")
+
+    server.shutdown()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
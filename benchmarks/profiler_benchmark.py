@@ -0,0 +1,134 @@
+"""
+Sampling Profiler Benchmark
+
+Runs handler threads the way the work queues do (each job through
+metrics.timed_handler under its action_id or event type, classifying an alert
+and waiting on a simulated Web API call), alternately alone and while
+`/holmes profile` samples the process (app/profiler.py), for a few rounds of
+each. It reports:
+
+- median handler throughput without and with the profiler (noisy on shared
+  machines: compare over several rounds)
+- sampler overhead: the CPU time the sampling thread spends walking stacks, as
+  a share of the profile's duration. Under the GIL this is time taken from the
+  handlers, whatever else the machine is doing
+- samples taken, CPU time per sample, and distinct stacks
+- attribution: the share of handler thread samples charged to the handler the
+  thread was running, and samples charged to any other handler (must be none)
+
+Fails when the sampler overhead is over --max-overhead or a sample is charged to the
+wrong handler.
+
+Usage:
+    python benchmarks/profiler_benchmark.py [--seconds 1] [--rounds 5] [--threads 8] [--interval-ms 10]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from classifier import AlertClassifier  # noqa: E402
+from classify_benchmark import ALERT_PATTERNS  # noqa: E402
+from metrics import timed_handler  # noqa: E402
+from profiler import SamplingProfiler  # noqa: E402
+
+LABELS = ['message', 'massive_overspend', 'select_traffic', 'start_error_investigation']
+TEXTS = [
+    'Massive OVERSPEND detected on campaign 42, daily budget exceeded by 30%',
+    'Bid requests drop of 25% in AMS',
+    'Gateway 5xx error rate above 5% on bidder-7',
+    'p99 latency degradation in FRA: 840 ms',
+    'Druid report discrepancy for publisher 9: revenue mismatch',
+]
+
+
+def work(classifier, api_ms):
+    for text in TEXTS * 20:
+        classifier.classify(text)
+    time.sleep(api_ms / 1000)
+
+
+def run(seconds, threads, api_ms, profiler=None):
+    """Handler calls per second, and the profile taken meanwhile and its CPU time if profiler is given"""
+    classifier = AlertClassifier(ALERT_PATTERNS)
+    stop = threading.Event()
+    done = [0] * threads
+
+    def loop(index, label):
+        while not stop.is_set():
+            timed_handler(label, work, classifier=classifier, api_ms=api_ms)
+            done[index] += 1
+
+    workers = [threading.Thread(target=loop, args=(index, LABELS[index % len(LABELS)]),
+                                name=f"bench-{LABELS[index % len(LABELS)]}", daemon=True)
+               for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    started = time.perf_counter()
+    cpu = time.thread_time()
+    profile = profiler.profile(seconds) if profiler else time.sleep(seconds)
+    cpu = time.thread_time() - cpu
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sum(done) / elapsed, profile, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=1, help="per round")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--api-ms', type=float, default=2, help="simulated Web API call per handler")
+    parser.add_argument('--interval-ms', type=float, default=10)
+    parser.add_argument('--max-overhead', type=float, default=0.05, help="sampler CPU time / profile duration")
+    args = parser.parse_args()
+
+    profiler = SamplingProfiler(['U_BENCH'], interval=args.interval_ms / 1000, max_seconds=args.seconds)
+    alone, profiled, overheads = [], [], []
+    for _ in range(args.rounds):
+        alone.append(run(args.seconds, args.threads, args.api_ms)[0])
+        rate, profile, cpu = run(args.seconds, args.threads, args.api_ms, profiler)
+        profiled.append(rate)
+        overheads.append(cpu / profile.duration)
+    overhead = statistics.median(overheads)
+    print(f"throughput: {statistics.median(alone):,.0f} handlers/s alone, {statistics.median(profiled):,.0f} "
+          f"handlers/s profiled (medians of {args.rounds} rounds)")
+    print(f"sampler: {overhead:.1%} of one CPU while profiling, {cpu / profile.samples * 1e6:,.0f} us per sample; "
+          f"{profile.samples} samples of {profile.threads} threads in {profile.duration:.2f} s, "
+          f"{len(profile.stacks)} distinct stacks")
+
+    handler_samples = correct = wrong = 0
+    for stack, count in profile.stacks.items():
+        if not stack[0].startswith('bench-'):
+            continue
+        handler_samples += count
+        if len(stack) > 1 and stack[1].startswith('handler:'):
+            if stack[1] == f"handler:{stack[0][len('bench-'):]}":
+                correct += count
+            else:
+                wrong += count
+    print(f"attribution: {correct / handler_samples:.1%} of handler thread samples charged to their handler, "
+          f"{wrong} to another")
+    for label, count in profile.by_handler().most_common():
+        frames = ', '.join(f"{frame} {samples}" for frame, samples in profile.hot_frames(label, 2))
+        print(f"  {label:>26}: {count} samples, in {frames}")
+
+    failures = []
+    if overhead > args.max_overhead:
+        failures.append(f"sampler overhead {overhead:.1%} over {args.max_overhead:.0%}")
+    if wrong:
+        failures.append(f"{wrong} samples charged to the wrong handler")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
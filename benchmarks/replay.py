@@ -0,0 +1,480 @@
+"""
+Slack Traffic Replay Harness
+
+Replays signed Slack traffic against a HOLMES process started with a local fake
+Slack Web API, over HTTP (create_flask_app under gunicorn) or Socket Mode (a local
+WebSocket endpoint handed out by the fake apps.connections.open):
+
+- messages: alerts of every category, chatter and bot posts
+- /holmes commands
+- a click on every action_id HOLMES registers (decision tree and action manifest)
+
+Events are sent on an open-loop schedule at --rate per second (0: as fast as
+--concurrency allows), and ack latency is measured from each event's scheduled
+time, so a stalled server is not hidden by the sender slowing down. The report
+gives throughput, ack latency percentiles per kind and Web API calls per event
+(counted by the fake API until calls stop). Any --max-*/--min-* budget that is
+missed makes the exit status non-zero, so a run can gate a change.
+
+Payloads are synthesized, or read from a JSONL capture with --payloads: one
+{"kind": "message" | "command" | "action", "payload": {...}} per line, where payload
+is the event_callback, slash command form or interaction payload Slack sends.
+--save writes the synthesized payloads in that format.
+
+Usage:
+    python benchmarks/replay.py --mode http --events 2000 --rate 200
+    python benchmarks/replay.py --mode socket --events 2000 --max-p99-ms 100 --max-calls-per-event 3
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlencode
+
+from aiohttp import WSMsgType, web
+
+from ack_latency import Client, percentile, sign
+from startup_benchmark import PORT, ROOT, FakeSlackApi, is_ready
+
+SIGNING_SECRET = 'replay-harness'
+
+ALERT_TEXTS = [
+    'Massive OVERSPEND detected on campaign {n}, daily budget exceeded by 240%',
+    'Revenue drop: spend down 35% vs last week on exchange {n}',
+    'Bid requests drop of {n}% in AMS',
+    'Ad requests below baseline on SDK traffic, fill rate dropped',
+    'Gateway 5xx error rate above 5% on bidder-{n}',
+    'Exception spike: timeouts in tracker, error budget burning',
+    'p99 latency degradation in FRA: {n} ms',
+    'Druid report discrepancy for publisher {n}: revenue mismatch',
+]
+
+CHATTER_TEXTS = ['deploy of bidder {n} finished, all green', 'lunch?', 'can someone review PR {n}']
+
+
+class CountingSlackApi(FakeSlackApi):
+    """Fake Web API that counts calls by method and hands out the Socket Mode URL"""
+
+    calls: Counter = Counter()
+    lock = threading.Lock()
+    socket_url = ''
+    sequence = itertools.count(1)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        method = self.path.strip('/').split('?')[0]
+        with self.lock:
+            self.calls[method] += 1
+        body = {'ok': True, 'user_id': 'UREPLAY', 'bot_id': 'BREPLAY', 'team_id': 'TREPLAY',
+                'url': self.socket_url if method == 'apps.connections.open' else 'https://replay.slack.com/',
+                'ts': f"{time.time():.0f}.{next(self.sequence):06d}", 'message': {'user': 'UREPLAY'}}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @classmethod
+    def total(cls) -> int:
+        with cls.lock:
+            return sum(cls.calls.values())
+
+
+class FakeSocketMode:
+    """WebSocket endpoint for Socket Mode clients: delivers envelopes and times their acks"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.sockets = []
+        self.acked = {}
+        self.on_ack = None
+        self.connected = threading.Event()
+        self.refreshes = 0
+        started = threading.Event()
+        threading.Thread(target=self._run, args=(started,), daemon=True).start()
+        started.wait()
+        self._next = itertools.count()
+
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+        app = web.Application()
+        app.router.add_get('/link', self._session)
+        runner = web.AppRunner(app)
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.url = f"ws://127.0.0.1:{runner.addresses[0][1]}/link"
+        started.set()
+        self.loop.run_forever()
+
+    async def _session(self, request):
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        self.sockets.append(socket)
+        await socket.send_str(json.dumps({'type': 'hello', 'num_connections': len(self.sockets)}))
+        self.connected.set()
+        async for message in socket:
+            if message.type == WSMsgType.TEXT:
+                envelope_id = json.loads(message.data).get('envelope_id')
+                if envelope_id is not None:
+                    self.on_ack(envelope_id)
+        if socket in self.sockets:
+            self.sockets.remove(socket)
+        return socket
+
+    def send(self, envelope):
+        """Deliver an envelope over the next open connection, round robin"""
+        async def deliver():
+            while not self.sockets:
+                # Every connection is reconnecting
+                await asyncio.sleep(0.001)
+            socket = self.sockets[next(self._next) % len(self.sockets)]
+            await socket.send_str(json.dumps(envelope))
+        return asyncio.run_coroutine_threadsafe(deliver(), self.loop).result()
+
+    def refresh(self):
+        """Ask the oldest connection to reconnect, as Slack does every few hours"""
+        async def request_refresh():
+            if self.sockets:
+                # Like Slack, send nothing more on a connection once it has been told to go
+                socket = self.sockets.pop(0)
+                await socket.send_str(json.dumps({'type': 'disconnect', 'reason': 'refresh_requested'}))
+        asyncio.run_coroutine_threadsafe(request_refresh(), self.loop).result()
+        self.refreshes += 1
+
+
+def registered_action_ids():
+    """Every action_id a click can carry: decision tree actions and manifest action plugins"""
+    tree_path = os.environ.get('HOLMES_DECISION_TREE_FILE') or os.path.join(ROOT, 'app', 'decision_tree.json')
+    with open(tree_path) as tree_file:
+        action_ids = list(json.load(tree_file)['actions'])
+    with open(os.path.join(ROOT, 'app', 'actions', 'manifest.json')) as manifest_file:
+        for entry in json.load(manifest_file).get('actions', []):
+            action_ids.extend(entry.get('action_ids', []))
+    return action_ids
+
+
+def synthesize(rng, kind, channel, action_ids, number):
+    """One {"kind", "payload"} event as Slack would send it"""
+    user = f"U{rng.randrange(10 ** 8):08d}"
+    now = time.time()
+    if kind == 'action':
+        action_id = action_ids[number % len(action_ids)]
+        ts = f"{now:.0f}.{number:06d}"
+        return {'kind': kind, 'payload': {
+            'type': 'block_actions', 'team': {'id': 'T00000000'}, 'user': {'id': user}, 'api_app_id': 'A00000000',
+            'channel': {'id': channel}, 'container': {'type': 'message', 'channel_id': channel, 'message_ts': ts},
+            'message': {'ts': ts}, 'trigger_id': f"{rng.randrange(10 ** 12)}.{number}",
+            'actions': [{'action_id': action_id, 'value': action_id, 'type': 'button', 'action_ts': f"{now:.6f}"}],
+        }}
+    if kind == 'command':
+        return {'kind': kind, 'payload': {
+            'command': '/holmes', 'text': '', 'team_id': 'T00000000', 'channel_id': channel, 'user_id': user,
+            'trigger_id': f"{rng.randrange(10 ** 12)}.{number}", 'api_app_id': 'A00000000',
+        }}
+    roll = rng.random()
+    event = {'type': 'message', 'channel': channel, 'user': user, 'ts': f"{now:.0f}.{number:06d}",
+             'text': rng.choice(ALERT_TEXTS if roll < 0.7 else CHATTER_TEXTS).format(n=rng.randrange(1, 100))}
+    if roll > 0.9:
+        event['bot_id'] = 'BOTHER'
+    return {'kind': kind, 'payload': {
+        'type': 'event_callback', 'team_id': 'T00000000', 'api_app_id': 'A00000000',
+        'event_id': f"Ev{number:010d}{rng.randrange(10 ** 6)}", 'event_time': int(now), 'event': event,
+    }}
+
+
+def http_request(event):
+    """(path, content type, body) of an event delivered over HTTP"""
+    kind, payload = event['kind'], event['payload']
+    if kind == 'action':
+        return '/slack/events', 'application/x-www-form-urlencoded', urlencode({'payload': json.dumps(payload)})
+    if kind == 'command':
+        return '/slack/slash', 'application/x-www-form-urlencoded', urlencode(payload)
+    return '/slack/events', 'application/json', json.dumps(payload)
+
+
+def socket_envelope(event, envelope_id):
+    """Socket Mode envelope of an event"""
+    envelope_type = {'action': 'interactive', 'command': 'slash_commands', 'message': 'events_api'}[event['kind']]
+    return {'envelope_id': envelope_id, 'type': envelope_type, 'payload': event['payload'],
+            'accepts_response_payload': event['kind'] != 'message'}
+
+
+class Replay:
+    """Schedules events and collects ack latencies"""
+
+    def __init__(self, events, rate, concurrency):
+        self.events = events
+        self.rate = rate
+        self.concurrency = concurrency
+        self.latencies = {kind: [] for kind in ('message', 'command', 'action')}
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def due(self, started, index):
+        return started + index / self.rate if self.rate > 0 else time.perf_counter()
+
+    def record(self, kind, scheduled, error=None):
+        elapsed = (time.perf_counter() - scheduled) * 1000
+        with self.lock:
+            if error is None:
+                self.latencies[kind].append(elapsed)
+            else:
+                self.errors.append(f"{kind}: {error}")
+
+    def over_http(self):
+        client = Client(f"http://127.0.0.1:{PORT}")
+        started = time.perf_counter()
+
+        def send(index):
+            event = self.events[index]
+            scheduled = self.due(started, index)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            path, content_type, body = http_request(event)
+            timestamp = str(int(time.time()))
+            headers = {'Content-Type': content_type, 'X-Slack-Request-Timestamp': timestamp,
+                       'X-Slack-Signature': sign(SIGNING_SECRET, timestamp, body)}
+            try:
+                status = client.post(path, headers, body)
+                self.record(event['kind'], scheduled, None if status == 200 else f"HTTP {status}")
+            except Exception as e:
+                self.record(event['kind'], scheduled, repr(e))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(send, range(len(self.events))))
+        return time.perf_counter() - started
+
+    def over_socket(self, socket_mode, timeout, refresh_every=0):
+        pending = {}
+        window = threading.Semaphore(self.concurrency)
+        done = threading.Event()
+
+        def on_ack(envelope_id):
+            with self.lock:
+                entry = pending.pop(envelope_id, None)
+            if entry is not None:
+                self.record(entry[0], entry[1])
+                window.release()
+                if not pending and sent_all.is_set():
+                    done.set()
+
+        sent_all = threading.Event()
+        socket_mode.on_ack = on_ack
+        started = time.perf_counter()
+        next_refresh = started + refresh_every
+        for index, event in enumerate(self.events):
+            if refresh_every and time.perf_counter() >= next_refresh:
+                socket_mode.refresh()
+                next_refresh += refresh_every
+            # At a fixed rate events go out on schedule; otherwise at most `concurrency` wait for acks
+            if self.rate > 0:
+                scheduled = self.due(started, index)
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                window.acquire()
+                scheduled = time.perf_counter()
+            envelope_id = f"replay-{index}"
+            with self.lock:
+                pending[envelope_id] = (event['kind'], scheduled)
+            socket_mode.send(socket_envelope(event, envelope_id))
+        sent_all.set()
+        with self.lock:
+            if not pending:
+                done.set()
+        if not done.wait(timeout):
+            with self.lock:
+                self.errors.extend(f"no ack for {envelope_id}" for envelope_id in pending)
+        return time.perf_counter() - started
+
+
+def wait_for_quiet_api(settle, timeout):
+    """Wait until the fake API has seen no call for `settle` seconds (queued work drained)"""
+    deadline = time.monotonic() + timeout
+    last, quiet_since = CountingSlackApi.total(), time.monotonic()
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        total = CountingSlackApi.total()
+        if total != last:
+            last, quiet_since = total, time.monotonic()
+        elif time.monotonic() - quiet_since >= settle:
+            return
+
+
+def start_holmes(args, api_port, state_dir):
+    env = {key: value for key, value in os.environ.items() if key not in ('SLACK_APP_TOKEN', 'FLASK_ENV')}
+    env.update({
+        'SLACK_BOT_TOKEN': 'xoxb-replay',
+        'SLACK_SIGNING_SECRET': SIGNING_SECRET,
+        'SLACK_API_URL': f"http://127.0.0.1:{api_port}/",
+        'WEB_CONCURRENCY': str(args.workers),
+        'LOG_LEVEL': 'WARNING',
+        'SESSIONS_SQLITE_PATH': os.path.join(state_dir, 'sessions.sqlite3'),
+        'INCIDENTS_SQLITE_PATH': os.path.join(state_dir, 'incidents.sqlite3'),
+    })
+    if args.mode == 'socket':
+        env['SLACK_APP_TOKEN'] = 'xapp-replay'
+    if args.channels:
+        # The synthetic channels are monitored on top of the configured ones
+        channels_file = os.path.join(state_dir, 'channels.json')
+        with open(channels_file, 'w') as config_file:
+            json.dump({'channels': {channel: {} for channel in replay_channels(args)}}, config_file)
+        env['HOLMES_CHANNELS_FILE'] = channels_file
+    env.update(dict(item.split('=', 1) for item in args.env))
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'app', 'main.py')], env=env,
+                            stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+
+
+def wait_until_ready(process, ready, timeout):
+    deadline = time.monotonic() + timeout
+    while not ready():
+        if process.poll() is not None:
+            raise RuntimeError(f"HOLMES exited with status {process.returncode} before it was ready")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"HOLMES was not ready within {timeout}s")
+        time.sleep(0.05)
+
+
+def load_events(args):
+    if args.payloads:
+        with open(args.payloads) as payloads_file:
+            events = [json.loads(line) for line in payloads_file if line.strip()]
+        return (events * (args.events // len(events) + 1))[:args.events] if args.events else events
+    weights = dict(item.split('=') for item in args.mix.split(','))
+    rng = random.Random(args.seed)
+    kinds = rng.choices(list(weights), weights=[float(weight) for weight in weights.values()], k=args.events)
+    action_ids = registered_action_ids()
+    channels = replay_channels(args)
+    return [synthesize(rng, kind, rng.choice(channels), action_ids, number) for number, kind in enumerate(kinds)]
+
+
+def replay_channels(args):
+    return [f"CREPLAY{index:04d}" for index in range(args.channels)] if args.channels else [args.channel]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=('http', 'socket'), default='http')
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=0, help='Events per second (0: as fast as possible)')
+    parser.add_argument('--concurrency', type=int, default=32, help='HTTP connections / unacked envelopes')
+    parser.add_argument('--mix', default='message=6,action=3,command=1', help='Relative weights of event kinds')
+    parser.add_argument('--channels', type=int, default=20,
+                        help='Spread synthesized events over this many monitored channels (0: only --channel)')
+    parser.add_argument('--channel', default='C09EB37M4HE', help='Monitored channel used when --channels is 0')
+    parser.add_argument('--refresh-every', type=float, default=0,
+                        help='Socket Mode: ask a connection to reconnect every this many seconds')
+    parser.add_argument('--payloads', help='Replay this JSONL capture instead of synthesizing')
+    parser.add_argument('--save', help='Write the synthesized events to this JSONL file')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1, help='WEB_CONCURRENCY of the HTTP server')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for HOLMES, e.g. HOLMES_RUNTIME=async')
+    # Longer than the gaps between rate-limited calls (about 1.2 s for a Tier 3 method), or queued work is cut off
+    parser.add_argument('--settle', type=float, default=5.0, help='Seconds without Web API calls that end a run')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--verbose', action='store_true', help='Show HOLMES logs')
+    parser.add_argument('--max-p99-ms', type=float)
+    parser.add_argument('--min-throughput', type=float, help='Events acked per second')
+    parser.add_argument('--max-calls-per-event', type=float)
+    parser.add_argument('--max-errors', type=int, default=0)
+    args = parser.parse_args()
+
+    events = load_events(args)
+    if args.save:
+        with open(args.save, 'w') as save_file:
+            save_file.writelines(json.dumps(event) + '\n' for event in events)
+    if args.mode == 'http' and is_ready():
+        parser.error(f"port {PORT} is already serving; stop the running HOLMES first")
+
+    socket_mode = FakeSocketMode() if args.mode == 'socket' else None
+    CountingSlackApi.socket_url = socket_mode.url if socket_mode else ''
+    api = ThreadingHTTPServer(('127.0.0.1', 0), CountingSlackApi)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+
+    replay = Replay(events, args.rate, args.concurrency)
+    with tempfile.TemporaryDirectory() as state_dir:
+        process = start_holmes(args, api.server_port, state_dir)
+        try:
+            wait_until_ready(process, socket_mode.connected.is_set if socket_mode else is_ready, args.timeout)
+            wait_for_quiet_api(args.settle, args.timeout)
+            calls_before = Counter(CountingSlackApi.calls)
+            if socket_mode:
+                duration = replay.over_socket(socket_mode, args.timeout, args.refresh_every)
+            else:
+                duration = replay.over_http()
+            wait_for_quiet_api(args.settle, args.timeout)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+    api.shutdown()
+
+    calls = Counter(CountingSlackApi.calls)
+    calls.subtract(calls_before)
+    calls = +calls
+    acked = [value for values in replay.latencies.values() for value in values]
+    results = {
+        'mode': args.mode,
+        'events': len(events),
+        'acked': len(acked),
+        'errors': len(replay.errors),
+        'seconds': round(duration, 3),
+        'throughput': round(len(acked) / duration, 1) if duration else 0.0,
+        'calls_per_event': round(sum(calls.values()) / max(1, len(events)), 3),
+        'calls': dict(calls.most_common()),
+        'refreshes': socket_mode.refreshes if socket_mode else 0,
+        'ack_ms': {kind: {'count': len(values), 'p50': round(percentile(values, 0.5), 2),
+                          'p99': round(percentile(values, 0.99), 2), 'max': round(max(values), 2)}
+                   for kind, values in list(replay.latencies.items()) + [('all', acked)] if values},
+    }
+
+    print(f"{args.mode}: {len(events)} events in {duration:.2f}s, {results['throughput']:,.0f} acked/s, "
+          f"errors: {len(replay.errors)}" + (f", reconnects: {results['refreshes']}" if results['refreshes'] else ''))
+    print(f"{'kind':>8} {'count':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind, stats in results['ack_ms'].items():
+        print(f"{kind:>8} {stats['count']:>6} {stats['p50']:>8.1f} {stats['p99']:>8.1f} {stats['max']:>8.1f}")
+    print(f"Web API calls per event: {results['calls_per_event']:.2f} {results['calls']}")
+    for error, count in Counter(replay.errors).most_common(5):
+        print(f"{count:>6} x {error}")
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    failures = []
+    if len(replay.errors) > args.max_errors:
+        failures.append(f"{len(replay.errors)} errors, at most {args.max_errors} allowed")
+    if not acked:
+        failures.append("no event was acked")
+    elif args.max_p99_ms is not None and results['ack_ms']['all']['p99'] > args.max_p99_ms:
+        failures.append(f"p99 ack {results['ack_ms']['all']['p99']:.1f} ms over {args.max_p99_ms:.1f} ms")
+    if args.min_throughput is not None and results['throughput'] < args.min_throughput:
+        failures.append(f"throughput {results['throughput']:.0f}/s under {args.min_throughput:.0f}/s")
+    if args.max_calls_per_event is not None and results['calls_per_event'] > args.max_calls_per_event:
+        failures.append(f"{results['calls_per_event']:.2f} Web API calls per event, over {args.max_calls_per_event}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Investigation Session Store Benchmark
+
+Fills a SessionStore with thousands of open threads, then measures lookups served
+from the cache, lookups that miss it (read by primary key from SQLite), writes of
+investigation steps, and reopening the store, i.e. a restart.
+
+Usage:
+    python benchmarks/sessions_benchmark.py [--sessions 10000] [--lookups 100000] [--max-cached-p99-us 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from sessions import SessionStore  # noqa: E402
+
+CATEGORIES = ['revenue', 'traffic', 'errors', 'latency', 'data']
+CHANNELS = [f"C{index:08d}" for index in range(20)]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return [samples[int(len(samples) * q)] * 1e6 for q in (0.5, 0.99)] + [samples[-1] * 1e6]
+
+
+def timed_each(func, keys):
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        func(*key)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--max-cached-p99-us', type=float, default=1000,
+                        help="fail if cached lookups are slower than this at p99")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.sqlite3')
+        store = SessionStore(path, max_cached=args.sessions)
+        keys = [(rng.choice(CHANNELS), f"{1700000000 + index}.{index % 1000000:06d}") for index in range(args.sessions)]
+
+        start = time.perf_counter()
+        for channel, thread_ts in keys:
+            store.open(channel, thread_ts, rng.choice(CATEGORIES), 'U1')
+        open_rate = args.sessions / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for channel, thread_ts in keys:
+            store.advance(channel, thread_ts, 'select_traffic', 'traffic_options', 'U2')
+        advance_rate = args.sessions / (time.perf_counter() - start)
+
+        lookups = [rng.choice(keys) for _ in range(args.lookups)]
+        cached = timed_each(store.get, lookups)
+
+        # A store caching nothing reads every lookup from SQLite
+        uncached_store = SessionStore(path, max_cached=0)
+        uncached = timed_each(uncached_store.get, lookups[:min(args.lookups, 20000)])
+
+        start = time.perf_counter()
+        restarted = SessionStore(path, max_cached=args.sessions)
+        restart_ms = (time.perf_counter() - start) * 1000
+        missing = sum(1 for key in keys if restarted.get(*key) is None)
+
+    print(f"{args.sessions} open sessions, {args.lookups} lookups")
+    print(f"{'':>16} {'p50 us':>9} {'p99 us':>9} {'max us':>9}")
+    print(f"{'cached get':>16} {cached[0]:>9.2f} {cached[1]:>9.2f} {cached[2]:>9.2f}")
+    print(f"{'uncached get':>16} {uncached[0]:>9.2f} {uncached[1]:>9.2f} {uncached[2]:>9.2f}")
+    print(f"open: {open_rate:,.0f}/s, advance: {advance_rate:,.0f}/s, "
+          f"restart: {restart_ms:.1f} ms, missing after restart: {missing}")
+    return 1 if missing or cached[1] > args.max_cached_p99_us else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Channel Sharding Benchmark
+
+Starts ChannelSharders for a growing number of replicas on one SQLite membership
+file, then has one replica leave, and after every change reports:
+
+- balance: the most channels any replica owns, relative to an even split
+- movement: the share of channels that changed owner, next to the 1/N a
+  consistent hash ring should move, and whether any moved between two replicas
+  that were members both before and after
+- coverage: every channel must be owned by exactly one replica
+
+It also reports the cost of owns(), which runs on every message event. Fails
+when coverage breaks, channels move between unchanged replicas, or the balance
+is worse than --max-imbalance.
+
+Usage:
+    python benchmarks/sharding_benchmark.py [--replicas 8] [--channels 10000] [--vnodes 64]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from sharding import ChannelSharder, SQLiteMembershipStore  # noqa: E402
+
+
+def owners(sharders, channels):
+    """{channel: owning member IDs} as every replica sees it"""
+    owned = {channel: [] for channel in channels}
+    for sharder in sharders:
+        for channel in channels:
+            if sharder.owns(channel):
+                owned[channel].append(sharder.member_id)
+    return owned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--replicas', type=int, default=8)
+    parser.add_argument('--channels', type=int, default=10000)
+    parser.add_argument('--vnodes', type=int, default=64)
+    parser.add_argument('--heartbeat', type=float, default=0.05, help="heartbeat interval, seconds")
+    parser.add_argument('--max-imbalance', type=float, default=1.4, help="most owned channels / even split")
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp()
+    path = os.path.join(state_dir, 'shards.sqlite3')
+    channels = [f"C{index:010d}" for index in range(args.channels)]
+    failures = []
+    sharders = []
+    previous = None
+
+    def settle():
+        # Two heartbeats, so every replica has seen the latest membership
+        time.sleep(args.heartbeat * 2.5)
+
+    def check(event):
+        nonlocal previous
+        owned = owners(sharders, channels)
+        unowned = sum(1 for members in owned.values() if len(members) != 1)
+        counts = {}
+        for members in owned.values():
+            for member in members:
+                counts[member] = counts.get(member, 0) + 1
+        imbalance = max(counts.values()) / (args.channels / len(sharders))
+        line = f"{event:>22}: {len(sharders)} replicas, balance {imbalance:.2f}"
+        if previous is not None:
+            members = {sharder.member_id for sharder in sharders}
+            moved = [channel for channel in channels if owned[channel] != previous[channel]]
+            stayed = [channel for channel in moved
+                      if previous[channel][0] in members and owned[channel][0] in previous_members]
+            ideal = 1 / max(len(sharders), len(previous_members))
+            line += f", moved {len(moved) / args.channels:.1%} (ideal {ideal:.1%})"
+            if stayed:
+                failures.append(f"{event}: {len(stayed)} channels moved between replicas present before and after")
+        if unowned:
+            failures.append(f"{event}: {unowned} channels without exactly one owner")
+        if imbalance > args.max_imbalance:
+            failures.append(f"{event}: balance {imbalance:.2f} over {args.max_imbalance}")
+        print(line)
+        previous = owned
+        return {sharder.member_id for sharder in sharders}
+
+    previous_members = set()
+    for index in range(args.replicas):
+        sharder = ChannelSharder(SQLiteMembershipStore(path), f"replica-{index}",
+                                 heartbeat_interval=args.heartbeat, ttl=args.heartbeat * 10, vnodes=args.vnodes)
+        sharders.append(sharder.start())
+        settle()
+        previous_members = check(f"replica-{index} joins")
+
+    leaving = sharders.pop(len(sharders) // 2)
+    leaving.leave()
+    settle()
+    previous_members = check(f"{leaving.member_id} leaves")
+
+    sharder = sharders[0]
+    started = time.perf_counter()
+    for channel in channels:
+        sharder.owns(channel)
+    print(f"owns(): {(time.perf_counter() - started) / len(channels) * 1e6:.2f} us per call; "
+          f"each replica handles 1/{len(sharders)} of the channels")
+
+    for sharder in sharders:
+        sharder.leave()
+    shutil.rmtree(state_dir)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
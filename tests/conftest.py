@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# The app modules import each other by flat name, as when run from app/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+# Importing main builds the Slack app from the environment; it makes no network call
+_STATE_DIR = tempfile.mkdtemp(prefix='holmes-tests-')
+os.environ.setdefault('SLACK_BOT_TOKEN', 'xoxb-test')
+os.environ.setdefault('SLACK_SIGNING_SECRET', 'test-secret')
+os.environ.setdefault('SESSIONS_SQLITE_PATH', os.path.join(_STATE_DIR, 'sessions.sqlite3'))
+os.environ.setdefault('INCIDENTS_SQLITE_PATH', os.path.join(_STATE_DIR, 'incidents.sqlite3'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
@@ -0,0 +1,91 @@
+import json
+import sys
+
+import pytest
+
+from actions import registry
+from actions.registry import ActionRegistry, discover_actions, register_all_actions
+from decision_tree import DecisionTreeError, compile_tree
+
+ACTION_MODULE = '''
+from actions.base import BaseAction
+
+IMPORTED = True
+
+
+class CheckDruidAction(BaseAction):
+    def get_action_id(self):
+        return 'check_druid'
+
+    def get_description(self):
+        return 'Query Druid status'
+
+    def get_handled_actions(self):
+        return ['check_druid', 'check_druid_again']
+
+    def handle(self, ack, body, respond, client):
+        ack()
+        respond(f"checked by {self.get_user_id(body)}")
+'''
+
+
+class App:
+    def __init__(self):
+        self.listeners = {}
+
+    def action(self, action_id):
+        def register(listener):
+            self.listeners[action_id] = listener
+            return listener
+        return register
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    """A manifest listing one action module, importable but not yet imported"""
+    (tmp_path / 'holmes_test_druid_action.py').write_text(ACTION_MODULE)
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps({'actions': [{
+        'target': 'holmes_test_druid_action:CheckDruidAction',
+        'action_ids': ['check_druid', 'check_druid_again'],
+        'description': 'Query Druid status',
+    }, {
+        'target': 'holmes_test_missing_action:MissingAction',
+        'action_ids': ['missing'],
+    }]}))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(registry, 'MANIFEST_PATH', str(path))
+    monkeypatch.setattr(registry, '_registry', ActionRegistry())
+    yield path
+    sys.modules.pop('holmes_test_druid_action', None)
+
+
+def test_shipped_manifest_is_valid():
+    assert registry.load_manifest() == []
+
+
+def test_actions_register_without_import_and_load_on_first_click(manifest):
+    app = App()
+    actions = register_all_actions(app)
+    # The missing module is skipped, the other registered for both of its IDs
+    assert set(app.listeners) == {'check_druid', 'check_druid_again'}
+    assert 'holmes_test_druid_action' not in sys.modules
+
+    responses = []
+    acks = []
+    app.listeners['check_druid'](lambda: acks.append(True), {'user': {'id': 'U1'}}, responses.append, None)
+    assert acks == [True] and responses == ['checked by U1']
+    assert 'holmes_test_druid_action' in sys.modules
+    assert actions.get_action('check_druid_again') is actions.get_action('check_druid')
+
+
+def test_decision_tree_buttons_may_lead_to_actions(manifest):
+    tree = {
+        'root': 'start',
+        'nodes': {'start': {'title': 'Druid', 'buttons': [[{'text': 'Check Druid', 'action_id': 'check_druid'}]]}},
+        'actions': {},
+    }
+    with pytest.raises(DecisionTreeError):
+        compile_tree(tree, {})
+    known = [action_id for spec in discover_actions() for action_id in spec.action_ids]
+    compile_tree(tree, {}, known_actions=known)
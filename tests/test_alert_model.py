@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from alert_model import AlertModel, create_alert_model, train
+
+EXAMPLES = [
+    ('Massive overspend on campaign {n}, daily budget exceeded', 'revenue'),
+    ('Spend pacing above budget for advertiser {n}', 'revenue'),
+    ('Bid requests drop of {n}% in AMS', 'traffic'),
+    ('Ad requests fell {n}% on exchange {n}', 'traffic'),
+    ('p99 latency {n} ms in FRA, timeouts on bidder', 'latency'),
+    ('Gateway 5xx error rate above {n}% on bidder-{n}', 'errors'),
+    ('lunch at {n}? anyone', None),
+    ('thanks, merged the PR {n}', None),
+]
+TEXTS = [template.format(n=index) for index in range(40) for template, _ in EXAMPLES]
+LABELS = [label for _ in range(40) for _, label in EXAMPLES]
+NEW_TEXTS = ['Massive overspend on campaign 999, daily budget exceeded', 'p99 latency 1200 ms in SIN',
+             'anyone up for lunch', '']
+
+
+def keywords(text):
+    return 'traffic' if 'drop' in text else None
+
+
+@pytest.fixture(scope='module')
+def model():
+    return train(TEXTS, LABELS, dim=1 << 12, epochs=5)[0]
+
+
+def test_saved_model_loads_with_the_same_predictions(model, tmp_path):
+    path = str(tmp_path / 'alert_model.npz')
+    model.save(path)
+    loaded = AlertModel.load(path)
+    assert loaded.categories == model.categories and 'none' in loaded.categories
+    assert loaded.temperature == model.temperature and loaded.min_confidence == model.min_confidence
+    np.testing.assert_array_equal(loaded.predict_proba(NEW_TEXTS), model.predict_proba(NEW_TEXTS))
+    assert loaded.classify_batch(NEW_TEXTS, keywords) == model.classify_batch(NEW_TEXTS, keywords)
+    assert loaded.classify(NEW_TEXTS[0]) == 'revenue'
+
+
+def test_model_trained_on_alerts_only_is_keyword_gated():
+    alerts = [(text, label) for text, label in zip(TEXTS, LABELS) if label is not None]
+    gated = train([text for text, _ in alerts], [label for _, label in alerts], dim=1 << 12, epochs=5)[0]
+    assert gated.keyword_gated and gated.stats()['keyword_gated']
+    # Only texts the keywords flag as alerts get a category
+    texts = ['Bid requests drop of 5% in AMS', 'anyone up for lunch']
+    assert gated.classify_batch(texts, keywords) == ['traffic', None]
+
+
+def test_model_with_unknown_categories_is_refused(model, tmp_path, monkeypatch):
+    path = str(tmp_path / 'alert_model.npz')
+    model.save(path)
+    monkeypatch.setenv('HOLMES_CLASSIFIER_MODEL', path)
+    assert create_alert_model(['revenue', 'traffic', 'latency', 'errors']).categories == model.categories
+    with pytest.raises(ValueError):
+        create_alert_model(['revenue', 'traffic'])
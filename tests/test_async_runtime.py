@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from async_runtime import send_recorded_calls
+
+
+class SlowClient:
+    """AsyncWebClient stand-in whose every call takes `delay` seconds"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.sent = []
+
+    def __getattr__(self, method):
+        async def call(**kwargs):
+            await asyncio.sleep(self.delay)
+            if kwargs.get('fail'):
+                raise RuntimeError(method)
+            self.sent.append((method, kwargs.get('text')))
+            return method
+        return call
+
+
+def test_update_and_thread_post_are_sent_concurrently():
+    client = SlowClient(0.1)
+    calls = [('client', 'chat_update', (), {'channel': 'C1', 'ts': '1.1', 'text': 'selected'}),
+             ('client', 'chat_postMessage', (), {'channel': 'C1', 'thread_ts': '1.1', 'text': 'node'})]
+    started = time.perf_counter()
+    results = asyncio.run(send_recorded_calls(calls, {'client': client}))
+    assert time.perf_counter() - started < 0.18
+    assert results == ['chat_update', 'chat_postMessage']
+
+
+def test_posts_to_one_thread_keep_their_order():
+    client = SlowClient(0.01)
+    calls = [('client', 'chat_postMessage', (), {'channel': 'C1', 'thread_ts': '1.1', 'text': str(index)})
+             for index in range(5)]
+    calls.insert(2, ('client', 'chat_postMessage', (), {'channel': 'C2', 'text': 'escalation'}))
+    asyncio.run(send_recorded_calls(calls, {'client': client}))
+    assert [text for _, text in client.sent if text != 'escalation'] == ['0', '1', '2', '3', '4']
+
+
+def test_failed_call_is_returned_in_its_place():
+    client = SlowClient(0)
+    calls = [('client', 'chat_update', (), {'fail': True}), ('client', 'chat_postMessage', (), {'channel': 'C1'})]
+    results = asyncio.run(send_recorded_calls(calls, {'client': client}))
+    assert isinstance(results[0], RuntimeError) and results[1] == 'chat_postMessage'
@@ -0,0 +1,46 @@
+import json
+import os
+
+import pytest
+
+from channels import ChannelRegistry
+
+MONITORED = ['C1', 'C2']
+NAMED = {'incidents': 'C1'}
+
+
+def write(path, config):
+    path.write_text(config if isinstance(config, str) else json.dumps(config))
+    return str(path)
+
+
+@pytest.mark.parametrize('config', [
+    '{"channels": {',
+    {'channels': {'C3': 'incidents'}},
+    {'channels': ['C3']},
+    {'defaults': {'categories': 'revenue'}},
+    {'channels': {'C3': {'rate_cap': 'ten'}}},
+    {'channels': {'C3': {'response_mode': 'loud'}}},
+])
+def test_invalid_file_fails_startup(tmp_path, config):
+    with pytest.raises(ValueError):
+        ChannelRegistry(MONITORED, NAMED, write(tmp_path / 'channels.json', config))
+
+
+def test_invalid_hot_edit_keeps_the_previous_index(tmp_path):
+    path = write(tmp_path / 'channels.json', {'channels': {'C3': {'name': 'okr', 'rate_cap': 5}}})
+    registry = ChannelRegistry(MONITORED, NAMED, path, reload_interval=0)
+    assert registry.policy_for('C3').rate_cap == 5 and registry.channel_id('okr') == 'C3'
+
+    write(tmp_path / 'channels.json', {'channels': {'C3': ['not', 'an', 'object']}})
+    os.utime(path, (0, 0))
+    assert not registry.reload()
+    assert registry.policy_for('C1') is not None and registry.policy_for('C3').rate_cap == 5
+    assert registry.channel_id('okr') == 'C3'
+
+
+def test_unmonitored_override_and_direct_messages(tmp_path):
+    path = write(tmp_path / 'channels.json', {'direct_messages': False, 'channels': {'C2': {'monitored': False}}})
+    registry = ChannelRegistry(MONITORED, NAMED, path)
+    assert registry.monitored_channels() == ['C1']
+    assert registry.policy_for('D123') is None
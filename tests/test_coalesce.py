@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from coalesce import AlertCoalescer, fingerprint
+
+ALERT = 'Massive OVERSPEND detected on campaign 42, daily budget exceeded by 30%'
+
+
+def test_fingerprint_ignores_volatile_parts():
+    assert fingerprint(ALERT) == fingerprint('Massive OVERSPEND detected on campaign 7, daily budget exceeded by 95%')
+    assert fingerprint(ALERT) != fingerprint('Bid requests drop of 25% in AMS')
+
+
+def test_repeats_within_window_join_the_storm():
+    coalescer = AlertCoalescer(window=60, update_interval=0)
+    storm, is_new = coalescer.observe('C1', 'revenue', ALERT, 'U1')
+    assert is_new
+    coalescer.posted(storm, '1.1', lambda: None)
+    repeat, is_new = coalescer.observe('C1', 'revenue', ALERT.replace('42', '43'), 'U2')
+    assert repeat is storm and not is_new and storm.count == 2
+
+
+def test_repeat_updates_posted_response():
+    coalescer = AlertCoalescer(window=60, update_interval=0)
+    updates = []
+    storm, _ = coalescer.observe('C1', 'revenue', ALERT, 'U1')
+    coalescer.posted(storm, '1.1', lambda: updates.append(storm.count))
+    storm, _ = coalescer.observe('C1', 'revenue', ALERT, 'U1')
+    coalescer.repeated(storm, lambda: updates.append(storm.count))
+    assert updates == [2]
+
+
+def test_forgotten_storm_answers_next_repeat_as_new():
+    coalescer = AlertCoalescer(window=60)
+    storm, _ = coalescer.observe('C1', 'revenue', ALERT, 'U1')
+    coalescer.forget(storm)
+    again, is_new = coalescer.observe('C1', 'revenue', ALERT, 'U1')
+    assert is_new and again is not storm
+    assert coalescer.stats()['unanswered'] == 1
+
+
+def test_forget_keeps_posted_storm():
+    coalescer = AlertCoalescer(window=60)
+    storm, _ = coalescer.observe('C1', 'revenue', ALERT, 'U1')
+    coalescer.posted(storm, '1.1', lambda: None)
+    coalescer.forget(storm)
+    assert not coalescer.observe('C1', 'revenue', ALERT, 'U1')[1]
+
+
+class Policy:
+    response_mode = 'thread'
+    rate_cap = 10
+
+    def __init__(self, allowed=True):
+        self.allowed = allowed
+
+    def allow(self):
+        return self.allowed
+
+
+class Client:
+    """Slack client whose first `failures` posts raise"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.posts = []
+        self.updates = []
+
+    def chat_postMessage(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('Slack unreachable')
+        self.posts.append(kwargs)
+        return {'ts': f"{time.time():.6f}"}
+
+    def chat_update(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+@pytest.fixture
+def main(monkeypatch):
+    import main
+    monkeypatch.setattr(main, 'ALERT_COALESCER', AlertCoalescer(window=60, update_interval=0))
+    return main
+
+
+def test_alert_answered_after_first_post_fails(main):
+    client = Client(failures=1)
+    main.respond_to_alert(client, Policy(), 'revenue', 'C1', ALERT, 'U1', '100.1')
+    assert client.posts == []
+    main.respond_to_alert(client, Policy(), 'revenue', 'C1', ALERT, 'U1', '100.2')
+    assert len(client.posts) == 1 and client.posts[0]['thread_ts'] == '100.2'
+    # Later repeats update that response instead of posting again
+    main.respond_to_alert(client, Policy(), 'revenue', 'C1', ALERT, 'U1', '100.3')
+    assert len(client.posts) == 1 and len(client.updates) == 1
+
+
+def test_alert_answered_after_first_is_rate_capped(main):
+    client = Client()
+    main.respond_to_alert(client, Policy(allowed=False), 'revenue', 'C1', ALERT, 'U1', '200.1')
+    main.respond_to_alert(client, Policy(), 'revenue', 'C1', ALERT, 'U1', '200.2')
+    assert len(client.posts) == 1 and client.posts[0]['thread_ts'] == '200.2'
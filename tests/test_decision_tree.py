@@ -0,0 +1,56 @@
+import copy
+import json
+import os
+from collections import defaultdict
+
+import pytest
+
+from decision_tree import DEFAULT_TREE_PATH, DecisionTreeEngine, DecisionTreeError, compile_tree
+
+with open(DEFAULT_TREE_PATH) as tree_file:
+    SHIPPED = json.load(tree_file)
+# Any url or contact the shipped tree names
+CONSTANTS = {'urls': defaultdict(str), 'contacts': defaultdict(str)}
+
+
+def broken(edit):
+    data = copy.deepcopy(SHIPPED)
+    edit(data['actions'])
+    return data
+
+
+def test_shipped_tree_compiles():
+    tree = compile_tree(SHIPPED, CONSTANTS)
+    assert tree.root in tree.nodes and 'massive_overspend' in tree.transitions
+
+
+@pytest.mark.parametrize('edit', [
+    lambda actions: actions['massive_overspend']['escalate'].pop('channel'),
+    lambda actions: actions['massive_overspend']['escalate'].pop('text'),
+    lambda actions: actions['massive_overspend'].update(escalate='okr'),
+    lambda actions: actions['start_investigation']['update'].pop('message'),
+    lambda actions: actions['start_investigation'].update(update=['text', 'message']),
+    lambda actions: actions.update(start_investigation='node'),
+    lambda actions: actions['start_investigation'].update(node=['root']),
+    lambda actions: actions['start_investigation'].update(post_to={'channel': 'okr'}),
+], ids=['escalate-channel', 'escalate-text', 'escalate-string', 'update-message', 'update-list', 'action-string',
+        'node-list', 'post-to-object'])
+def test_malformed_action_is_a_tree_error(edit):
+    with pytest.raises(DecisionTreeError) as error:
+        compile_tree(broken(edit), CONSTANTS)
+    assert error.value.problems
+
+
+def test_malformed_hot_edit_keeps_the_running_tree(tmp_path):
+    path = tmp_path / 'decision_tree.json'
+    path.write_text(json.dumps(SHIPPED))
+    engine = DecisionTreeEngine(str(path), CONSTANTS, lambda name: 'C1', reload_interval=0)
+    running = engine.tree
+
+    path.write_text(json.dumps(broken(lambda actions: actions['massive_overspend']['escalate'].pop('channel'))))
+    os.utime(path, (0, 0))
+    assert engine.tree is running and engine.transition('massive_overspend') is not None
+
+    path.write_text(json.dumps(broken(lambda actions: actions.update(start_investigation=None))))
+    os.utime(path, (1, 1))
+    assert engine.tree is running
@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from dedup import MemoryIdempotencyStore, SQLiteIdempotencyStore, get_idempotency_keys, is_duplicate
+
+
+def click(user_id, trigger_id):
+    return {
+        'type': 'block_actions',
+        'trigger_id': trigger_id,
+        'user': {'id': user_id},
+        'channel': {'id': 'C1'},
+        'message': {'ts': '1700000000.000100'},
+        'actions': [{'action_id': 'start_investigation'}],
+    }
+
+
+def test_event_and_trigger_keys():
+    keys = get_idempotency_keys({'event_id': 'Ev1', 'trigger_id': 'T1'}, click_window=30)
+    assert keys == [('event:Ev1', 0), ('trigger:T1', 0)]
+
+
+def test_click_key_includes_user():
+    keys = dict(get_idempotency_keys(click('U1', 'T1'), click_window=30))
+    assert keys['click:C1:1700000000.000100:start_investigation:U1'] == 30
+
+
+def test_double_click_by_same_user_is_duplicate():
+    store = MemoryIdempotencyStore()
+    assert not is_duplicate(store, click('U1', 'T1'), click_window=30)
+    assert is_duplicate(store, click('U1', 'T2'), click_window=30)
+
+
+def test_click_by_another_user_is_not_duplicate():
+    store = MemoryIdempotencyStore()
+    assert not is_duplicate(store, click('U1', 'T1'), click_window=30)
+    assert not is_duplicate(store, click('U2', 'T2'), click_window=30)
+
+
+def test_memory_store_expires_keys():
+    store = MemoryIdempotencyStore(ttl=60)
+    assert not store.seen('k', ttl=-1)
+    assert not store.seen('k')
+    assert store.seen('k')
+
+
+def test_sqlite_store_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'dedup.sqlite3')
+    first, second = SQLiteIdempotencyStore(path), SQLiteIdempotencyStore(path)
+    assert not first.seen('trigger:T1')
+    assert first.seen('trigger:T1')
+    assert second.seen('trigger:T1')
+
+
+def test_sqlite_error_does_not_mark_key_seen(tmp_path):
+    store = SQLiteIdempotencyStore(str(tmp_path / 'dedup.sqlite3'))
+    store._connect().execute("DROP TABLE idempotency_keys")
+    with pytest.raises(sqlite3.OperationalError):
+        store.seen('event:Ev1')
+    store._connect().execute(
+        "CREATE TABLE idempotency_keys (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+    # The redelivery is processed, not dropped as a duplicate
+    assert not store.seen('event:Ev1')
+    assert store.seen('event:Ev1')
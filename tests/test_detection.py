@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+
+from detection import DetectionEngine, DetectionRunner
+
+
+def runner():
+    return DetectionRunner(DetectionEngine(capacity=4), [], interval=3600, on_detection=lambda detection: None)
+
+
+def test_one_runner_per_lock_file_leads(tmp_path):
+    lock_path = str(tmp_path / 'detection.lock')
+    first, second = runner().start(lock_path), runner().start(lock_path)
+    assert first.leads() and not second.leads()
+    assert first.stats()['leader'] and not second.stats()['leader']
+
+    # The lock is released when its holder goes away, as when a worker exits
+    first._lock_file.close()
+    assert second.leads()
+    first.stop()
+    second.stop()
+
+
+def test_start_runs_once_per_process():
+    detection = runner().start()
+    thread = detection._thread
+    assert detection.start()._thread is thread
+    assert detection.stats()['leader'] and detection._pid == os.getpid()
+    detection.stop()
+
+
+def feed(engine, ticks, values_at):
+    """Evaluate `ticks` one-minute ticks of {series: value}; the detections of each tick"""
+    detections = []
+    for tick in range(ticks):
+        values = engine.observe(values_at(tick), 'traffic', 'both')
+        detections.append(engine.evaluate(values, timestamp=tick * 60.0))
+    return detections
+
+
+def noisy(level, tick, series=0):
+    return level * (1 + 0.01 * np.sin(tick * 1.7 + series))
+
+
+def test_noisy_flat_series_never_fire():
+    engine = DetectionEngine(capacity=8)
+    detections = feed(engine, 300, lambda tick: {f"dc{series}": noisy(1000, tick, series) for series in range(4)})
+    assert not any(detections)
+    assert engine.stats()['series'] == 4 and engine.stats()['active'] == 0
+
+
+def test_drop_fires_once_then_again_after_recovery():
+    engine = DetectionEngine(capacity=8)
+    dropped = {100, 101, 102, 200}
+
+    def values_at(tick):
+        return {'ams': noisy(1000, tick) * (0.4 if tick in dropped else 1), 'fra': noisy(1000, tick, 1)}
+
+    detections = feed(engine, 250, values_at)
+    fired = {tick: found for tick, found in enumerate(detections) if found}
+    # Once when the drop starts, not on every tick it lasts, and again for the next one
+    assert sorted(fired) == [100, 200]
+    [detection] = fired[100]
+    assert detection.series == 'ams' and detection.category == 'traffic'
+    assert detection.score < 0 and detection.value < detection.expected
+    assert {'ewma', 'robust_z'} <= set(detection.detectors)
+
+
+def test_rise_fires_only_for_series_watched_for_spikes():
+    engine = DetectionEngine(capacity=8)
+
+    def tick(value_at, timestamp):
+        # One query per direction, merged as DetectionRunner.tick does
+        drops = engine.observe({'ams': value_at(0)}, 'traffic', 'drop')
+        both = engine.observe({'fra': value_at(1)}, 'traffic', 'both')
+        return engine.evaluate(np.where(np.isnan(both), drops, both), timestamp)
+
+    for number in range(80):
+        assert tick(lambda series: noisy(1000, number, series), number * 60.0) == []
+    assert [detection.series for detection in tick(lambda series: 5000.0, 80 * 60.0)] == ['fra']
+
+
+def test_nothing_fires_during_warmup():
+    engine = DetectionEngine(capacity=8, warmup=10)
+    detections = feed(engine, 10, lambda tick: {'ams': 1000.0 if tick % 2 else 10.0})
+    assert not any(detections)
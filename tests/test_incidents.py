@@ -0,0 +1,19 @@
+from incidents import IncidentIndex
+
+
+def test_index_is_built_on_first_use_and_finds_closed_incidents(tmp_path):
+    path = str(tmp_path / 'incidents.sqlite3')
+    index = IncidentIndex(path)
+    index.record('C1', '1.1', 'revenue', 'Massive overspend on campaign 42, daily budget exceeded')
+    index.record('C1', '2.2', 'traffic', 'Bid requests drop of 25% in AMS')
+    assert not index.stats()['loaded']
+    assert index.close('C1', '1.1', 'budget_capped').resolution == 'budget_capped'
+    assert index.stats()['loaded']
+
+    # Another process sees the closed incident once it loads the history
+    other = IncidentIndex(path)
+    other.load()
+    assert other.stats()['indexed'] == 1
+    [(incident, score)] = other.similar('Massive overspend on campaign 7', 'revenue')
+    assert incident.thread_ts == '1.1' and score > 0.3
+    assert other.similar('Massive overspend on campaign 7', 'traffic') == []
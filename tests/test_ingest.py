@@ -0,0 +1,44 @@
+import io
+import json
+
+import pytest
+
+from ingest import IngestError, iter_alerts
+
+ALERT = {
+    'labels': {'alertname': 'Bid requests drop ✓', 'dc': 'AMS', 'holmes_category': 'traffic'},
+    'annotations': {'summary': 'Bid requests dropped 25% in Höchst', 'value': 1.25e-3, 'delta': -0.5},
+    'startsAt': '2024-05-01T10:00:00Z', 'fingerprint': 12345, 'ratio': 10.75,
+}
+PAYLOAD = {'version': '4', 'status': 'firing', 'alerts': [ALERT, {**ALERT, 'fingerprint': 67890}], 'groupKey': 3.5}
+
+
+def alerts(body, chunk_size, **kwargs):
+    return list(iter_alerts(io.BytesIO(body), chunk_size=chunk_size, **kwargs))
+
+
+@pytest.mark.parametrize('chunk_size', list(range(1, 24)) + [4096])
+def test_every_chunk_boundary_decodes_the_same_alerts(chunk_size):
+    # Multibyte characters and numbers are cut at every position by one chunk size or another
+    body = json.dumps(PAYLOAD, ensure_ascii=False).encode()
+    assert alerts(body, chunk_size) == PAYLOAD['alerts']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7])
+def test_payloads_one_per_line_and_arrays_of_bare_alerts(chunk_size):
+    body = (json.dumps(PAYLOAD) + '\n' + json.dumps([ALERT, PAYLOAD]) + '\n').encode()
+    assert alerts(body, chunk_size) == PAYLOAD['alerts'] + [ALERT] + PAYLOAD['alerts']
+
+
+def test_alert_larger_than_the_limit_is_rejected():
+    body = json.dumps({'alerts': [{**ALERT, 'description': 'x' * 5000}]}).encode()
+    with pytest.raises(IngestError) as error:
+        alerts(body, 256, max_alert_bytes=1024)
+    assert error.value.status == 413
+
+
+def test_truncated_body_is_invalid():
+    body = json.dumps(PAYLOAD).encode()[:-10]
+    with pytest.raises(IngestError) as error:
+        alerts(body, 5)
+    assert error.value.status == 400
@@ -0,0 +1,66 @@
+import os
+import threading
+
+from metrics import MetricsRegistry
+
+
+def histogram_count(registry, name, labels):
+    return sum(registry.collect()[name][labels][:-1])
+
+
+def test_threads_record_into_one_total():
+    registry = MetricsRegistry()
+    counter = registry.counter('holmes_test_total', 'Test', ['kind'])
+    barrier = threading.Barrier(8)
+
+    def record():
+        barrier.wait()
+        for _ in range(1000):
+            counter.inc('a')
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.collect()['holmes_test_total'][('a',)] == 8000
+
+
+def test_exited_threads_are_folded_into_retired_totals():
+    registry = MetricsRegistry()
+    counter = registry.counter('holmes_test_total', 'Test', ['kind'])
+    histogram = registry.histogram('holmes_test_seconds', 'Test', ['kind'], buckets=(0.1, 1.0))
+    counter.inc('main')
+
+    def record(value):
+        counter.inc('thread')
+        histogram.observe(value, 'thread')
+
+    for index in range(500):
+        thread = threading.Thread(target=record, args=(index % 3 * 0.5,))
+        thread.start()
+        thread.join()
+
+    # Only the main thread's shard is left; nothing recorded by the others is lost
+    assert registry.shard_count() == 1
+    totals = registry.collect()
+    assert totals['holmes_test_total'] == {('main',): 1, ('thread',): 500}
+    assert histogram_count(registry, 'holmes_test_seconds', ('thread',)) == 500
+    assert totals['holmes_test_seconds'][('thread',)][-1] == sum(index % 3 * 0.5 for index in range(500))
+
+
+def test_render_after_threads_exit():
+    registry = MetricsRegistry()
+    counter = registry.counter('holmes_test_total', 'Test')
+    thread = threading.Thread(target=counter.inc)
+    thread.start()
+    thread.join()
+    assert 'holmes_test_total 1' in registry.render()
+
+
+def test_flush_and_merge_between_processes(tmp_path):
+    registry = MetricsRegistry(directory=str(tmp_path), flush_interval=60)
+    counter = registry.counter('holmes_test_total', 'Test')
+    counter.inc(amount=2)
+    registry.flush()
+    assert os.path.exists(tmp_path / f"metrics-{os.getpid()}.json")
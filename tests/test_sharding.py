@@ -0,0 +1,58 @@
+import threading
+
+from sharding import ChannelSharder, MemoryMembershipStore
+
+CHANNELS = [f"C{index:05d}" for index in range(2000)]
+
+
+def owners(sharders):
+    return {channel: [sharder.member_id for sharder in sharders if sharder.owns(channel)] for channel in CHANNELS}
+
+
+def refresh(sharders):
+    # Twice, so the replicas that heartbeat first also see the ones after them
+    for _ in range(2):
+        for sharder in sharders:
+            sharder._refresh()
+
+
+def test_every_channel_has_one_owner_through_joins_and_leaves():
+    store = MemoryMembershipStore()
+    sharders = []
+    for index in range(5):
+        sharders.append(ChannelSharder(store, f"replica-{index}", heartbeat_interval=60, ttl=60))
+        refresh(sharders)
+        assert all(len(members) == 1 for members in owners(sharders).values())
+
+    before = owners(sharders)
+    leaving = sharders.pop(2)
+    leaving.leave()
+    refresh(sharders)
+    after = owners(sharders)
+    assert all(len(members) == 1 for members in after.values())
+    moved = [channel for channel in CHANNELS if after[channel] != before[channel]]
+    assert moved and all(before[channel] == [leaving.member_id] for channel in moved)
+
+
+def test_heartbeat_in_flight_does_not_rejoin_after_leave():
+    class SlowStore(MemoryMembershipStore):
+        def heartbeat(self, member_id, ttl):
+            if threading.current_thread().name == 'holmes-sharding':
+                in_flight.set()
+                release.wait(5)
+            super().heartbeat(member_id, ttl)
+
+    in_flight, release = threading.Event(), threading.Event()
+    store = SlowStore()
+    sharder = ChannelSharder(store, 'replica-0', heartbeat_interval=0.01, ttl=60).start()
+    assert in_flight.wait(5)
+    threading.Timer(0.2, release.set).start()
+    sharder.leave()
+    release.wait(5)
+    sharder._thread.join(5)
+    assert store.members() == []
+
+
+def test_unknown_membership_owns_every_channel():
+    sharder = ChannelSharder(MemoryMembershipStore(), 'replica-0')
+    assert all(sharder.owns(channel) for channel in CHANNELS)
@@ -0,0 +1,103 @@
+import http.client
+import socket
+import urllib.request
+
+import pytest
+
+from slack_sdk.web import WebClient
+
+from web_api import WebApiDispatcher, check_sdk_transport
+
+URL = 'https://slack.com/api/chat.postMessage'
+
+
+class FakeResponse:
+    status = 200
+    reason = 'OK'
+    will_close = False
+
+    def __init__(self):
+        self.msg = http.client.HTTPMessage()
+        self.msg['Content-Type'] = 'application/json; charset=utf-8'
+
+    def read(self):
+        return b'{"ok": true}'
+
+
+class FakeConnection:
+    """Connection failing as given: in request(), in getresponse(), or not at all"""
+
+    def __init__(self, requests, send_error=None, response_error=None):
+        self.requests = requests
+        self.send_error = send_error
+        self.response_error = response_error
+
+    def request(self, method, path, body=None, headers=None):
+        self.requests.append((method, path))
+        if self.send_error:
+            raise self.send_error
+
+    def getresponse(self):
+        if self.response_error:
+            raise self.response_error
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+def perform(first_connection, reused=True):
+    """Send one request whose first attempt uses first_connection; returns (result, paths requested)"""
+    client = WebApiDispatcher(token='xoxb-test').client
+    requests = []
+    connections = [(FakeConnection(requests, **first_connection), reused), (FakeConnection(requests), False)]
+    client._connection = lambda netloc: connections.pop(0)
+    client._discard = lambda netloc: None
+    request = urllib.request.Request(URL, data=b'channel=C1&text=hi', method='POST')
+    return client._perform_urllib_http_request_internal(URL, request), requests
+
+
+@pytest.mark.parametrize('error', [
+    {'send_error': BrokenPipeError()},
+    {'send_error': ConnectionResetError()},
+    {'response_error': http.client.RemoteDisconnected('closed')},
+])
+def test_stale_keep_alive_connection_is_retried(error):
+    result, requests = perform(error)
+    assert result['status'] == 200
+    assert len(requests) == 2
+
+
+@pytest.mark.parametrize('error', [
+    {'response_error': socket.timeout('timed out')},
+    {'response_error': ConnectionResetError()},
+    {'response_error': http.client.IncompleteRead(b'')},
+])
+def test_request_that_may_have_been_processed_is_not_retried(error):
+    with pytest.raises((OSError, http.client.HTTPException)):
+        perform(error)
+
+
+def test_fresh_connection_failure_is_not_retried():
+    with pytest.raises(BrokenPipeError):
+        perform({'send_error': BrokenPipeError()}, reused=False)
+
+
+def test_request_keeps_the_sdk_method():
+    client = WebApiDispatcher(token='xoxb-test').client
+    requests = []
+    client._connection = lambda netloc: (FakeConnection(requests), False)
+    client._discard = lambda netloc: None
+    client._perform_urllib_http_request_internal(URL, urllib.request.Request(URL))
+    assert requests == [('GET', '/api/chat.postMessage')]
+
+
+def test_changed_sdk_transport_fails_startup():
+    check_sdk_transport()
+
+    class ChangedClient(WebClient):
+        def _perform_urllib_http_request_internal(self, url, req, timeout):
+            pass
+
+    with pytest.raises(RuntimeError):
+        check_sdk_transport(ChangedClient)